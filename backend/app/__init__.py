@@ -1,8 +1,9 @@
-from flask import Flask
+from flask import Flask, current_app
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from werkzeug.local import LocalProxy
 import os
 
 # Load environment variables
@@ -11,6 +12,9 @@ load_dotenv()
 # Initialize extensions
 jwt = JWTManager()
 
+# The current app's database, for modules imported before any app exists
+db = LocalProxy(lambda: current_app.db)
+
 def create_app():
     app = Flask(__name__)
     
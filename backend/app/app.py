@@ -19,10 +19,26 @@ def setup_mongodb_indexes(db):
         db.users.create_index([('email', ASCENDING)], unique=True)
         db.users.create_index([('reset_token', ASCENDING)])
         
-        # Documents collection indexes
-        db.documents.create_index([('user_id', ASCENDING)])
+        # Documents collection indexes. Listings page by (sort field, _id)
+        # within a user, optionally filtered by type; see keyset_paginate.
+        db.documents.create_index([('user_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)])
+        db.documents.create_index([
+            ('user_id', ASCENDING),
+            ('document_type', ASCENDING),
+            ('created_at', DESCENDING),
+            ('_id', DESCENDING)
+        ])
+        db.documents.create_index([('user_id', ASCENDING), ('filename', ASCENDING), ('_id', ASCENDING)])
         db.documents.create_index([('created_at', DESCENDING)])
         db.documents.create_index([('verification_status', ASCENDING)])
+        # Metadata reconciler and shared (content-addressed) objects
+        db.documents.create_index([('s3_key', ASCENDING)])
+        
+        # Direct-upload sessions are dropped once expired. S3 parts of
+        # abandoned uploads need an AbortIncompleteMultipartUpload
+        # lifecycle rule on the bucket.
+        db.upload_sessions.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+        db.upload_sessions.create_index([('user_id', ASCENDING)])
         
         logger.info("Successfully created MongoDB indexes")
     except Exception as e:
@@ -72,7 +88,7 @@ def create_app():
             'error': 'Unauthorized',
             'message': 'Missing or invalid token'
         }), 401
-    
+        
     # Initialize MongoDB
     try:
         client = MongoClient(Config.MONGODB_URI)
@@ -1,10 +1,22 @@
 import os
 import json
+import math
+import time
+import uuid
+import random
 import hashlib
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from redis import Redis
 from datetime import timedelta
-from prometheus_client import Counter
+from prometheus_client import Counter, Histogram
+from app.utils import cache_codec
+
+logger = logging.getLogger('app')
 
 # Redis configuration
 redis_config = {
@@ -15,6 +27,17 @@ redis_config = {
     'ssl': os.getenv('REDIS_SSL', 'false').lower() == 'true'
 }
 
+# In-process (L1) cache configuration
+local_cache_config = {
+    'enabled': os.getenv('CACHE_L1_ENABLED', 'true').lower() == 'true',
+    'max_entries': int(os.getenv('CACHE_L1_MAX_ENTRIES', 1024)),
+    # Upper bound (seconds) on how long L1 may serve a value without going
+    # back to Redis. Pub/sub delivery is best effort, so this is what
+    # actually bounds staleness if an invalidation message is lost.
+    'max_staleness': float(os.getenv('CACHE_L1_MAX_STALENESS', 5)),
+    'channel': os.getenv('CACHE_INVALIDATION_CHANNEL', 'cache:invalidate')
+}
+
 # Initialize Redis client
 redis_client = Redis(**redis_config)
 
@@ -22,17 +45,136 @@ redis_client = Redis(**redis_config)
 cache_hits_total = Counter(
     'cache_hits_total',
     'Total number of cache hits',
-    ['cache_type']
+    ['cache_type', 'tier']
 )
 
 cache_misses_total = Counter(
     'cache_misses_total',
     'Total number of cache misses',
-    ['cache_type']
+    ['cache_type', 'tier']
 )
 
-def generate_cache_key(prefix, *args, **kwargs):
-    """Generate a unique cache key from prefix and arguments."""
+class LocalCache:
+    """
+    Size-bounded LRU cache with per-entry TTL, private to one worker process.
+    
+    Entries are stored as (expires_at, value) in an OrderedDict; reads move
+    the entry to the end and inserts evict from the front once max_entries
+    is reached.
+    """
+    
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        
+    def get(self, key):
+        """Return (found, value) for key, dropping it if it has expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+            
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            
+    def delete_prefix(self, prefix):
+        """Drop every entry whose key starts with prefix."""
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+                
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            
+    def __len__(self):
+        return len(self._data)
+
+local_cache = LocalCache(max_entries=local_cache_config['max_entries'])
+
+# Invalidation listener state. The listener is a daemon thread subscribed to
+# the invalidation channel; it is (re)started lazily per process so that
+# gunicorn workers forked from a preloaded master each get their own.
+_listener_lock = threading.Lock()
+_listener_pid = None
+
+def _handle_invalidation_message(message):
+    """Apply an invalidation broadcast to the local L1 cache."""
+    try:
+        payload = json.loads(message['data'])
+    except (TypeError, ValueError):
+        return
+    action = payload.get('action')
+    if action == 'delete':
+        local_cache.delete(payload['key'])
+    elif action == 'delete_prefix':
+        local_cache.delete_prefix(payload['prefix'])
+    elif action == 'clear':
+        local_cache.clear()
+
+def _listen_for_invalidations():
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(local_cache_config['channel'])
+            # Anything cached before (re)subscribing may have missed messages
+            local_cache.clear()
+            for message in pubsub.listen():
+                _handle_invalidation_message(message)
+        except Exception as e:
+            logger.warning(f"Cache invalidation listener error: {str(e)}")
+            local_cache.clear()
+            time.sleep(1)
+
+def ensure_invalidation_listener():
+    """Start the pub/sub invalidation listener for this process if needed."""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        local_cache.clear()
+        thread = threading.Thread(
+            target=_listen_for_invalidations,
+            name='cache-invalidation-listener',
+            daemon=True
+        )
+        thread.start()
+        _listener_pid = os.getpid()
+
+def publish_invalidation(action, **fields):
+    """
+    Apply an invalidation locally and broadcast it to every other worker.
+    
+    Args:
+        action (str): One of 'delete', 'delete_prefix' or 'clear'
+        **fields: 'key' for delete, 'prefix' for delete_prefix
+    """
+    message = {'data': json.dumps(dict(fields, action=action))}
+    _handle_invalidation_message(message)
+    try:
+        redis_client.publish(local_cache_config['channel'], message['data'])
+    except Exception as e:
+        logger.warning(f"Failed to publish cache invalidation: {str(e)}")
+
+def _hash_arguments(prefix, *args, **kwargs):
+    """Hash a prefix and call arguments into a fixed-length digest."""
     # Create a string representation of arguments
     args_str = ':'.join(str(arg) for arg in args)
     kwargs_str = ':'.join(f"{k}:{v}" for k, v in sorted(kwargs.items()))
@@ -41,10 +183,175 @@ def generate_cache_key(prefix, *args, **kwargs):
     key_parts = [prefix, args_str, kwargs_str]
     key_string = ':'.join(key_parts)
     
-    # Generate hash
-    return f"{prefix}:{hashlib.md5(key_string.encode()).hexdigest()}"
+    return hashlib.md5(key_string.encode()).hexdigest()
 
-def cached(prefix, ttl=300, cache_type='general'):
+def generate_cache_key(prefix, *args, **kwargs):
+    """Generate a unique cache key from prefix and arguments."""
+    return f"{prefix}:{_hash_arguments(prefix, *args, **kwargs)}"
+
+# Generation-based invalidation. Every cached() entry lives under
+# "{prefix}:{namespace generation}.{tag generation}:{digest}", so bumping a
+# generation makes all older entries unreachable in O(1); they are never
+# deleted explicitly and simply age out through their TTL.
+#
+# Missing generation counters are initialised from the current time in
+# milliseconds rather than 0, so that if a counter is ever evicted the new
+# generation cannot collide with one that still has live entries. That also
+# makes it safe to expire per-tag counters, which would otherwise accumulate
+# one key per user forever.
+GENERATION_KEY_PREFIX = 'cache:gen'
+TAG_GENERATION_TTL = int(os.getenv('CACHE_TAG_GENERATION_TTL', 7 * 86400))
+
+_read_generation_script = redis_client.register_script("""
+local function generation(key, ttl)
+    if key == '' then
+        return '0'
+    end
+    local value = redis.call('GET', key)
+    if not value then
+        value = ARGV[1]
+        if ttl > 0 then
+            redis.call('SET', key, value, 'EX', ttl)
+        else
+            redis.call('SET', key, value)
+        end
+    end
+    return value
+end
+local namespace = generation(KEYS[1], 0)
+local tag = generation(KEYS[2], tonumber(ARGV[4]))
+local key = ARGV[2] .. ':' .. namespace .. '.' .. tag .. ':' .. ARGV[3]
+return {key, redis.call('GET', key)}
+""")
+
+_bump_generation_script = redis_client.register_script("""
+local ttl = tonumber(ARGV[2])
+local value
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    value = redis.call('INCR', KEYS[1])
+else
+    value = tonumber(ARGV[1])
+    redis.call('SET', KEYS[1], value)
+end
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return value
+""")
+
+def _now_ms():
+    return str(int(time.time() * 1000))
+
+def generation_key(prefix, tag=None):
+    """Return the Redis key holding the generation counter for prefix/tag."""
+    if tag is None:
+        return f"{GENERATION_KEY_PREFIX}:{prefix}"
+    return f"{GENERATION_KEY_PREFIX}:{prefix}:{tag}"
+
+def bump_generation(prefix, tag=None):
+    """
+    Invalidate every cached entry under prefix (or under prefix for one tag).
+    
+    Args:
+        prefix (str): Cache prefix, e.g. 'document_list'
+        tag (str): Optional sub-namespace, e.g. a user id
+        
+    Returns:
+        int: The new generation
+    """
+    generation = _bump_generation_script(
+        keys=[generation_key(prefix, tag)],
+        args=[_now_ms(), TAG_GENERATION_TTL if tag is not None else 0]
+    )
+    if tag is None:
+        publish_invalidation('delete_prefix', prefix=f"{prefix}:")
+    else:
+        publish_invalidation('delete_prefix', prefix=f"{prefix}:{tag}:")
+    return generation
+
+# Stampede protection. A miss is recomputed by a single caller: threads in
+# the same worker wait on an in-process "flight", and workers compete for a
+# short-lived Redis lock. Entries are stored in an envelope carrying a soft
+# expiry and the time the last computation took, which drives
+# stale-while-revalidate and probabilistic early refresh (XFetch).
+LOCK_KEY_PREFIX = 'cache:lock'
+LOCK_POLL_INTERVAL = 0.05
+ENVELOPE_MARKER = '__cache__'
+
+cache_lock_wait_seconds = Histogram(
+    'cache_lock_wait_seconds',
+    'Time spent waiting for another caller to recompute a cache entry',
+    ['cache_type']
+)
+
+cache_stale_served_total = Counter(
+    'cache_stale_served_total',
+    'Total number of stale cache values served while a refresh runs',
+    ['cache_type']
+)
+
+cache_refresh_duration_seconds = Histogram(
+    'cache_refresh_duration_seconds',
+    'Time taken to recompute a cache entry',
+    ['cache_type', 'mode']
+)
+
+_release_lock_script = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('CACHE_REFRESH_WORKERS', 4)),
+    thread_name_prefix='cache-refresh'
+)
+
+class _Flight:
+    """A recomputation in progress in this process, shared by all waiters."""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def _acquire_lock(key, timeout):
+    """Try to take the recompute lock for key; return a token or None."""
+    token = uuid.uuid4().hex
+    if redis_client.set(f"{LOCK_KEY_PREFIX}:{key}", token, nx=True, px=int(timeout * 1000)):
+        return token
+    return None
+
+def _release_lock(key, token):
+    _release_lock_script(keys=[f"{LOCK_KEY_PREFIX}:{key}"], args=[token])
+
+def _decode_entry(raw):
+    """Return (value, soft_expiry, delta) for a stored entry."""
+    value = cache_codec.loads(raw)
+    if isinstance(value, dict) and value.get(ENVELOPE_MARKER) == 1:
+        return value['v'], value['x'], value['d']
+    return value, None, 0
+
+def _encode_entry(value, ttl, delta):
+    return cache_codec.dumps({
+        ENVELOPE_MARKER: 1,
+        'v': value,
+        'x': time.time() + ttl,
+        'd': delta
+    })
+
+def _should_refresh_early(soft_expiry, delta, beta):
+    """XFetch: refresh with rising probability as the soft expiry nears."""
+    if not beta or not delta:
+        return False
+    return time.time() - delta * beta * math.log(random.random() or 1e-12) >= soft_expiry
+
+def cached(prefix, ttl=300, cache_type='general', local_ttl=None, tag=None,
+           stale_ttl=0, lock_timeout=10, early_refresh_beta=1.0):
     """
     Decorator to cache function results in Redis.
     
@@ -52,40 +359,165 @@ def cached(prefix, ttl=300, cache_type='general'):
         prefix (str): Prefix for the cache key
         ttl (int): Time to live in seconds (default: 5 minutes)
         cache_type (str): Type of cache for metrics
+        local_ttl (float): Keep results in the in-process L1 cache for this
+            many seconds, capped at CACHE_L1_MAX_STALENESS. None disables L1.
+        tag (callable): Called with the function arguments, returns a
+            sub-namespace (e.g. the user id) that can be invalidated on its
+            own with bump_generation(prefix, tag)
+        stale_ttl (int): Seconds after ttl during which the old value is
+            still served while one caller refreshes it in the background
+        lock_timeout (float): Lifetime of the recompute lock, and the longest
+            a caller waits for another one to finish before computing itself
+        early_refresh_beta (float): XFetch aggressiveness; 0 disables
+            probabilistic early refresh
     """
+    use_local = local_cache_config['enabled'] and local_ttl is not None
+    if use_local:
+        local_ttl = min(local_ttl, local_cache_config['max_staleness'], ttl)
+        
     def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            # Generate cache key
-            key = generate_cache_key(prefix, *args, **kwargs)
-            
-            # Try to get from cache
-            cached_value = redis_client.get(key)
-            if cached_value:
-                cache_hits_total.labels(cache_type=cache_type).inc()
-                return json.loads(cached_value)
+        def read(prefix_keys, digest):
+            key, raw = _read_generation_script(
+                keys=prefix_keys,
+                args=[_now_ms(), prefix, digest, TAG_GENERATION_TTL]
+            )
+            return key, raw
             
-            # If not in cache, execute function
-            cache_misses_total.labels(cache_type=cache_type).inc()
+        def compute_and_store(key, local_key, mode, args, kwargs):
+            start = time.time()
             result = f(*args, **kwargs)
+            delta = time.time() - start
+            cache_refresh_duration_seconds.labels(cache_type=cache_type, mode=mode).observe(delta)
             
             # Store in cache
             redis_client.setex(
                 key,
-                ttl,
-                json.dumps(result)
+                ttl + stale_ttl,
+                _encode_entry(result, ttl, delta)
             )
-            
+            if use_local:
+                local_cache.set(local_key, result, local_ttl)
             return result
+            
+        def refresh_in_background(key, local_key, args, kwargs):
+            token = _acquire_lock(key, lock_timeout)
+            if token is None:
+                return
+            context = contextvars.copy_context()
+            
+            def run():
+                try:
+                    compute_and_store(key, local_key, 'background', args, kwargs)
+                except Exception as e:
+                    logger.warning(f"Background refresh of {key} failed: {str(e)}")
+                finally:
+                    _release_lock(key, token)
+            _refresh_executor.submit(context.run, run)
+            
+        def wait_for_value(prefix_keys, digest, key):
+            """Poll Redis until another worker stores key, up to lock_timeout."""
+            start = time.time()
+            try:
+                while time.time() - start < lock_timeout:
+                    time.sleep(LOCK_POLL_INTERVAL)
+                    key, raw = read(prefix_keys, digest)
+                    if raw:
+                        return key, raw
+                    if not redis_client.exists(f"{LOCK_KEY_PREFIX}:{key}"):
+                        break
+                return key, None
+            finally:
+                cache_lock_wait_seconds.labels(cache_type=cache_type).observe(time.time() - start)
+                
+        def recompute(prefix_keys, digest, key, local_key, args, kwargs):
+            """Single-flight recomputation of a missing entry."""
+            token = _acquire_lock(key, lock_timeout)
+            if token is None:
+                key, raw = wait_for_value(prefix_keys, digest, key)
+                if raw:
+                    return _decode_entry(raw)[0]
+                token = _acquire_lock(key, lock_timeout)
+            try:
+                return compute_and_store(key, local_key, 'miss', args, kwargs)
+            finally:
+                if token:
+                    _release_lock(key, token)
+                    
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Generate cache key
+            digest = _hash_arguments(prefix, *args, **kwargs)
+            tag_value = tag(*args, **kwargs) if tag else None
+            if tag_value is None:
+                local_key = f"{prefix}:{digest}"
+            else:
+                local_key = f"{prefix}:{tag_value}:{digest}"
+                
+            # Try the in-process cache first
+            if use_local:
+                ensure_invalidation_listener()
+                found, value = local_cache.get(local_key)
+                if found:
+                    cache_hits_total.labels(cache_type=cache_type, tier='l1').inc()
+                    return value
+                cache_misses_total.labels(cache_type=cache_type, tier='l1').inc()
+                
+            # Resolve the current generation and read the entry in one round trip
+            prefix_keys = [
+                generation_key(prefix),
+                generation_key(prefix, tag_value) if tag_value is not None else ''
+            ]
+            key, cached_value = read(prefix_keys, digest)
+            if cached_value:
+                result, soft_expiry, delta = _decode_entry(cached_value)
+                if soft_expiry is not None and time.time() >= soft_expiry:
+                    # Past the soft expiry but inside the stale window
+                    cache_stale_served_total.labels(cache_type=cache_type).inc()
+                    refresh_in_background(key, local_key, args, kwargs)
+                elif soft_expiry is not None and _should_refresh_early(soft_expiry, delta, early_refresh_beta):
+                    refresh_in_background(key, local_key, args, kwargs)
+                cache_hits_total.labels(cache_type=cache_type, tier='redis').inc()
+                if use_local:
+                    local_cache.set(local_key, result, local_ttl)
+                return result
+                
+            # If not in cache, execute function once per process and key
+            cache_misses_total.labels(cache_type=cache_type, tier='redis').inc()
+            with _flights_lock:
+                flight = _flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _flights[key] = _Flight()
+                    
+            if not leader:
+                start = time.time()
+                flight.done.wait(lock_timeout)
+                cache_lock_wait_seconds.labels(cache_type=cache_type).observe(time.time() - start)
+                if flight.done.is_set() and flight.error is None:
+                    return flight.result
+                return f(*args, **kwargs)
+                
+            try:
+                flight.result = recompute(prefix_keys, digest, key, local_key, args, kwargs)
+                return flight.result
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                flight.done.set()
+                with _flights_lock:
+                    _flights.pop(key, None)
         return decorated_function
     return decorator
 
-def invalidate_cache(prefix):
+def invalidate_cache(prefix, tag=None):
     """
     Decorator to invalidate cache entries after a function call.
     
     Args:
         prefix (str): Prefix of the cache keys to invalidate
+        tag (callable): Called with the function arguments; when given, only
+            the entries cached under that tag are invalidated
     """
     def decorator(f):
         @wraps(f)
@@ -93,13 +525,8 @@ def invalidate_cache(prefix):
             # Execute function
             result = f(*args, **kwargs)
             
-            # Generate pattern for cache keys to invalidate
-            pattern = f"{prefix}:*"
-            
-            # Delete matching keys
-            keys = redis_client.keys(pattern)
-            if keys:
-                redis_client.delete(*keys)
+            # Move the prefix (or tag) to a new generation
+            bump_generation(prefix, tag(*args, **kwargs) if tag else None)
             
             return result
         return decorated_function
@@ -108,39 +535,168 @@ def invalidate_cache(prefix):
 def get_cached_value(key):
     """Get a value from cache."""
     value = redis_client.get(key)
-    return json.loads(value) if value else None
+    return cache_codec.loads(value) if value else None
 
 def set_cached_value(key, value, ttl=300):
     """Set a value in cache with TTL."""
     redis_client.setex(
         key,
         ttl,
-        json.dumps(value)
+        cache_codec.dumps(value)
     )
 
+def get_many(keys):
+    """
+    Get several values from cache with a single MGET.
+    
+    Returns:
+        dict: key -> value for the keys that were found
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    values = redis_client.mget(keys)
+    return {key: cache_codec.loads(value) for key, value in zip(keys, values) if value}
+
+def set_many(mapping, ttl=300):
+    """Set several values in cache with TTL using one pipelined round trip."""
+    if not mapping:
+        return
+    pipeline = redis_client.pipeline(transaction=False)
+    for key, value in mapping.items():
+        pipeline.setex(key, ttl, cache_codec.dumps(value))
+    pipeline.execute()
+
+_read_many_script = redis_client.register_script("""
+local generation = redis.call('GET', KEYS[1])
+if not generation then
+    generation = ARGV[1]
+    redis.call('SET', KEYS[1], generation)
+end
+local keys = {}
+for i = 3, #ARGV do
+    keys[#keys + 1] = ARGV[2] .. ':' .. generation .. '.0:' .. ARGV[i]
+end
+return {generation, redis.call('MGET', unpack(keys))}
+""")
+
+def cached_many(prefix, ttl=300, cache_type='general'):
+    """
+    Decorator to cache the per-item results of a batched loader in Redis.
+    
+    The wrapped function takes a list of items and returns a dict mapping
+    each item it could load to its value. The decorated function reads all
+    items with one MGET, calls the loader once with only the missing items,
+    and writes those back with one pipelined SETEX. Items are cached under
+    the prefix generation, so invalidate_cache/bump_generation apply.
+    Further arguments are passed through to the loader and are not part of
+    the cache key.
+    
+    Args:
+        prefix (str): Prefix for the cache keys
+        ttl (int): Time to live in seconds (default: 5 minutes)
+        cache_type (str): Type of cache for metrics
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(items, *args, **kwargs):
+            items = list(dict.fromkeys(items))
+            if not items:
+                return {}
+            digests = [_hash_arguments(prefix, item) for item in items]
+            generation, values = _read_many_script(
+                keys=[generation_key(prefix)],
+                args=[_now_ms(), prefix] + digests
+            )
+            if isinstance(generation, bytes):
+                generation = generation.decode()
+                
+            results = {}
+            missing = []
+            for item, value in zip(items, values):
+                if value:
+                    results[item] = cache_codec.loads(value)
+                else:
+                    missing.append(item)
+            if results:
+                cache_hits_total.labels(cache_type=cache_type, tier='redis').inc(len(results))
+            if not missing:
+                return results
+                
+            # Load every missing item with a single call
+            cache_misses_total.labels(cache_type=cache_type, tier='redis').inc(len(missing))
+            loaded = f(missing, *args, **kwargs)
+            set_many({
+                f"{prefix}:{generation}.0:{_hash_arguments(prefix, item)}": value
+                for item, value in loaded.items()
+                if value is not None
+            }, ttl=ttl)
+            results.update(loaded)
+            return results
+        return decorated_function
+    return decorator
+
 def delete_cached_value(key):
     """Delete a value from cache."""
     redis_client.delete(key)
+    publish_invalidation('delete', key=key)
 
-def clear_cache(pattern='*'):
-    """Clear all cache entries matching the pattern."""
-    keys = redis_client.keys(pattern)
-    if keys:
-        redis_client.delete(*keys)
+def clear_cache(pattern='*', batch_size=500):
+    """
+    Clear all cache entries matching the pattern.
+    
+    Walks the keyspace with SCAN and removes keys with UNLINK in batches, so
+    Redis is never blocked for longer than one batch. Intended for admin
+    purges; routine invalidation should use bump_generation().
+    
+    Returns:
+        int: Number of keys removed
+    """
+    removed = 0
+    batch = []
+    for key in redis_client.scan_iter(match=pattern, count=batch_size):
+        batch.append(key)
+        if len(batch) >= batch_size:
+            removed += redis_client.unlink(*batch)
+            batch = []
+    if batch:
+        removed += redis_client.unlink(*batch)
+    publish_invalidation('clear')
+    return removed
 
 # Cache configuration for different types of data
 CACHE_CONFIG = {
     'user_profile': {
         'ttl': 3600,  # 1 hour
-        'type': 'user'
+        'type': 'user',
+        'local_ttl': 5
     },
     'document_list': {
         'ttl': 300,  # 5 minutes
+        'type': 'document',
+        'stale_ttl': 60
+    },
+    # Rendered listing entries, keyed by document id and version
+    'document_fragment': {
+        'ttl': 3600,  # 1 hour
         'type': 'document'
     },
     'verification_result': {
         'ttl': 1800,  # 30 minutes
-        'type': 'verification'
+        'type': 'verification',
+        'stale_ttl': 300
+    },
+    'record': {
+        'ttl': 300,  # 5 minutes
+        'type': 'record'
+    },
+    'record_missing': {
+        'ttl': 30,  # 30 seconds
+        'type': 'record_missing'
+    },
+    # Must outlast the slowest Mongo read that could race an invalidation
+    'record_tombstone': {
+        'ttl': 10  # 10 seconds
     },
     'api_response': {
         'ttl': 60,  # 1 minute
@@ -148,7 +704,8 @@ CACHE_CONFIG = {
     },
     'session': {
         'ttl': 86400,  # 24 hours
-        'type': 'session'
+        'type': 'session',
+        'local_ttl': 5
     }
 }
 
@@ -158,7 +715,8 @@ def cache_user_profile(f):
     return cached(
         'user_profile',
         ttl=CACHE_CONFIG['user_profile']['ttl'],
-        cache_type=CACHE_CONFIG['user_profile']['type']
+        cache_type=CACHE_CONFIG['user_profile']['type'],
+        local_ttl=CACHE_CONFIG['user_profile']['local_ttl']
     )(f)
 
 def cache_document_list(f):
@@ -166,7 +724,16 @@ def cache_document_list(f):
     return cached(
         'document_list',
         ttl=CACHE_CONFIG['document_list']['ttl'],
-        cache_type=CACHE_CONFIG['document_list']['type']
+        cache_type=CACHE_CONFIG['document_list']['type'],
+        stale_ttl=CACHE_CONFIG['document_list']['stale_ttl']
+    )(f)
+
+def cache_document_fragments(f):
+    """Per-item cache decorator for document listing entries."""
+    return cached_many(
+        'document_fragment',
+        ttl=CACHE_CONFIG['document_fragment']['ttl'],
+        cache_type=CACHE_CONFIG['document_fragment']['type']
     )(f)
 
 def cache_verification_result(f):
@@ -174,7 +741,8 @@ def cache_verification_result(f):
     return cached(
         'verification_result',
         ttl=CACHE_CONFIG['verification_result']['ttl'],
-        cache_type=CACHE_CONFIG['verification_result']['type']
+        cache_type=CACHE_CONFIG['verification_result']['type'],
+        stale_ttl=CACHE_CONFIG['verification_result']['stale_ttl']
     )(f)
 
 def cache_api_response(f):
@@ -190,5 +758,6 @@ def cache_session(f):
     return cached(
         'session',
         ttl=CACHE_CONFIG['session']['ttl'],
-        cache_type=CACHE_CONFIG['session']['type']
+        cache_type=CACHE_CONFIG['session']['type'],
+        local_ttl=CACHE_CONFIG['session']['local_ttl']
     )(f) 
\ No newline at end of file
@@ -49,18 +49,8 @@ db_operation_duration_seconds = Histogram(
     ['operation', 'collection']
 )
 
-# Cache metrics
-cache_hits_total = Counter(
-    'cache_hits_total',
-    'Total number of cache hits',
-    ['cache_type']
-)
-
-cache_misses_total = Counter(
-    'cache_misses_total',
-    'Total number of cache misses',
-    ['cache_type']
-)
+# Cache metrics (labelled by cache_type and tier, owned by the cache module)
+from app.config.cache import cache_hits_total, cache_misses_total
 
 # System metrics
 system_memory_usage = Gauge(
@@ -237,9 +227,8 @@ def check_redis_connection():
 def check_aws_connection():
     """Check AWS services connection status."""
     try:
-        import boto3
-        s3 = boto3.client('s3')
-        s3.list_buckets()
+        from app.services.storage_service import get_s3_client
+        get_s3_client().list_buckets()
         return {'status': 'healthy', 'latency': 'ok'}
     except Exception as e:
         return {'status': 'unhealthy', 'error': str(e)} 
\ No newline at end of file
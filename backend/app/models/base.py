@@ -0,0 +1,221 @@
+_MISSING = object()
+
+# Stands in for the original value of a field passed to mark_dirty(); it
+# equals nothing, so the field is always written
+_DIRTY = object()
+
+class ConcurrentModificationError(Exception):
+    """Raised when a record changed in Mongo since it was loaded"""
+
+def _build_hydrator(cls, fields):
+    """
+    Compile a from_mongo function for cls that sets exactly fields.
+    
+    Hydration runs once per row on every listing and auth path, so instead of
+    looping over FIELDS it uses straight-line generated code (the same
+    technique namedtuple and dataclasses use), which is several times faster.
+    """
+    namespace = {'_new': object.__new__, '_cls': cls, '_MISSING': _MISSING}
+    lines = [
+        'def hydrate(data):',
+        '    record = _new(_cls)',
+        '    get = data.get',
+        "    record.id = data['_id']",
+        '    record._original = data'
+    ]
+    for index, name in enumerate(fields):
+        default = cls.FIELDS[name]
+        namespace[f"_default_{index}"] = default
+        if callable(default):
+            lines.append(f"    value = get({name!r}, _MISSING)")
+            lines.append(f"    record.{name} = _default_{index}() if value is _MISSING else value")
+        else:
+            lines.append(f"    record.{name} = get({name!r}, _default_{index})")
+    lines.append('    return record')
+    exec('\n'.join(lines), namespace)
+    return namespace['hydrate']
+
+class Record:
+    """
+    Base class for Mongo-backed models.
+    
+    Subclasses list their persistent fields in FIELDS (name -> default, where
+    a callable default is called to produce a fresh value). Instances use
+    __slots__, so they carry no per-instance __dict__ and nothing but the
+    declared fields is ever written back to Mongo.
+    
+    Records hydrated with a field subset (see projection()) leave the other
+    slots unset; to_mongo() skips them, so saving a partial record never
+    overwrites fields that were not loaded.
+    
+    Each record keeps a reference to the Mongo document it was loaded from
+    (or last saved as). persist() compares against it and only sends the
+    fields that changed, as $set (or $unset when a field whose default is
+    None is set back to None), and skips the write entirely when nothing
+    changed. Changes are detected by value, so mutating a dict or list field
+    in place is not seen: assign a new value or call mark_dirty().
+    
+    Every write also checks and increments a version field, so two requests
+    updating the same record cannot silently overwrite each other: the
+    second one gets ConcurrentModificationError.
+    """
+    
+    __slots__ = ('id', '_original', 'version')
+    
+    FIELDS = {}
+    
+    VERSION_FIELD = 'version'
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.FIELDS = dict(cls.FIELDS, **{cls.VERSION_FIELD: 0})
+        cls._field_names = tuple(cls.FIELDS)
+        cls._hydrators = {None: _build_hydrator(cls, cls._field_names)}
+        
+    @classmethod
+    def _with_version(cls, fields):
+        if cls.VERSION_FIELD in fields:
+            return fields
+        return fields + (cls.VERSION_FIELD,)
+        
+    @classmethod
+    def projection(cls, fields=None):
+        """Return a Mongo projection for fields, or None for every field"""
+        if fields is None:
+            return None
+        return {name: 1 for name in cls._with_version(tuple(fields))}
+        
+    @classmethod
+    def from_mongo(cls, data, fields=None):
+        """
+        Build a record from a raw Mongo document.
+        
+        Args:
+            data (dict): Document as returned by pymongo
+            fields (tuple): Only hydrate these fields (default: all)
+        """
+        if fields is not None and not isinstance(fields, tuple):
+            fields = tuple(fields)
+        hydrate = cls._hydrators.get(fields)
+        if hydrate is None:
+            hydrate = cls._hydrators[fields] = _build_hydrator(cls, cls._with_version(fields))
+        return hydrate(data)
+        
+    def to_mongo(self):
+        """Return the loaded persistent fields as a Mongo document"""
+        data = {}
+        for name in self._field_names:
+            try:
+                data[name] = getattr(self, name)
+            except AttributeError:
+                continue
+        return data
+        
+    def is_loaded(self, name):
+        """Whether field name was set on this record"""
+        return hasattr(self, name)
+        
+    def changes(self):
+        """
+        Return (updates, removals): the fields to $set and to $unset
+        """
+        original = getattr(self, '_original', None) or {}
+        updates = {}
+        removals = []
+        for name in self._field_names:
+            if name == self.VERSION_FIELD:
+                continue
+            try:
+                value = getattr(self, name)
+            except AttributeError:
+                continue
+            old = original.get(name, _MISSING)
+            if old is value or (old is not _MISSING and old is not _DIRTY and old == value):
+                continue
+            # A field absent from a legacy document was hydrated with its
+            # default; that is not a change until something assigns it
+            if old is _MISSING and self._is_default(name, value):
+                continue
+            if value is None and self.FIELDS[name] is None:
+                if old is not _MISSING:
+                    removals.append(name)
+            else:
+                updates[name] = value
+        return updates, removals
+        
+    def _is_default(self, name, value):
+        default = self.FIELDS[name]
+        if callable(default):
+            default = default()
+        return value == default
+        
+    def mark_dirty(self, name):
+        """Force field name to be written on the next save"""
+        original = getattr(self, '_original', None)
+        if original is not None:
+            self._original = dict(original, **{name: _DIRTY})
+            
+    def persist(self, collection):
+        """
+        Insert the record, or write only its changed fields.
+        
+        Returns:
+            bool: Whether anything was written
+            
+        Raises:
+            ConcurrentModificationError: If the stored version no longer
+                matches the one this record was loaded with
+        """
+        if not hasattr(self, 'id'):
+            if not hasattr(self, self.VERSION_FIELD):
+                self.version = 0
+            data = self.to_mongo()
+            result = collection.insert_one(data)
+            self.id = result.inserted_id
+            self._original = data
+            return True
+            
+        operation = self.update_operation()
+        if operation is None:
+            return False
+            
+        query, update = operation
+        result = collection.update_one(query, update)
+        if result.matched_count == 0:
+            raise ConcurrentModificationError(
+                f"{type(self).__name__} {self.id} was modified or deleted concurrently"
+            )
+        self.mark_saved()
+        return True
+        
+    def update_operation(self):
+        """
+        Return the (filter, update) pair that writes this record's changes,
+        or None if nothing changed. Used by persist() and by bulk writes.
+        """
+        updates, removals = self.changes()
+        if not updates and not removals:
+            return None
+            
+        version = getattr(self, self.VERSION_FIELD, 0) or 0
+        query = {'_id': self.id}
+        # Records written before versioning have no version field at all
+        query[self.VERSION_FIELD] = version if version else {'$in': [0, None]}
+        update = {'$inc': {self.VERSION_FIELD: 1}}
+        if updates:
+            update['$set'] = updates
+        if removals:
+            update['$unset'] = {name: '' for name in removals}
+        return query, update
+        
+    def mark_saved(self):
+        """Record that the changes from update_operation() were written"""
+        updates, removals = self.changes()
+        version = (getattr(self, self.VERSION_FIELD, 0) or 0) + 1
+        original = dict(getattr(self, '_original', None) or {})
+        original.update(updates)
+        for name in removals:
+            original.pop(name, None)
+        original[self.VERSION_FIELD] = version
+        self._original = original
+        self.version = version
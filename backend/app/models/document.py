@@ -1,9 +1,55 @@
 from bson import ObjectId
 from datetime import datetime
-from app.services.storage_service import StorageService
+from app.services.storage_service import StorageService, key_layout_of
+from app.services.blob_service import BlobService
+from app.models.base import Record, ConcurrentModificationError
+from pymongo import UpdateOne
+from app.models.record_cache import find_record, find_records, invalidate_records, invalidate_record_ids
+from app.models.pagination import keyset_paginate
+from app.models.identity_map import find_mapped, forget_record
+from app.config.cache import cache_document_fragments
 
-class Document:
-    def __init__(self, user_id, filename, s3_key, document_type='', description=''):
+class Document(Record):
+    __slots__ = (
+        'user_id', 'filename', 's3_key', 'document_type', 'description',
+        'created_at', 'verification_status', 'verification_results',
+        'file_size', 'mime_type', 'content_sha256', 'storage_metadata', 'key_layout'
+    )
+    
+    FIELDS = {
+        'user_id': None,
+        'filename': None,
+        's3_key': None,
+        'document_type': '',
+        'description': '',
+        'created_at': datetime.utcnow,
+        'verification_status': 'pending',
+        'verification_results': dict,
+        'file_size': None,
+        'mime_type': None,
+        'content_sha256': None,
+        # S3 object metadata as returned by StorageService.get_file_metadata,
+        # captured at upload and kept current by the metadata reconciler
+        'storage_metadata': None,
+        # How s3_key was laid out (see storage_service.KEY_LAYOUTS); records
+        # from before layouts existed all use 'user'
+        'key_layout': 'user'
+    }
+    
+    # Fields needed to render a document in a listing
+    LIST_FIELDS = (
+        'user_id', 'filename', 's3_key', 'document_type', 'description',
+        'created_at', 'verification_status', 'file_size', 'mime_type'
+    )
+    
+    # Fields needed to delete a document and its file
+    STORAGE_FIELDS = ('user_id', 's3_key', 'content_sha256', 'key_layout')
+    
+    # Fields listings can be ordered by; each has a (user_id, field, _id) index
+    SORT_FIELDS = ('created_at', 'filename')
+    
+    def __init__(self, user_id, filename, s3_key, document_type='', description='',
+                 file_size=None, mime_type=None, content_sha256=None, storage_metadata=None):
         self.user_id = user_id
         self.filename = filename
         self.s3_key = s3_key
@@ -12,70 +58,263 @@ class Document:
         self.created_at = datetime.utcnow()
         self.verification_status = 'pending'
         self.verification_results = {}
-        self.storage_service = StorageService()
+        self.file_size = file_size
+        self.mime_type = mime_type
+        self.content_sha256 = content_sha256
+        self.storage_metadata = storage_metadata
+        self.key_layout = key_layout_of(s3_key)
+        
+    @property
+    def storage_service(self):
+        # Cheap: every StorageService shares the process-wide S3 client
+        return StorageService()
         
     def save(self, db):
-        if not hasattr(self, 'id'):
-            result = db.documents.insert_one(self.__dict__)
-            self.id = result.inserted_id
-        else:
-            db.documents.update_one(
-                {'_id': self.id},
-                {'$set': self.__dict__}
-            )
+        if self.persist(db.documents):
+            invalidate_records('documents', _id=self.id)
         return self
         
     def delete(self, db):
         if hasattr(self, 'id'):
-            # Delete file from S3
-            self.storage_service.delete_file(self.s3_key)
-            # Delete document from database
-            db.documents.delete_one({'_id': self.id})
+            if BlobService.is_blob_key(self.s3_key):
+                # Shared file: drop this document's reference, which
+                # deletes the file if it was the last one
+                db.documents.delete_one({'_id': self.id})
+                BlobService(db).release(self.content_sha256)
+            else:
+                # Delete file from S3
+                self.storage_service.delete_file(self.s3_key)
+                # Delete document from database
+                db.documents.delete_one({'_id': self.id})
+            invalidate_records('documents', _id=self.id)
+            forget_record(self)
             
     def get_url(self, expires_in=3600):
         """Get a temporary URL to access the document"""
         return self.storage_service.get_file_url(self.s3_key, expires_in)
         
-    def get_metadata(self):
-        """Get document metadata from S3"""
-        return self.storage_service.get_file_metadata(self.s3_key)
-            
+    def get_expiring_url(self, expires_in=3600):
+        """Get a temporary URL and the Unix time it expires, or (None, None)"""
+        return self.storage_service.presign_file_urls([self.s3_key], expires_in).get(self.s3_key, (None, None))
+        
     @staticmethod
-    def find_by_id(db, document_id):
-        try:
-            doc_data = db.documents.find_one({'_id': ObjectId(document_id)})
+    def get_urls(documents):
+        """Get temporary URLs for a page of documents, keyed by s3_key"""
+        return StorageService().get_file_urls([doc.s3_key for doc in documents])
+        
+    def get_metadata(self, live=False):
+        """
+        Get document metadata
+        
+        Served from the copy stored on the record; S3 is only asked (with a
+        HEAD) when live is True or the record predates stored metadata.
+        """
+        metadata = self.storage_metadata
+        if live or not metadata:
+            metadata = self.storage_service.get_file_metadata(self.s3_key)
+            if not metadata:
+                return None
+        return {
+            'content_type': metadata.get('content_type'),
+            'content_length': metadata.get('content_length'),
+            'last_modified': metadata['last_modified'].isoformat() if metadata.get('last_modified') else None,
+            'etag': metadata.get('etag'),
+            'metadata': metadata.get('metadata', {})
+        }
+        
+    @staticmethod
+    def find_by_id(db, document_id, fields=None):
+        def load(fields):
+            if fields is not None:
+                doc_data = db.documents.find_one({'_id': document_id}, Document.projection(fields))
+            else:
+                doc_data = find_record(db.documents, '_id', document_id)
             if doc_data:
-                doc = Document(
-                    user_id=doc_data['user_id'],
-                    filename=doc_data['filename'],
-                    s3_key=doc_data['s3_key'],
-                    document_type=doc_data.get('document_type', ''),
-                    description=doc_data.get('description', '')
-                )
-                doc.id = doc_data['_id']
-                doc.created_at = doc_data['created_at']
-                doc.verification_status = doc_data.get('verification_status', 'pending')
-                doc.verification_results = doc_data.get('verification_results', {})
-                return doc
+                return Document.from_mongo(doc_data, fields)
+            return None
+            
+        try:
+            document_id = ObjectId(document_id)
         except:
-            pass
-        return None
+            return None
+        return find_mapped(Document, document_id, load, fields)
+        
+    @staticmethod
+    def find_by_user_id(db, user_id, fields=None):
+        docs_data = db.documents.find({'user_id': user_id}, Document.projection(fields))
+        return [Document.from_mongo(doc_data, fields) for doc_data in docs_data]
+        
+    @staticmethod
+    def find_by_ids(db, document_ids, user_id=None, fields=None, cached=False):
+        """
+        Find many documents with one $in query
+        
+        Returns a dict of str(id) -> Document; ids that are invalid, missing
+        or (when user_id is given) owned by someone else are left out. With
+        cached=True the records are read through the record cache (one MGET,
+        then one $in for the misses); use it only for reads, since cached
+        records may lag a concurrent write by up to the record TTL.
+        """
+        object_ids = [ObjectId(document_id) for document_id in document_ids if ObjectId.is_valid(document_id)]
+        if not object_ids:
+            return {}
+        if cached:
+            docs_data = [
+                doc_data for doc_data in find_records(db.documents, '_id', object_ids).values()
+                if user_id is None or doc_data.get('user_id') == user_id
+            ]
+        else:
+            query = {'_id': {'$in': object_ids}}
+            if user_id is not None:
+                query['user_id'] = user_id
+            docs_data = db.documents.find(query, Document.projection(fields))
+        return {str(doc_data['_id']): Document.from_mongo(doc_data, fields) for doc_data in docs_data}
         
     @staticmethod
-    def find_by_user_id(db, user_id):
-        docs_data = db.documents.find({'user_id': user_id})
-        documents = []
-        for doc_data in docs_data:
-            doc = Document(
-                user_id=doc_data['user_id'],
-                filename=doc_data['filename'],
-                s3_key=doc_data['s3_key'],
-                document_type=doc_data.get('document_type', ''),
-                description=doc_data.get('description', '')
-            )
-            doc.id = doc_data['_id']
-            doc.created_at = doc_data['created_at']
-            doc.verification_status = doc_data.get('verification_status', 'pending')
-            doc.verification_results = doc_data.get('verification_results', {})
-            documents.append(doc)
-        return documents 
\ No newline at end of file
+    def delete_many(db, documents):
+        """
+        Delete documents and their files in one pass
+        
+        Files are removed with batched S3 DeleteObjects calls and records with
+        a single delete_many. A record is only deleted if its file was.
+        Content-addressed files are shared, so for those the record is
+        deleted and its blob reference released instead.
+        
+        Returns a dict of str(id) -> error message, or None if deleted.
+        """
+        documents = list(documents)
+        if not documents:
+            return {}
+        shared = [doc for doc in documents if BlobService.is_blob_key(doc.s3_key)]
+        owned = [doc for doc in documents if not BlobService.is_blob_key(doc.s3_key)]
+        errors = StorageService().delete_files([doc.s3_key for doc in owned]) if owned else {}
+        deleted = shared + [doc for doc in owned if doc.s3_key not in errors]
+        if deleted:
+            deleted_ids = [doc.id for doc in deleted]
+            db.documents.delete_many({'_id': {'$in': deleted_ids}})
+            invalidate_record_ids('documents', deleted_ids)
+            for doc in deleted:
+                forget_record(doc)
+        if shared:
+            blob_service = BlobService(db)
+            for doc in shared:
+                blob_service.release(doc.content_sha256)
+        return {str(doc.id): errors.get(doc.s3_key) for doc in documents}
+        
+    @staticmethod
+    def save_many(db, documents):
+        """
+        Write the changed fields of many documents with one bulk_write
+        
+        Returns a dict of str(id) -> error message, or None if saved (or
+        unchanged). Documents whose version moved on since they were loaded
+        are reported as conflicts and left untouched.
+        """
+        documents = list(documents)
+        pending = []
+        operations = []
+        for doc in documents:
+            operation = doc.update_operation()
+            if operation is not None:
+                pending.append((doc, operation[1]))
+                operations.append(UpdateOne(*operation))
+        results = {str(doc.id): None for doc in documents}
+        if not operations:
+            return results
+            
+        result = db.documents.bulk_write(operations, ordered=False)
+        if result.matched_count == len(operations):
+            written = [doc for doc, _ in pending]
+        else:
+            # Some version checks failed; bulk_write does not say which, so
+            # treat a write as landed only if the stored record carries both
+            # the next version and the values it set
+            stored = {
+                doc_data['_id']: doc_data
+                for doc_data in db.documents.find({'_id': {'$in': [doc.id for doc, _ in pending]}})
+            }
+            written = []
+            for doc, update in pending:
+                doc_data = stored.get(doc.id)
+                landed = (
+                    doc_data is not None
+                    and doc_data.get(Document.VERSION_FIELD) == (doc.version or 0) + 1
+                    and all(doc_data.get(name) == value for name, value in update.get('$set', {}).items())
+                    and not any(name in doc_data for name in update.get('$unset', {}))
+                )
+                if landed:
+                    written.append(doc)
+                else:
+                    results[str(doc.id)] = str(ConcurrentModificationError(
+                        f"Document {doc.id} was modified or deleted concurrently"
+                    ))
+        for doc in written:
+            doc.mark_saved()
+        invalidate_record_ids('documents', [doc.id for doc in written])
+        return results
+        
+    @staticmethod
+    def list_entries(db, documents):
+        """
+        Render the listing entries for a page of documents
+        
+        Only id and version need to be loaded on documents. Entries are
+        cached per (id, version), so a page whose entries are all cached
+        costs one MGET; the rest are loaded with one $in query. Every write
+        to a document bumps its version, so an entry never needs to be
+        invalidated. Each entry carries the s3_key its URL is signed for.
+        
+        Returns entries in page order; documents deleted since the page was
+        read are left out.
+        """
+        keys = [(str(doc.id), doc.version) for doc in documents]
+        entries = _load_list_entries(keys, db)
+        return [entries[key] for key in keys if key in entries]
+        
+    @staticmethod
+    def find_by_user_id_paginated(db, user_id, per_page=10, cursor=None, document_type=None,
+                                  sort_by='created_at', order='desc', include_total=False,
+                                  fields=LIST_FIELDS):
+        """
+        Get one page of a user's documents using keyset (cursor) pagination
+        
+        Raises:
+            InvalidCursor: If cursor is malformed or was issued for another sort
+        """
+        query = {'user_id': user_id}
+        if document_type:
+            query['document_type'] = document_type
+            
+        page = keyset_paginate(
+            db.documents,
+            query,
+            sort_by,
+            order=order,
+            per_page=per_page,
+            cursor=cursor,
+            projection=Document.projection(fields),
+            include_total=include_total
+        )
+        page.items = [Document.from_mongo(doc_data, fields) for doc_data in page.items]
+        return page
+
+@cache_document_fragments
+def _load_list_entries(keys, db):
+    documents = Document.find_by_ids(db, [document_id for document_id, _ in keys], fields=Document.LIST_FIELDS)
+    entries = {}
+    for key in keys:
+        doc = documents.get(key[0])
+        if doc is None:
+            continue
+        entries[key] = {
+            'id': str(doc.id),
+            'filename': doc.filename,
+            'document_type': doc.document_type,
+            'description': doc.description,
+            'created_at': doc.created_at.isoformat(),
+            'verification_status': doc.verification_status,
+            's3_key': doc.s3_key,
+            'file_size': doc.file_size,
+            'mime_type': doc.mime_type
+        }
+    return entries
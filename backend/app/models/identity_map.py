@@ -0,0 +1,175 @@
+from flask import g, has_request_context, current_app, jsonify
+from prometheus_client import Counter
+from app.models.base import ConcurrentModificationError
+from app.utils.logger import logger
+
+# Finder calls answered from the map instead of Redis/Mongo
+identity_map_hits_total = Counter(
+    'identity_map_hits_total',
+    'Model lookups served from the request identity map (round trips saved)',
+    ['model']
+)
+
+identity_map_misses_total = Counter(
+    'identity_map_misses_total',
+    'Model lookups that had to load the record',
+    ['model']
+)
+
+identity_map_writes_total = Counter(
+    'identity_map_writes_total',
+    'Deferred model saves flushed at the end of a request',
+    ['model']
+)
+
+class IdentityMap:
+    """
+    Request-scoped identity map and unit of work.
+    
+    Records found by _id are kept for the rest of the request, so the second
+    lookup of the same user or document (e.g. admin_required followed by the
+    handler) returns the same instance without another round trip, and
+    changes made through one reference are seen through every other.
+    
+    Only fully loaded records are mapped; a finder asked for a field subset
+    gets the mapped (full) record if there is one, which is a superset, and
+    otherwise loads just the subset without mapping it.
+    
+    Records passed to defer_save() are written once, by flush(), when the
+    request finishes successfully.
+    """
+    
+    def __init__(self):
+        self.records = {}
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        
+    def get(self, cls, record_id):
+        record = self.records.get((cls, record_id))
+        if record is not None:
+            self.hits += 1
+            identity_map_hits_total.labels(model=cls.__name__).inc()
+        return record
+        
+    def add(self, record):
+        """Map record, or return the instance already mapped for its _id"""
+        key = (type(record), record.id)
+        return self.records.setdefault(key, record)
+        
+    def discard(self, cls, record_id):
+        self.records.pop((cls, record_id), None)
+        
+    def defer_save(self, record):
+        """Save record when the request completes instead of right away"""
+        self.pending[id(record)] = record
+        
+    def flush(self, db):
+        """
+        Save every deferred record once
+        
+        Raises:
+            ConcurrentModificationError: If a record changed concurrently;
+                records before it in the queue have already been written
+        """
+        pending = list(self.pending.values())
+        self.pending.clear()
+        for record in pending:
+            record.save(db)
+            identity_map_writes_total.labels(model=type(record).__name__).inc()
+        return len(pending)
+
+def current_identity_map():
+    """Return this request's identity map, or None outside a request"""
+    if not has_request_context():
+        return None
+    if 'identity_map' not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
+
+def find_mapped(cls, record_id, load, fields=None):
+    """
+    Look a record up by _id through the request identity map.
+    
+    Args:
+        cls: Record subclass
+        record_id: The record's _id
+        load: Called as load(fields) to fetch the record on a miss
+        fields (tuple): Field subset the caller needs (default: all)
+    """
+    identity_map = current_identity_map()
+    if identity_map is None:
+        return load(fields)
+        
+    record = identity_map.get(cls, record_id)
+    if record is not None:
+        return record
+        
+    identity_map.misses += 1
+    identity_map_misses_total.labels(model=cls.__name__).inc()
+    record = load(fields)
+    if record is not None and fields is None:
+        record = identity_map.add(record)
+    return record
+
+def map_record(record):
+    """Share a fully loaded record found by another key with later _id lookups"""
+    identity_map = current_identity_map()
+    if identity_map is None or record is None:
+        return record
+    return identity_map.add(record)
+
+def forget_record(record):
+    """Drop a deleted record from the request identity map"""
+    identity_map = current_identity_map()
+    if identity_map is not None:
+        identity_map.discard(type(record), record.id)
+
+def defer_save(record, db):
+    """
+    Queue record to be saved at the end of the request.
+    
+    Outside a request there is nothing to flush, so the record is saved now.
+    """
+    identity_map = current_identity_map()
+    if identity_map is None:
+        return record.save(db)
+    identity_map.defer_save(record)
+    return record
+
+def flush_identity_map(db, commit=True):
+    """
+    End the request's unit of work: write deferred saves (or drop them if
+    commit is False, e.g. because the request failed) and log how many
+    lookups the map saved.
+    """
+    identity_map = g.pop('identity_map', None) if has_request_context() else None
+    if identity_map is None:
+        return 0
+    written = identity_map.flush(db) if commit else 0
+    if identity_map.hits:
+        logger.debug(
+            f"Identity map saved {identity_map.hits} of "
+            f"{identity_map.hits + identity_map.misses} lookups"
+        )
+    return written
+
+def flush_after_requests(blueprint):
+    """
+    Flush the unit of work after every request blueprint handles, so every
+    app that registers the blueprint writes its deferred saves (only when
+    the response is successful; a version conflict becomes a 409)
+    """
+    @blueprint.after_request
+    def flush_unit_of_work(response):
+        try:
+            flush_identity_map(current_app.db, commit=response.status_code < 400)
+        except ConcurrentModificationError as e:
+            logger.warning(f"Deferred save conflicted: {str(e)}")
+            response = jsonify({
+                'error': 'Conflict',
+                'message': 'The record was updated by another request; retry'
+            })
+            response.status_code = 409
+        return response
+    return blueprint
@@ -0,0 +1,124 @@
+import base64
+from pymongo import ASCENDING, DESCENDING
+from app.utils import cache_codec
+
+# Counting stops here; larger totals are reported as capped
+TOTAL_COUNT_LIMIT = 1000
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(sort_by, order, value, record_id, direction):
+    """Encode a position in a keyset-paginated listing as an opaque token"""
+    raw = cache_codec.dumps({
+        's': sort_by,
+        'o': order,
+        'v': value,
+        'i': record_id,
+        'd': direction
+    }, compress_threshold=-1)
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token, sort_by, order):
+    """
+    Decode a cursor produced by encode_cursor for the same sort and order.
+    
+    Raises:
+        InvalidCursor: If the token is malformed or was issued for another sort
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor = cache_codec.loads(base64.urlsafe_b64decode(padded.encode()))
+        if cursor['s'] != sort_by or cursor['o'] != order or cursor['d'] not in ('next', 'prev'):
+            raise InvalidCursor('Cursor does not match the requested sort order')
+        return cursor
+    except InvalidCursor:
+        raise
+    except Exception:
+        raise InvalidCursor('Malformed pagination cursor')
+
+class Page:
+    """One page of a keyset-paginated listing"""
+    
+    def __init__(self, items, next_cursor=None, prev_cursor=None, total=None, total_capped=False):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_capped = total_capped
+        
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+        
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def keyset_paginate(collection, query, sort_by, order='desc', per_page=10, cursor=None,
+                    projection=None, include_total=False):
+    """
+    Fetch one page of raw records ordered by (sort_by, _id).
+    
+    Instead of skipping over earlier pages, each page continues from the
+    (sort value, _id) of the last row the client saw, so every page costs one
+    index range scan no matter how deep it is. Requires an index on the
+    query's equality fields followed by sort_by and _id.
+    
+    Args:
+        collection: pymongo collection
+        query (dict): Equality filter, e.g. {'user_id': ...}
+        sort_by (str): Field to order by
+        order (str): 'asc' or 'desc'
+        per_page (int): Page size
+        cursor (str): Token from a previous page's next/prev cursor
+        projection (dict): Mongo projection; sort_by is always fetched
+        include_total (bool): Also count matches, up to TOTAL_COUNT_LIMIT
+        
+    Returns:
+        Page: items are raw Mongo documents
+    """
+    descending = order == 'desc'
+    position = decode_cursor(cursor, sort_by, order) if cursor else None
+    backwards = position is not None and position['d'] == 'prev'
+    
+    # Walking backwards flips both the comparison and the sort direction
+    scan_descending = descending != backwards
+    direction = DESCENDING if scan_descending else ASCENDING
+    comparison = '$lt' if scan_descending else '$gt'
+    
+    page_query = dict(query)
+    if position is not None:
+        page_query['$or'] = [
+            {sort_by: {comparison: position['v']}},
+            {sort_by: position['v'], '_id': {comparison: position['i']}}
+        ]
+    if projection is not None:
+        projection = dict(projection, **{sort_by: 1})
+        
+    rows = list(
+        collection.find(page_query, projection)
+        .sort([(sort_by, direction), ('_id', direction)])
+        .limit(per_page + 1)
+    )
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or backwards:
+            last = rows[-1]
+            next_cursor = encode_cursor(sort_by, order, last.get(sort_by), last['_id'], 'next')
+        if (has_more and backwards) or (position is not None and not backwards):
+            first = rows[0]
+            prev_cursor = encode_cursor(sort_by, order, first.get(sort_by), first['_id'], 'prev')
+            
+    total = None
+    total_capped = False
+    if include_total:
+        total = collection.count_documents(query, limit=TOTAL_COUNT_LIMIT)
+        total_capped = total >= TOTAL_COUNT_LIMIT
+        
+    return Page(rows, next_cursor, prev_cursor, total, total_capped)
@@ -0,0 +1,160 @@
+from app.config.cache import (
+    redis_client,
+    cache_hits_total,
+    cache_misses_total,
+    CACHE_CONFIG
+)
+from app.utils import cache_codec
+from app.utils.logger import logger
+
+# Raw Mongo records cached by lookup field, e.g. "record:users:email:a@b.c".
+# A lookup that found nothing is cached as an encoded None with a much
+# shorter TTL, so probing for missing ids or emails costs a Redis GET instead
+# of a Mongo query. Redis errors never fail a lookup; they fall back to Mongo.
+#
+# Invalidation overwrites the key with a short-lived tombstone instead of
+# deleting it, and lookups only populate a key with SET NX. A reader that
+# fetched the record from Mongo before a write therefore cannot put the old
+# copy back after the write has invalidated it; until the tombstone expires
+# lookups read Mongo without caching.
+RECORD_KEY_PREFIX = 'record'
+TOMBSTONE = b'tombstone'
+
+def record_key(collection_name, field, value):
+    """Return the cache key for a record looked up by field == value"""
+    return f"{RECORD_KEY_PREFIX}:{collection_name}:{field}:{value}"
+
+def _decode(raw):
+    """Return (found, record) for a cached value; tombstones are not found"""
+    if raw is None or raw == TOMBSTONE:
+        return False, None
+    return True, cache_codec.loads(raw)
+
+def _store(client, key, record):
+    if record is None:
+        ttl = CACHE_CONFIG['record_missing']['ttl']
+    else:
+        ttl = CACHE_CONFIG['record']['ttl']
+    client.set(key, cache_codec.dumps(record), ex=ttl, nx=True)
+
+def find_record(collection, field, value, projection=None):
+    """
+    Find one raw record by field, going through the record cache.
+    
+    Args:
+        collection: pymongo collection
+        field (str): Lookup field
+        value: Lookup value
+        projection (dict): Only fetch (and cache) these fields. Every lookup
+            of a collection must use the same projection, since they share
+            one key per record.
+            
+    Returns:
+        dict: The Mongo document, or None if it does not exist
+    """
+    key = record_key(collection.name, field, value)
+    try:
+        raw = redis_client.get(key)
+    except Exception as e:
+        logger.warning(f"Record cache read failed for {key}: {str(e)}")
+        raw = None
+        
+    found, record = _decode(raw)
+    if found:
+        cache_type = 'record' if record is not None else 'record_missing'
+        cache_hits_total.labels(cache_type=cache_type, tier='redis').inc()
+        return record
+        
+    cache_misses_total.labels(cache_type='record', tier='redis').inc()
+    record = collection.find_one({field: value}, projection)
+    try:
+        _store(redis_client, key, record)
+    except Exception as e:
+        logger.warning(f"Record cache write failed for {key}: {str(e)}")
+    return record
+
+def find_records(collection, field, values, projection=None):
+    """
+    Find many raw records by field, going through the record cache.
+    
+    Cached records (and cached misses) are read with one MGET; the rest are
+    fetched with one $in query and cached with one pipeline. projection is
+    as for find_record.
+    
+    Returns:
+        dict: value -> Mongo document, for the values that exist
+    """
+    values = list(dict.fromkeys(values))
+    if not values:
+        return {}
+    keys = {value: record_key(collection.name, field, value) for value in values}
+    try:
+        cached = redis_client.mget(list(keys.values()))
+    except Exception as e:
+        logger.warning(f"Record cache read failed for {len(keys)} records: {str(e)}")
+        cached = [None] * len(values)
+        
+    records = {}
+    missing = []
+    for value, raw in zip(values, cached):
+        hit, record = _decode(raw)
+        if not hit:
+            missing.append(value)
+        elif record is not None:
+            records[value] = record
+    hits = len(values) - len(missing)
+    if records:
+        cache_hits_total.labels(cache_type='record', tier='redis').inc(len(records))
+    if hits > len(records):
+        cache_hits_total.labels(cache_type='record_missing', tier='redis').inc(hits - len(records))
+    if not missing:
+        return records
+        
+    cache_misses_total.labels(cache_type='record', tier='redis').inc(len(missing))
+    found = {record[field]: record for record in collection.find({field: {'$in': missing}}, projection)}
+    records.update(found)
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for value in missing:
+            _store(pipeline, keys[value], found.get(value))
+        pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Record cache write failed for {len(missing)} records: {str(e)}")
+    return records
+
+def _bury(keys):
+    """Replace keys with tombstones, which lookups do not overwrite"""
+    pipeline = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipeline.set(key, TOMBSTONE, ex=CACHE_CONFIG['record_tombstone']['ttl'])
+    pipeline.execute()
+
+def invalidate_records(collection_name, **lookups):
+    """
+    Drop cached records (and cached misses) after a write.
+    
+    Args:
+        collection_name (str): Mongo collection name
+        **lookups: field=value pairs the record can be looked up by
+    """
+    keys = [
+        record_key(collection_name, field, value)
+        for field, value in lookups.items()
+        if value is not None
+    ]
+    if not keys:
+        return
+    try:
+        _bury(keys)
+    except Exception as e:
+        logger.warning(f"Record cache invalidation failed for {keys}: {str(e)}")
+
+def invalidate_record_ids(collection_name, ids):
+    """Drop cached records for many _ids with a single pipeline"""
+    keys = [record_key(collection_name, '_id', record_id) for record_id in ids]
+    if not keys:
+        return
+    try:
+        _bury(keys)
+    except Exception as e:
+        logger.warning(f"Record cache invalidation failed for {len(keys)} records: {str(e)}")
@@ -0,0 +1,88 @@
+import math
+from bson import ObjectId
+from datetime import datetime, timedelta
+from app.models.base import Record
+from app.services.storage_service import MIN_PART_SIZE, MAX_PARTS
+
+class UploadSession(Record):
+    """
+    A direct-to-S3 multipart upload in progress.
+    
+    The client uploads the parts itself with presigned URLs; the session
+    remembers what it declared so the completed object can be checked before
+    a Document is created for it.
+    """
+    
+    __slots__ = (
+        'user_id', 's3_key', 'upload_id', 'filename', 'document_type',
+        'description', 'file_size', 'part_size', 'created_at', 'expires_at'
+    )
+    
+    FIELDS = {
+        'user_id': None,
+        's3_key': None,
+        'upload_id': None,
+        'filename': None,
+        'document_type': '',
+        'description': '',
+        'file_size': None,
+        'part_size': None,
+        'created_at': datetime.utcnow,
+        'expires_at': None
+    }
+    
+    def __init__(self, user_id, s3_key, upload_id, filename, file_size,
+                 document_type='', description='', ttl=timedelta(hours=24)):
+        self.user_id = user_id
+        self.s3_key = s3_key
+        self.upload_id = upload_id
+        self.filename = filename
+        self.document_type = document_type
+        self.description = description
+        self.file_size = file_size
+        self.part_size = self.choose_part_size(file_size)
+        self.created_at = datetime.utcnow()
+        self.expires_at = self.created_at + ttl
+        
+    @staticmethod
+    def choose_part_size(file_size):
+        """Smallest allowed part size that fits file_size in MAX_PARTS parts"""
+        return max(MIN_PART_SIZE, math.ceil(file_size / MAX_PARTS))
+        
+    @property
+    def part_count(self):
+        return max(1, math.ceil(self.file_size / self.part_size))
+        
+    def part_sizes(self, part_numbers=None):
+        """Return part number -> exact size for the given (default: all) parts"""
+        if part_numbers is None:
+            part_numbers = range(1, self.part_count + 1)
+        last_size = self.file_size - (self.part_count - 1) * self.part_size
+        return {
+            part_number: last_size if part_number == self.part_count else self.part_size
+            for part_number in part_numbers
+        }
+        
+    def is_expired(self):
+        return datetime.utcnow() > self.expires_at
+        
+    def save(self, db):
+        self.persist(db.upload_sessions)
+        return self
+        
+    def delete(self, db):
+        if hasattr(self, 'id'):
+            db.upload_sessions.delete_one({'_id': self.id})
+            
+    @staticmethod
+    def find_by_id(db, session_id, user_id=None):
+        try:
+            query = {'_id': ObjectId(session_id)}
+        except:
+            return None
+        if user_id is not None:
+            query['user_id'] = user_id
+        session_data = db.upload_sessions.find_one(query)
+        if session_data:
+            return UploadSession.from_mongo(session_data)
+        return None
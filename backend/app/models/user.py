@@ -2,8 +2,34 @@ from bson import ObjectId
 from datetime import datetime, timedelta
 import secrets
 import bcrypt
+from app.models.base import Record
+from app.models.record_cache import find_record, invalidate_records
+from app.models.identity_map import find_mapped, map_record
 
-class User:
+class User(Record):
+    __slots__ = (
+        'email', 'password', 'name', 'role', 'created_at',
+        'reset_token', 'reset_token_expires', 'is_active'
+    )
+    
+    FIELDS = {
+        'email': None,
+        'password': None,
+        'name': '',
+        'role': 'user',
+        'created_at': datetime.utcnow,
+        'reset_token': None,
+        'reset_token_expires': None,
+        'is_active': True
+    }
+    
+    # Fields needed to authorize a request
+    AUTH_FIELDS = ('role', 'is_active')
+    
+    # Everything but the password hash and reset token. Only this subset goes
+    # through the record cache, so credentials are never copied to Redis.
+    PROFILE_FIELDS = ('email', 'name', 'role', 'created_at', 'is_active')
+    
     def __init__(self, email, password, name='', role='user'):
         self.email = email
         self.password = password
@@ -15,14 +41,8 @@ class User:
         self.is_active = True
         
     def save(self, db):
-        if not hasattr(self, 'id'):
-            result = db.users.insert_one(self.__dict__)
-            self.id = result.inserted_id
-        else:
-            db.users.update_one(
-                {'_id': self.id},
-                {'$set': self.__dict__}
-            )
+        if self.persist(db.users):
+            invalidate_records('users', _id=self.id, email=getattr(self, 'email', None))
         return self
         
     def generate_reset_token(self):
@@ -43,61 +63,41 @@ class User:
         self.reset_token_expires = None
         
     @staticmethod
-    def find_by_email(db, email):
-        user_data = db.users.find_one({'email': email})
-        if user_data:
-            user = User(
-                email=user_data['email'],
-                password=user_data['password'],
-                name=user_data.get('name', ''),
-                role=user_data.get('role', 'user')
-            )
-            user.id = user_data['_id']
-            user.created_at = user_data['created_at']
-            user.is_active = user_data.get('is_active', True)
-            user.reset_token = user_data.get('reset_token')
-            user.reset_token_expires = user_data.get('reset_token_expires')
-            return user
-        return None
+    def _find_one(db, field, value, fields):
+        # Whole records and other subsets are read from Mongo directly
+        if fields == User.PROFILE_FIELDS:
+            return find_record(db.users, field, value, User.projection(fields))
+        return db.users.find_one({field: value}, User.projection(fields))
         
     @staticmethod
-    def find_by_id(db, user_id):
-        try:
-            user_data = db.users.find_one({'_id': ObjectId(user_id)})
+    def find_by_email(db, email, fields=None):
+        user_data = User._find_one(db, 'email', email, fields)
+        if not user_data:
+            return None
+        if fields is not None:
+            return User.from_mongo(user_data, fields)
+        return map_record(User.from_mongo(user_data))
+        
+    @staticmethod
+    def find_by_id(db, user_id, fields=None):
+        def load(fields):
+            user_data = User._find_one(db, '_id', user_id, fields)
             if user_data:
-                user = User(
-                    email=user_data['email'],
-                    password=user_data['password'],
-                    name=user_data.get('name', ''),
-                    role=user_data.get('role', 'user')
-                )
-                user.id = user_data['_id']
-                user.created_at = user_data['created_at']
-                user.is_active = user_data.get('is_active', True)
-                user.reset_token = user_data.get('reset_token')
-                user.reset_token_expires = user_data.get('reset_token_expires')
-                return user
+                return User.from_mongo(user_data, fields)
+            return None
+            
+        try:
+            user_id = ObjectId(user_id)
         except:
-            pass
-        return None
+            return None
+        return find_mapped(User, user_id, load, fields)
         
     @staticmethod
-    def find_by_reset_token(db, token):
+    def find_by_reset_token(db, token, fields=None):
         user_data = db.users.find_one({
             'reset_token': token,
             'reset_token_expires': {'$gt': datetime.utcnow()}
-        })
+        }, User.projection(fields))
         if user_data:
-            user = User(
-                email=user_data['email'],
-                password=user_data['password'],
-                name=user_data.get('name', ''),
-                role=user_data.get('role', 'user')
-            )
-            user.id = user_data['_id']
-            user.created_at = user_data['created_at']
-            user.is_active = user_data.get('is_active', True)
-            user.reset_token = user_data.get('reset_token')
-            user.reset_token_expires = user_data.get('reset_token_expires')
-            return user
-        return None 
\ No newline at end of file
+            return User.from_mongo(user_data, fields)
+        return None
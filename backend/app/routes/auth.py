@@ -2,13 +2,17 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from werkzeug.security import generate_password_hash, check_password_hash
 from app.models.user import User
+from app.models.base import ConcurrentModificationError
+from app.models.identity_map import defer_save, flush_after_requests
+from app.utils.jwt_helper import admin_required
+from app.utils.revocation import revoke_user_claims
 from app import db
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 
-auth_bp = Blueprint('auth', __name__)
+auth_bp = flush_after_requests(Blueprint('auth', __name__))
 
 def send_reset_email(user_email, reset_token):
     """Send password reset email"""
@@ -38,19 +42,6 @@ def send_reset_email(user_email, reset_token):
         print(f"Error sending email: {str(e)}")
         return False
 
-def admin_required():
-    """Decorator to require admin role"""
-    def wrapper(fn):
-        @jwt_required()
-        def decorator(*args, **kwargs):
-            current_user_id = get_jwt_identity()
-            user = User.find_by_id(db, current_user_id)
-            if not user or user.role != 'admin':
-                return jsonify({'error': 'Admin privileges required'}), 403
-            return fn(*args, **kwargs)
-        return decorator
-    return wrapper
-
 @auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -58,7 +49,7 @@ def register():
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'error': 'Missing required fields'}), 400
         
-    if User.find_by_email(db, data['email']):
+    if User.find_by_email(db, data['email'], fields=User.PROFILE_FIELDS):
         return jsonify({'error': 'Email already registered'}), 409
         
     user = User(
@@ -114,7 +105,7 @@ def login():
 @jwt_required()
 def get_current_user():
     current_user_id = get_jwt_identity()
-    user = User.find_by_id(db, current_user_id)
+    user = User.find_by_id(db, current_user_id, fields=User.PROFILE_FIELDS)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -190,20 +181,37 @@ def get_users():
 @admin_required()
 def update_user(user_id):
     data = request.get_json()
-    user = User.find_by_id(db, user_id)
+    user = User.find_by_id(db, user_id, fields=User.PROFILE_FIELDS)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
         
-    if 'role' in data:
+    claims_changed = False
+    if 'role' in data and data['role'] != user.role:
         user.role = data['role']
-    if 'is_active' in data:
+        claims_changed = True
+    if 'is_active' in data and data['is_active'] != user.is_active:
         user.is_active = data['is_active']
+        claims_changed = True
     if 'name' in data:
         user.name = data['name']
         
-    user.save(db)
-    
+    if claims_changed:
+        # Tokens already issued still carry the old role; make every
+        # worker re-check this user against the database. The new role
+        # has to be stored (and the cached record dropped) before that,
+        # so the save cannot wait for the end of the request.
+        try:
+            user.save(db)
+        except ConcurrentModificationError:
+            return jsonify({
+                'error': 'Conflict',
+                'message': 'The record was updated by another request; retry'
+            }), 409
+        revoke_user_claims(user.id)
+    else:
+        defer_save(user, db)
+        
     return jsonify({
         'message': 'User updated successfully',
         'user': {
@@ -2,22 +2,27 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 import os
+import time
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from marshmallow import Schema, fields, ValidationError
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from app.models.document import Document
+from app.models.pagination import InvalidCursor
+from app.models.upload_session import UploadSession
+from app.models.identity_map import flush_after_requests
 from app.services.ocr_service import OCRService
 from app.services.ai_service import AIService
 from app.services.storage_service import StorageService
+from app.services.ingestion_service import IngestionService, UploadRejected, get_magic
+from app.services.blob_service import BlobService, blob_config
 from app import db
-from flask_caching import Cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-documents_bp = Blueprint('documents', __name__)
+documents_bp = flush_after_requests(Blueprint('documents', __name__))
 
 # Initialize rate limiter
 limiter = Limiter(
@@ -44,17 +49,6 @@ class DocumentUploadSchema(Schema):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def validate_file_type(file):
-    try:
-        import magic
-        mime = magic.Magic(mime=True)
-        file_type = mime.from_buffer(file.read(2048))
-        file.seek(0)
-        return file_type in ALLOWED_MIME_TYPES
-    except Exception as e:
-        logger.error(f"Error validating file type: {str(e)}")
-        return False
-
 # Error handlers
 @documents_bp.errorhandler(ValidationError)
 def handle_validation_error(error):
@@ -85,34 +79,47 @@ def upload_document():
         if not allowed_file(file.filename):
             return jsonify({'error': 'File type not allowed'}), 400
             
-        if not validate_file_type(file):
+        # Sniff, size-check, hash and upload the file in one pass
+        blob_service = BlobService(db) if blob_config['enabled'] else None
+        try:
+            upload_result = IngestionService().ingest(
+                file,
+                get_jwt_identity(),
+                max_size=MAX_FILE_SIZE,
+                allowed_mime_types=ALLOWED_MIME_TYPES,
+                blob_service=blob_service
+            )
+        except UploadRejected as e:
+            if e.reason == 'size':
+                return jsonify({'error': 'File size exceeds limit'}), 400
             return jsonify({'error': 'Invalid file type'}), 400
             
-        if file.content_length > MAX_FILE_SIZE:
-            return jsonify({'error': 'File size exceeds limit'}), 400
-            
-        # Secure filename
-        filename = secure_filename(file.filename)
-        
-        # Upload file to S3
-        storage_service = StorageService()
-        upload_result = storage_service.upload_file(file, get_jwt_identity())
-        
         # Create document record
         document = Document(
             user_id=get_jwt_identity(),
-            filename=upload_result['original_filename'],
-            s3_key=upload_result['s3_key'],
+            filename=upload_result.original_filename,
+            s3_key=upload_result.s3_key,
             document_type=data.get('document_type', ''),
             description=data.get('description', ''),
-            file_size=file.content_length,
-            mime_type=file.content_type
+            file_size=upload_result.size,
+            mime_type=upload_result.mime_type,
+            content_sha256=upload_result.sha256,
+            storage_metadata=upload_result.storage_metadata()
         )
         
-        document.save(db)
-        
+        try:
+            document.save(db)
+        except Exception:
+            if blob_service is not None:
+                blob_service.release(upload_result.sha256)
+            raise
+            
+            
         # Log successful upload
-        logger.info(f"Document uploaded successfully: {document.id}")
+        logger.info(
+            f"Document uploaded successfully: {document.id}"
+            + (' (deduplicated)' if upload_result.deduplicated else '')
+        )
         
         return jsonify({
             'message': 'Document uploaded successfully',
@@ -122,7 +129,7 @@ def upload_document():
                 'document_type': document.document_type,
                 'description': document.description,
                 'created_at': document.created_at.isoformat(),
-                'url': upload_result['url'],
+                'url': document.get_url(),
                 'file_size': document.file_size,
                 'mime_type': document.mime_type
             }
@@ -138,52 +145,244 @@ def upload_document():
             'message': str(e)
         }), 500
 
-cache = Cache()
+# Direct-to-S3 uploads: the client sends file bytes straight to S3 with
+# presigned part URLs, so workers only handle these small control requests
+UPLOAD_URL_EXPIRES = 3600
+
+class UploadSessionSchema(Schema):
+    filename = fields.Str(required=True)
+    file_size = fields.Int(required=True)
+    content_type = fields.Str(required=True)
+    document_type = fields.Str(required=False, allow_none=True)
+    description = fields.Str(required=False, allow_none=True)
+
+def upload_session_response(session, storage_service, uploaded_parts=()):
+    """Session state plus fresh URLs for every part S3 does not have yet"""
+    uploaded = {part['PartNumber'] for part in uploaded_parts}
+    missing = [n for n in range(1, session.part_count + 1) if n not in uploaded]
+    urls = storage_service.presign_upload_parts(
+        session.s3_key,
+        session.upload_id,
+        session.part_sizes(missing),
+        expires_in=UPLOAD_URL_EXPIRES
+    )
+    return {
+        'upload_id': str(session.id),
+        'part_size': session.part_size,
+        'part_count': session.part_count,
+        'expires_at': session.expires_at.isoformat(),
+        'uploaded_parts': [
+            {'part_number': part['PartNumber'], 'etag': part['ETag']}
+            for part in uploaded_parts
+        ],
+        'parts': [{'part_number': n, 'url': urls[n]} for n in missing]
+    }
+
+@documents_bp.route('/uploads', methods=['POST'])
+@jwt_required()
+@limiter.limit("5 per minute")
+def create_upload_session():
+    try:
+        data = UploadSessionSchema().load(request.get_json(silent=True) or {})
+        
+        if not allowed_file(data['filename']):
+            return jsonify({'error': 'File type not allowed'}), 400
+        if data['content_type'] not in ALLOWED_MIME_TYPES:
+            return jsonify({'error': 'Invalid file type'}), 400
+        if data['file_size'] <= 0 or data['file_size'] > MAX_FILE_SIZE:
+            return jsonify({'error': 'File size exceeds limit'}), 400
+            
+        user_id = get_jwt_identity()
+        filename = secure_filename(data['filename'])
+        storage_service = StorageService()
+        s3_key = storage_service.new_document_key(user_id, filename)
+        upload_id = storage_service.create_multipart_upload(
+            s3_key,
+            data['content_type'],
+            metadata={
+                'original_filename': filename,
+                'uploaded_by': user_id,
+                'upload_date': datetime.utcnow().isoformat()
+            }
+        )
+        
+        session = UploadSession(
+            user_id=user_id,
+            s3_key=s3_key,
+            upload_id=upload_id,
+            filename=filename,
+            file_size=data['file_size'],
+            document_type=data.get('document_type') or '',
+            description=data.get('description') or ''
+        ).save(db)
+        
+        return jsonify(upload_session_response(session, storage_service)), 201
+        
+    except ValidationError as e:
+        return jsonify({'error': 'Validation error', 'details': e.messages}), 400
+    except Exception as e:
+        logger.error(f"Failed to start upload: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Failed to start upload',
+            'message': str(e)
+        }), 500
+
+@documents_bp.route('/uploads/<session_id>', methods=['GET'])
+@jwt_required()
+def resume_upload_session(session_id):
+    """List the parts S3 already has and re-sign URLs for the rest"""
+    try:
+        session = UploadSession.find_by_id(db, session_id, user_id=get_jwt_identity())
+        if not session or session.is_expired():
+            return jsonify({'error': 'Upload not found'}), 404
+            
+        storage_service = StorageService()
+        uploaded_parts = storage_service.list_uploaded_parts(session.s3_key, session.upload_id)
+        return jsonify(upload_session_response(session, storage_service, uploaded_parts)), 200
+        
+    except Exception as e:
+        logger.error(f"Failed to resume upload {session_id}: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Failed to resume upload',
+            'message': str(e)
+        }), 500
+
+@documents_bp.route('/uploads/<session_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload_session(session_id):
+    try:
+        session = UploadSession.find_by_id(db, session_id, user_id=get_jwt_identity())
+        if not session or session.is_expired():
+            return jsonify({'error': 'Upload not found'}), 404
+            
+        # S3's own part list is authoritative; ETags the client reports
+        # are not needed
+        storage_service = StorageService()
+        uploaded_parts = storage_service.list_uploaded_parts(session.s3_key, session.upload_id)
+        uploaded = {part['PartNumber'] for part in uploaded_parts}
+        missing = [n for n in range(1, session.part_count + 1) if n not in uploaded]
+        if missing:
+            return jsonify({'error': 'Upload incomplete', 'missing_parts': missing}), 409
+            
+        storage_service.complete_multipart_upload(session.s3_key, session.upload_id, uploaded_parts)
+        
+        # Part sizes were signed, so the size is exact; the content still
+        # has to be what the client claimed it was
+        metadata = storage_service.get_file_metadata(session.s3_key)
+        mime_type = get_magic().from_buffer(storage_service.read_file_head(session.s3_key, 2048))
+        if (not metadata or metadata['content_length'] != session.file_size
+                or mime_type not in ALLOWED_MIME_TYPES):
+            storage_service.delete_file(session.s3_key)
+            session.delete(db)
+            return jsonify({'error': 'Invalid file type'}), 400
+            
+        document = Document(
+            user_id=session.user_id,
+            filename=session.filename,
+            s3_key=session.s3_key,
+            document_type=session.document_type,
+            description=session.description,
+            file_size=session.file_size,
+            mime_type=mime_type,
+            storage_metadata=metadata
+        ).save(db)
+        session.delete(db)
+        
+        logger.info(f"Document uploaded directly to S3: {document.id}")
+        
+        return jsonify({
+            'message': 'Document uploaded successfully',
+            'document': {
+                'id': str(document.id),
+                'filename': document.filename,
+                'document_type': document.document_type,
+                'description': document.description,
+                'created_at': document.created_at.isoformat(),
+                'url': document.get_url(),
+                'file_size': document.file_size,
+                'mime_type': document.mime_type
+            }
+        }), 201
+        
+    except Exception as e:
+        logger.error(f"Failed to complete upload {session_id}: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Failed to complete upload',
+            'message': str(e)
+        }), 500
+
+@documents_bp.route('/uploads/<session_id>', methods=['DELETE'])
+@jwt_required()
+def abort_upload_session(session_id):
+    try:
+        session = UploadSession.find_by_id(db, session_id, user_id=get_jwt_identity())
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+            
+        StorageService().abort_multipart_upload(session.s3_key, session.upload_id)
+        session.delete(db)
+        return jsonify({'message': 'Upload aborted'}), 200
+        
+    except Exception as e:
+        logger.error(f"Failed to abort upload {session_id}: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Failed to abort upload',
+            'message': str(e)
+        }), 500
+
+MAX_PER_PAGE = 100
 
 @documents_bp.route('/', methods=['GET'])
 @jwt_required()
-@cache.cached(timeout=300)  # Cache for 5 minutes
 def get_documents():
     try:
         user_id = get_jwt_identity()
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        per_page = min(max(request.args.get('per_page', 10, type=int), 1), MAX_PER_PAGE)
+        cursor = request.args.get('cursor')
         document_type = request.args.get('type')
         sort_by = request.args.get('sort_by', 'created_at')
         order = request.args.get('order', 'desc')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
         
-        # Get paginated documents
-        documents = Document.find_by_user_id_paginated(
-            db, 
-            user_id,
-            page=page,
-            per_page=per_page,
-            document_type=document_type,
-            sort_by=sort_by,
-            order=order
-        )
+        if sort_by not in Document.SORT_FIELDS:
+            return jsonify({'error': f"sort_by must be one of {', '.join(Document.SORT_FIELDS)}"}), 400
+        if order not in ('asc', 'desc'):
+            return jsonify({'error': 'order must be asc or desc'}), 400
+            
+        # Get one page of documents, continuing from the cursor if given
+        try:
+            documents = Document.find_by_user_id_paginated(
+                db,
+                user_id,
+                per_page=per_page,
+                cursor=cursor,
+                document_type=document_type,
+                sort_by=sort_by,
+                order=order,
+                include_total=include_total,
+                fields=()
+            )
+        except InvalidCursor as e:
+            return jsonify({'error': 'Invalid cursor', 'message': str(e)}), 400
+        entries = Document.list_entries(db, documents.items)
+        urls = StorageService().get_file_urls([entry['s3_key'] for entry in entries])
+        for entry in entries:
+            entry['url'] = urls.get(entry.pop('s3_key'))
         
+        pagination = {
+            'per_page': per_page,
+            'has_next': documents.has_next,
+            'has_prev': documents.has_prev,
+            'next_cursor': documents.next_cursor,
+            'prev_cursor': documents.prev_cursor
+        }
+        if include_total:
+            pagination['total'] = documents.total
+            pagination['total_capped'] = documents.total_capped
+            
         return jsonify({
-            'documents': [{
-                'id': str(doc.id),
-                'filename': doc.filename,
-                'document_type': doc.document_type,
-                'description': doc.description,
-                'created_at': doc.created_at.isoformat(),
-                'verification_status': doc.verification_status,
-                'url': doc.get_url(),
-                'file_size': doc.file_size,
-                'mime_type': doc.mime_type
-            } for doc in documents.items],
-            'pagination': {
-                'total': documents.total,
-                'pages': documents.pages,
-                'current_page': documents.page,
-                'has_next': documents.has_next,
-                'has_prev': documents.has_prev,
-                'next_page': documents.next_num if documents.has_next else None,
-                'prev_page': documents.prev_num if documents.has_prev else None
-            }
+            'documents': entries,
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -195,7 +394,6 @@ def get_documents():
 
 @documents_bp.route('/<document_id>', methods=['GET'])
 @jwt_required()
-@cache.cached(timeout=300)
 def get_document(document_id):
     try:
         user_id = get_jwt_identity()
@@ -217,7 +415,7 @@ def get_document(document_id):
                 'verification_status': document.verification_status,
                 'verification_results': document.verification_results,
                 'url': document.get_url(),
-                'metadata': document.get_metadata(),
+                'metadata': document.get_metadata(live=request.args.get('live') == 'true'),
                 'file_size': document.file_size,
                 'mime_type': document.mime_type
             }
@@ -235,7 +433,7 @@ def get_document(document_id):
 def delete_document(document_id):
     try:
         user_id = get_jwt_identity()
-        document = Document.find_by_id(db, document_id)
+        document = Document.find_by_id(db, document_id, fields=Document.STORAGE_FIELDS)
         
         if not document:
             return jsonify({'error': 'Document not found'}), 404
@@ -246,10 +444,6 @@ def delete_document(document_id):
         # Delete document (this will also delete from S3)
         document.delete(db)
         
-        # Clear cache
-        cache.delete_memoized(get_document, document_id)
-        cache.delete_memoized(get_documents)
-        
         logger.info(f"Document deleted successfully: {document_id}")
         return jsonify({'message': 'Document deleted successfully'}), 200
         
@@ -260,12 +454,140 @@ def delete_document(document_id):
             'message': str(e)
         }), 500
 
+# Bulk operations
+BULK_LIMIT = 1000
+BULK_UPDATE_FIELDS = ('document_type', 'description')
+
+def get_bulk_ids(data):
+    """Validate the ids list of a bulk request; returns (ids, error response)"""
+    ids = (data or {}).get('ids')
+    if not isinstance(ids, list) or not ids:
+        return None, (jsonify({'error': 'ids must be a non-empty list'}), 400)
+    if len(ids) > BULK_LIMIT:
+        return None, (jsonify({'error': f"At most {BULK_LIMIT} ids per request"}), 400)
+    return list(dict.fromkeys(str(document_id) for document_id in ids)), None
+
+@documents_bp.route('/bulk/fetch', methods=['POST'])
+@jwt_required()
+def bulk_fetch_documents():
+    try:
+        ids, error = get_bulk_ids(request.get_json(silent=True))
+        if error:
+            return error
+            
+        documents = Document.find_by_ids(
+            db, ids, user_id=get_jwt_identity(), fields=Document.LIST_FIELDS, cached=True
+        )
+        urls = Document.get_urls(documents.values())
+        
+        results = []
+        for document_id in ids:
+            doc = documents.get(document_id)
+            if doc is None:
+                results.append({'id': document_id, 'status': 'not_found'})
+                continue
+            results.append({
+                'id': document_id,
+                'status': 'ok',
+                'document': {
+                    'id': document_id,
+                    'filename': doc.filename,
+                    'document_type': doc.document_type,
+                    'description': doc.description,
+                    'created_at': doc.created_at.isoformat(),
+                    'verification_status': doc.verification_status,
+                    'url': urls.get(doc.s3_key),
+                    'file_size': doc.file_size,
+                    'mime_type': doc.mime_type
+                }
+            })
+        return jsonify({'results': results}), 200
+        
+    except Exception as e:
+        logger.error(f"Bulk fetch failed: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Bulk fetch failed',
+            'message': str(e)
+        }), 500
+
+@documents_bp.route('/bulk/delete', methods=['POST'])
+@jwt_required()
+def bulk_delete_documents():
+    try:
+        ids, error = get_bulk_ids(request.get_json(silent=True))
+        if error:
+            return error
+            
+        documents = Document.find_by_ids(db, ids, user_id=get_jwt_identity(), fields=Document.STORAGE_FIELDS)
+        errors = Document.delete_many(db, documents.values())
+        
+        results = []
+        for document_id in ids:
+            if document_id not in documents:
+                results.append({'id': document_id, 'status': 'not_found'})
+            elif errors.get(document_id):
+                results.append({'id': document_id, 'status': 'error', 'message': errors[document_id]})
+            else:
+                results.append({'id': document_id, 'status': 'deleted'})
+                
+        logger.info(f"Bulk deleted {sum(r['status'] == 'deleted' for r in results)} documents")
+        return jsonify({'results': results}), 200
+        
+    except Exception as e:
+        logger.error(f"Bulk delete failed: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Bulk delete failed',
+            'message': str(e)
+        }), 500
+
+@documents_bp.route('/bulk/update', methods=['POST'])
+@jwt_required()
+def bulk_update_documents():
+    try:
+        updates = (request.get_json(silent=True) or {}).get('updates')
+        if not isinstance(updates, list) or not updates:
+            return jsonify({'error': 'updates must be a non-empty list'}), 400
+        if len(updates) > BULK_LIMIT:
+            return jsonify({'error': f"At most {BULK_LIMIT} updates per request"}), 400
+            
+        changes = {}
+        for update in updates:
+            if not isinstance(update, dict) or 'id' not in update:
+                return jsonify({'error': 'Each update needs an id'}), 400
+            fields = {name: update[name] for name in BULK_UPDATE_FIELDS if name in update}
+            if not fields:
+                return jsonify({'error': f"Nothing to update for {update['id']}"}), 400
+            changes.setdefault(str(update['id']), {}).update(fields)
+            
+        documents = Document.find_by_ids(db, list(changes), user_id=get_jwt_identity(), fields=BULK_UPDATE_FIELDS)
+        for document_id, doc in documents.items():
+            for name, value in changes[document_id].items():
+                setattr(doc, name, value)
+        errors = Document.save_many(db, documents.values())
+        
+        results = []
+        for document_id in changes:
+            if document_id not in documents:
+                results.append({'id': document_id, 'status': 'not_found'})
+            elif errors.get(document_id):
+                results.append({'id': document_id, 'status': 'conflict', 'message': errors[document_id]})
+            else:
+                results.append({'id': document_id, 'status': 'updated'})
+        return jsonify({'results': results}), 200
+        
+    except Exception as e:
+        logger.error(f"Bulk update failed: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Bulk update failed',
+            'message': str(e)
+        }), 500
+
 @documents_bp.route('/<document_id>/url', methods=['GET'])
 @jwt_required()
 def get_document_url(document_id):
     try:
         user_id = get_jwt_identity()
-        document = Document.find_by_id(db, document_id)
+        document = Document.find_by_id(db, document_id, fields=('user_id', 's3_key'))
         
         if not document:
             return jsonify({'error': 'Document not found'}), 404
@@ -277,21 +599,18 @@ def get_document_url(document_id):
         download = request.args.get('download', default=False, type=bool)
         watermark = request.args.get('watermark', default=False, type=bool)
         
-        url = document.get_url(
-            expires_in=expires_in,
-            download=download,
-            watermark=watermark
-        )
+        # A cached URL may have less than expires_in left; report its own expiry
+        url, expires_at = document.get_expiring_url(expires_in=expires_in)
         
         if not url:
             return jsonify({'error': 'Failed to generate URL'}), 500
             
         return jsonify({
             'url': url,
-            'expires_in': expires_in,
+            'expires_in': max(int(expires_at - time.time()), 0),
             'download': download,
             'watermark': watermark,
-            'expires_at': (datetime.utcnow() + timedelta(seconds=expires_in)).isoformat()
+            'expires_at': datetime.utcfromtimestamp(expires_at).isoformat()
         }), 200
         
     except Exception as e:
@@ -1,12 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app
+import json
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.document import Document
-from app.services.ocr_service import OCRService
+from app.models.identity_map import defer_save, flush_after_requests
+from app.services.ocr_service import OCRService, DOCUMENT_FIELDS
 from app.services.ai_service import AIService
 from app.services.blockchain_service import BlockchainService
+from app.services.object_cache import object_cache
+from app.services.ocr_pool import OCRPoolBusy
+from app.utils.logger import logger
 from app import db
 
-verification_bp = Blueprint('verification', __name__)
+verification_bp = flush_after_requests(Blueprint('verification', __name__))
 
 ocr_service = OCRService()
 ai_service = AIService()
@@ -25,21 +30,34 @@ def verify_document(document_id):
         return jsonify({'error': 'Unauthorized'}), 403
         
     try:
-        # Perform OCR
-        ocr_results = ocr_service.analyze_document(document.file_path)
-        
-        # Perform AI verification
-        ai_results = ai_service.verify_document(
-            document.file_path,
-            document.document_type
-        )
-        
-        # Analyze document content
-        content_analysis = ai_service.analyze_document_content(
-            document.file_path,
-            ocr_results['extracted_text']
-        )
-        
+        # Documents live in S3; work from the shared local copy, which
+        # re-verifications and other workers on this host reuse
+        storage_metadata = document.storage_metadata or {}
+        with object_cache.open(
+            document.s3_key,
+            etag=storage_metadata.get('etag'),
+            size=storage_metadata.get('content_length')
+        ) as cached, ocr_service.prepare(cached.data, digest=document.content_sha256) as prepared:
+            # OCR and AI verification share one preprocessed copy of the
+            # memory-mapped file; repeat content is served from the OCR
+            # cache by its digest without preprocessing
+            ocr_results = ocr_service.analyze_document(
+                prepared,
+                required_fields=DOCUMENT_FIELDS.get(document.document_type)
+            )
+            
+            # Perform AI verification
+            ai_results = ai_service.verify_document(
+                prepared.path,
+                document.document_type
+            )
+            
+            # Analyze document content
+            content_analysis = ai_service.analyze_document_content(
+                prepared.path,
+                ocr_results['extracted_text']
+            )
+            
         # Record verification on blockchain
         blockchain_record = blockchain_service.record_verification(
             document_id=str(document.id),
@@ -58,19 +76,93 @@ def verify_document(document_id):
             'content_analysis': content_analysis,
             'blockchain_record': blockchain_record
         }
-        document.save(db)
+        # Written once the request succeeds; a concurrent update turns
+        # the response into a 409
+        defer_save(document, db)
         
         return jsonify({
             'message': 'Document verification completed',
             'verification_results': document.verification_results
         }), 200
         
+    except OCRPoolBusy:
+        response = jsonify({'error': 'Verification is busy, please retry shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
     except Exception as e:
         return jsonify({
             'error': 'Verification failed',
             'message': str(e)
         }), 500
 
+def _ocr_page_lines(document, max_pages, required_fields):
+    storage_metadata = document.storage_metadata or {}
+    with object_cache.open(
+        document.s3_key,
+        etag=storage_metadata.get('etag'),
+        size=storage_metadata.get('content_length')
+    ) as cached, ocr_service.prepare(cached.data, digest=document.content_sha256) as prepared:
+        for page in ocr_service.stream_pages(prepared, max_pages=max_pages, required_fields=required_fields):
+            yield json.dumps(page) + '\n'
+
+@verification_bp.route('/ocr/<document_id>/pages', methods=['GET'])
+@jwt_required()
+def stream_ocr_pages(document_id):
+    """
+    OCR a PDF and stream its pages as NDJSON, one
+    {'page', 'text', 'method', 'seconds'} line per page as soon as it is
+    read (in completion order), so clients can show the first pages of a
+    long scan while the rest are still being read. Reading stops once the
+    document type's fields are found, unless all_pages=true. Not cached,
+    and nothing is stored on the document.
+    """
+    user_id = get_jwt_identity()
+    document = Document.find_by_id(
+        db,
+        document_id,
+        fields=('user_id', 's3_key', 'storage_metadata', 'content_sha256', 'mime_type', 'document_type')
+    )
+    
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
+        
+    if str(document.user_id) != user_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+        
+    if document.mime_type != 'application/pdf':
+        return jsonify({'error': 'Only PDF documents can be read page by page'}), 400
+        
+    required_fields = None
+    if request.args.get('all_pages', 'false').lower() != 'true':
+        required_fields = DOCUMENT_FIELDS.get(document.document_type)
+    lines = _ocr_page_lines(document, request.args.get('max_pages', type=int), required_fields)
+    
+    # Read the first page before answering, so a missing file or a busy
+    # OCR pool still gets a proper status code
+    try:
+        first = next(lines, '')
+    except OCRPoolBusy:
+        response = jsonify({'error': 'Verification is busy, please retry shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        logger.error(f"Error reading pages of document {document_id}: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'OCR failed',
+            'message': str(e)
+        }), 500
+        
+    def generate():
+        yield first
+        try:
+            yield from lines
+        except Exception as e:
+            # Headers are sent; end the stream with an error line instead
+            logger.error(f"Error reading pages of document {document_id}: {str(e)}", exc_info=True)
+            yield json.dumps({'error': 'OCR failed', 'message': str(e)}) + '\n'
+            
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @verification_bp.route('/status/<document_id>', methods=['GET'])
 @jwt_required()
 def get_verification_status(document_id):
@@ -0,0 +1,131 @@
+import os
+from datetime import datetime
+from bson import ObjectId
+from botocore.exceptions import ClientError
+from pymongo import ReturnDocument
+from app.services.storage_service import StorageService
+from app.utils.logger import logger
+
+blob_config = {
+    # Store uploads once per distinct content instead of once per upload
+    'enabled': os.getenv('STORAGE_CONTENT_ADDRESSED', 'false').lower() == 'true'
+}
+
+# Content-addressed objects live under "blobs/sha256/<digest>/<incarnation>".
+# The incarnation suffix is new each time a digest's reference count comes
+# back from zero, so an upload racing with the deletion of the previous copy
+# never writes to the key that is being deleted.
+BLOB_KEY_PREFIX = 'blobs/sha256/'
+
+class BlobService:
+    """
+    Reference-counted, content-addressed S3 objects
+    
+    The blobs collection has one record per SHA-256 digest:
+    {_id: digest, s3_key, refcount, ready, size, mime_type, created_at}.
+    Each Document stored this way holds one reference; the object is deleted
+    when the last reference is released.
+    """
+    
+    def __init__(self, db):
+        self.blobs = db.blobs
+        self.storage_service = StorageService()
+        self.s3_client = self.storage_service.s3_client
+        self.bucket_name = self.storage_service.bucket_name
+        
+    @staticmethod
+    def is_blob_key(s3_key):
+        return bool(s3_key) and s3_key.startswith(BLOB_KEY_PREFIX)
+        
+    def acquire(self, digest, size, mime_type, body=None, staging_key=None):
+        """
+        Take a reference to the object with the given digest
+        
+        If no ready copy exists yet, one is written from body (bytes) or
+        copied server-side from staging_key. staging_key is always deleted.
+        
+        Returns:
+            tuple: (s3_key, deduplicated) where deduplicated is True if an
+                existing copy was reused
+        """
+        blob = self.blobs.find_one_and_update(
+            {'_id': digest},
+            {
+                '$inc': {'refcount': 1},
+                '$setOnInsert': {
+                    's3_key': f"{BLOB_KEY_PREFIX}{digest}/{ObjectId()}",
+                    'ready': False,
+                    'size': size,
+                    'mime_type': mime_type,
+                    'created_at': datetime.utcnow()
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        s3_key = blob['s3_key']
+        deduplicated = blob.get('ready', False)
+        
+        try:
+            if not deduplicated:
+                # Also taken by a second upload that arrives while the first
+                # copy is still being written: the content is identical, so
+                # writing it twice is harmless
+                self._write(s3_key, mime_type, digest, body, staging_key)
+                self.blobs.update_one({'_id': digest, 's3_key': s3_key}, {'$set': {'ready': True}})
+        except Exception:
+            self.release(digest)
+            raise
+        finally:
+            if staging_key:
+                self.storage_service.delete_file(staging_key)
+                
+        return s3_key, deduplicated
+        
+    def _write(self, s3_key, mime_type, digest, body, staging_key):
+        extra_args = {
+            'ContentType': mime_type,
+            'ACL': 'private',
+            'Metadata': {'sha256': digest}
+        }
+        if body is not None:
+            self.s3_client.put_object(Bucket=self.bucket_name, Key=s3_key, Body=body, **extra_args)
+        else:
+            # Uploads are capped far below CopyObject's 5 GB limit
+            self.s3_client.copy_object(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                CopySource={'Bucket': self.bucket_name, 'Key': staging_key},
+                MetadataDirective='REPLACE',
+                **extra_args
+            )
+            
+    def release(self, digest):
+        """
+        Drop one reference; deletes the object if it was the last one
+        
+        Returns:
+            bool: Whether the object was deleted
+        """
+        blob = self.blobs.find_one_and_update(
+            {'_id': digest},
+            {'$inc': {'refcount': -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None or blob['refcount'] > 0:
+            return False
+            
+        # Only the release that removes the record deletes the object; an
+        # acquire that got in first has raised the count above zero again
+        removed = self.blobs.delete_one({
+            '_id': digest,
+            's3_key': blob['s3_key'],
+            'refcount': {'$lte': 0}
+        })
+        if not removed.deleted_count:
+            return False
+        try:
+            self.s3_client.delete_object(Bucket=self.bucket_name, Key=blob['s3_key'])
+        except ClientError as e:
+            logger.warning(f"Error deleting blob {blob['s3_key']} from S3: {str(e)}")
+        return True
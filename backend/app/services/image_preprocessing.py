@@ -0,0 +1,252 @@
+import os
+import io
+import tempfile
+import numpy as np
+from PIL import Image, ImageOps
+from app.services.ocr_cache import content_digest
+from app.utils.logger import logger
+
+# Preprocessing profiles. dpi is the resolution images are normalized to
+# (Tesseract is tuned for ~300 DPI text); images without a trustworthy DPI
+# (phone photos report 72) are instead scaled so their longest side is at
+# most max_side. binarize is None, 'otsu' (one global threshold) or
+# 'adaptive' (local mean threshold, for uneven lighting).
+PREPROCESS_PROFILES = {
+    'none': None,
+    'fast': {'dpi': 200, 'max_side': 2000, 'deskew': False, 'binarize': 'otsu'},
+    'standard': {'dpi': 300, 'max_side': 2600, 'deskew': True, 'binarize': 'adaptive'},
+    'accurate': {'dpi': 300, 'max_side': 3500, 'deskew': True, 'binarize': 'adaptive'}
+}
+
+preprocess_config = {
+    'profile': os.getenv('OCR_PREPROCESS_PROFILE', 'standard'),
+    # Skew search range and step, in degrees
+    'max_skew': float(os.getenv('OCR_PREPROCESS_MAX_SKEW', 5)),
+    'skew_step': float(os.getenv('OCR_PREPROCESS_SKEW_STEP', 0.25))
+}
+
+# DPI values below this are camera defaults, not a measurement
+MIN_TRUSTED_DPI = 100
+
+def _target_scale(size, dpi, settings):
+    longest = max(size)
+    scale = 1.0
+    if dpi and dpi >= MIN_TRUSTED_DPI:
+        scale = settings['dpi'] / dpi
+    return min(scale, settings['max_side'] / longest, 2.0)
+
+def _source_dpi(image):
+    dpi = image.info.get('dpi')
+    if not dpi:
+        return None
+    try:
+        return float(dpi[0])
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def otsu_threshold(pixels):
+    """Global threshold that best separates the two modes of a uint8 array"""
+    histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight = np.cumsum(histogram)
+    total = weight[-1]
+    mean = np.cumsum(histogram * levels)
+    background = weight
+    foreground = total - weight
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mean[-1] * background - mean * total) ** 2 / (background * foreground)
+    between[~np.isfinite(between)] = 0
+    return int(np.argmax(between))
+
+def adaptive_threshold(pixels, window=None, offset=0.12):
+    """
+    Bradley-Roth local threshold: a pixel is ink if it is darker than
+    (1 - offset) times the mean of the window around it. Window sums come
+    from an integral image, so the cost does not depend on window size.
+    """
+    height, width = pixels.shape
+    window = window or max(15, (min(height, width) // 16) | 1)
+    half = window // 2
+    # Edge padding keeps every window full-size, so all counts are window**2
+    padded = np.pad(pixels, half, mode='edge')
+    integral = np.zeros((height + 2 * half + 1, width + 2 * half + 1), dtype=np.int64)
+    integral[1:, 1:] = padded.cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+    sums = (
+        integral[window:, window:] - integral[:-window, window:]
+        - integral[window:, :-window] + integral[:-window, :-window]
+    )
+    return pixels.astype(np.int64) * (window * window) > sums * (1 - offset)
+
+def estimate_skew(image, max_angle, step):
+    """
+    Angle (degrees) of the text lines in a grayscale image, by projection
+    profile: the shear that lines ink pixels up into the sharpest row
+    histogram. Measured on a reduced copy; the angle does not depend on scale.
+    """
+    small = image.copy()
+    small.thumbnail((1000, 1000))
+    pixels = np.asarray(small)
+    ys, xs = np.nonzero(pixels < otsu_threshold(pixels))
+    if len(ys) < 100:
+        return 0.0
+    if len(ys) > 100000:
+        keep = np.random.default_rng(0).choice(len(ys), 100000, replace=False)
+        ys, xs = ys[keep], xs[keep]
+    angles = np.arange(-max_angle, max_angle + step / 2, step)
+    # One row of sheared y coordinates per candidate angle
+    rows = np.rint(ys[None, :] - xs[None, :] * np.tan(np.radians(angles))[:, None]).astype(np.int64)
+    rows -= rows.min()
+    scores = [np.square(np.bincount(row).astype(np.float64)).sum() for row in rows]
+    return float(angles[int(np.argmax(scores))])
+
+def preprocess_image(source, profile=None, config=preprocess_config):
+    """
+    Decode source (a path, binary file, memory map or bytes) into an image
+    ready for OCR under profile: reduced-scale JPEG decoding, DPI
+    normalization, grayscale, deskew and binarization. Returns a PIL image
+    (mode '1' when binarized, else 'L').
+    """
+    settings = PREPROCESS_PROFILES[profile or config['profile']]
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    elif hasattr(source, 'seek'):
+        # Files and memory maps are decoded in place
+        source.seek(0)
+    image = Image.open(source)
+    dpi = _source_dpi(image)
+    scale = _target_scale(image.size, dpi, settings)
+    target_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    if image.format == 'JPEG' and scale < 1:
+        # Let libjpeg decode straight to grayscale at 1/2, 1/4 or 1/8 scale
+        # (the smallest that is still at least target_size): far fewer
+        # pixels decoded and no separate color conversion
+        image.draft('L', target_size)
+    # Phone photos are often stored sideways with an EXIF orientation
+    if image.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+        target_size = target_size[::-1]
+    image = ImageOps.exif_transpose(image)
+    image = image.convert('L')
+    if image.size != target_size:
+        image = image.resize(target_size, Image.BILINEAR, reducing_gap=2.0)
+    return clean_image(image, settings, config)
+
+def clean_image(image, settings, config=preprocess_config):
+    """
+    Deskew and binarize a grayscale image already at the target resolution
+    (e.g. a rendered PDF page) according to profile settings
+    """
+    if settings['deskew']:
+        angle = estimate_skew(image, config['max_skew'], config['skew_step'])
+        if abs(angle) >= config['skew_step']:
+            image = image.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+            
+    if settings['binarize']:
+        pixels = np.asarray(image)
+        if settings['binarize'] == 'adaptive':
+            paper = adaptive_threshold(pixels)
+        else:
+            paper = pixels > otsu_threshold(pixels)
+        image = Image.fromarray(paper)
+    image.info['dpi'] = (settings['dpi'], settings['dpi'])
+    return image
+
+def encode_image(image):
+    """PNG bytes of image, compressed lightly: it is decoded again right away"""
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+def read_source(source):
+    """Bytes of a path, binary file, memory map or bytes-like source"""
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)) or hasattr(source, 'madvise'):
+        return bytes(source)
+    if hasattr(source, 'read'):
+        source.seek(0)
+        return source.read()
+    with open(source, 'rb') as source_file:
+        return source_file.read()
+
+def is_pdf(source):
+    if isinstance(source, (bytes, bytearray, memoryview)) or hasattr(source, 'madvise'):
+        return bytes(source[:5]) == b'%PDF-'
+    if hasattr(source, 'read'):
+        source.seek(0)
+        header = source.read(5)
+        source.seek(0)
+        return header == b'%PDF-'
+    with open(source, 'rb') as source_file:
+        return source_file.read(5) == b'%PDF-'
+
+class PreparedImage:
+    """
+    An image as OCR and AI verification see it, preprocessed on first use
+    
+    Both consumers read the same preprocessed copy: OCR through data (PNG
+    bytes), AI verification through path (a temporary file, removed on
+    close). digest identifies the source, so cached OCR results are found
+    without preprocessing at all.
+    """
+    
+    def __init__(self, source, digest=None, profile=None):
+        self.source = source
+        self.profile = profile or preprocess_config['profile']
+        self._digest = digest
+        self._data = None
+        self._path = None
+        
+    @property
+    def settings(self):
+        return PREPROCESS_PROFILES[self.profile]
+        
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = content_digest(self.source)
+        return self._digest
+        
+    @property
+    def is_pdf(self):
+        return is_pdf(self.source)
+        
+    @property
+    def data(self):
+        """
+        Encoded preprocessed image; the source itself for profile 'none',
+        PDFs (preprocessed page by page, see pdf_ocr) or undecodable input
+        """
+        if self._data is None:
+            if self.settings is None or self.is_pdf:
+                self._data = read_source(self.source)
+            else:
+                try:
+                    self._data = encode_image(preprocess_image(self.source, self.profile))
+                except Exception as e:
+                    logger.warning(f"Error preprocessing image, using it as is: {str(e)}")
+                    self._data = read_source(self.source)
+        return self._data
+        
+    @property
+    def path(self):
+        if self._path is None:
+            if (self.settings is None or self.is_pdf) and isinstance(self.source, str):
+                return self.source
+            fd, self._path = tempfile.mkstemp(prefix='ocr-prepared-', suffix='.pdf' if self.is_pdf else '.png')
+            with os.fdopen(fd, 'wb') as prepared_file:
+                prepared_file.write(self.data)
+        return self._path
+        
+    def close(self):
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except FileNotFoundError:
+                pass
+            self._path = None
+            
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *exc_info):
+        self.close()
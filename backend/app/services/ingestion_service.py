@@ -0,0 +1,226 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from botocore.exceptions import ClientError
+from werkzeug.utils import secure_filename
+from app.services.storage_service import StorageService, MIN_PART_SIZE
+from app.utils.logger import logger
+
+ingestion_config = {
+    'part_size': max(int(os.getenv('UPLOAD_PART_SIZE', 8 * 1024 * 1024)), MIN_PART_SIZE),
+    # Parts of one upload that may be buffered or in flight at once; peak
+    # memory per upload is about (max_in_flight + 1) * part_size
+    'max_in_flight': int(os.getenv('UPLOAD_MAX_IN_FLIGHT', 4)),
+    'sniff_bytes': 2048
+}
+
+# Part uploads for every request share one pool, sized for the S3 client's
+# connection pool rather than per request
+_upload_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('UPLOAD_WORKERS', 16)),
+    thread_name_prefix='s3-upload'
+)
+
+# libmagic handles are costly to open (they load the magic database) and not
+# thread-safe, so each thread opens one and keeps it
+_magic_local = threading.local()
+
+def get_magic():
+    """Return this thread's libmagic handle, opening it on first use"""
+    handle = getattr(_magic_local, 'handle', None)
+    if handle is None:
+        import magic
+        handle = _magic_local.handle = magic.Magic(mime=True)
+    return handle
+
+class UploadRejected(ValueError):
+    """Raised when an upload fails validation part-way through the stream"""
+    
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+class IngestResult:
+    """What ingestion learned about an upload in its single pass"""
+    
+    def __init__(self, s3_key, original_filename, size, sha256, mime_type, deduplicated=False,
+                 etag=None, metadata=None):
+        self.s3_key = s3_key
+        self.original_filename = original_filename
+        self.size = size
+        self.sha256 = sha256
+        self.mime_type = mime_type
+        self.deduplicated = deduplicated
+        self.etag = etag
+        self.metadata = metadata or {}
+        self.uploaded_at = datetime.utcnow()
+        
+    def storage_metadata(self):
+        """
+        The object's S3 metadata as known at upload, in the shape
+        StorageService.get_file_metadata returns. The ETag is missing for
+        deduplicated uploads; the metadata reconciler fills it in.
+        """
+        return {
+            'content_type': self.mime_type,
+            'content_length': self.size,
+            'last_modified': self.uploaded_at,
+            'etag': self.etag,
+            'metadata': self.metadata,
+            'checked_at': self.uploaded_at
+        }
+
+def _read_part(stream, size):
+    """Read up to size bytes, looping over short reads"""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+class IngestionService:
+    def __init__(self, config=ingestion_config):
+        self.storage_service = StorageService()
+        self.s3_client = self.storage_service.s3_client
+        self.bucket_name = self.storage_service.bucket_name
+        self.part_size = config['part_size']
+        self.max_in_flight = config['max_in_flight']
+        self.sniff_bytes = config['sniff_bytes']
+        
+    def ingest(self, file, user_id, max_size, allowed_mime_types, blob_service=None):
+        """
+        Validate and store an upload, reading its stream exactly once
+        
+        The stream is read one part at a time. The first part is sniffed
+        with libmagic before anything is sent to S3, the size limit is
+        checked as bytes arrive (Content-Length is often missing for
+        multipart bodies), every part feeds the SHA-256, and parts are
+        uploaded concurrently while the next one is read. Files smaller
+        than one part go up with a single PutObject.
+        
+        With a blob_service the file is stored content-addressed: a small
+        file whose digest is already stored is not uploaded at all, and a
+        large one is uploaded to a staging key and copied to its digest key
+        only if that content is new.
+        
+        Raises:
+            UploadRejected: If the content type is not allowed or the file
+                is larger than max_size; nothing is left behind in S3
+        """
+        original_filename = secure_filename(file.filename)
+        s3_key = self.storage_service.new_document_key(user_id, original_filename)
+        
+        first = _read_part(file.stream, self.part_size)
+        mime_type = get_magic().from_buffer(first[:self.sniff_bytes])
+        if mime_type not in allowed_mime_types:
+            raise UploadRejected(f"Content type {mime_type} is not allowed", 'type')
+        if len(first) > max_size:
+            raise UploadRejected('File size exceeds limit', 'size')
+            
+        digest = hashlib.sha256(first)
+        extra_args = {
+            'ContentType': mime_type,
+            'ACL': 'private',
+            'Metadata': {
+                'original_filename': original_filename,
+                'uploaded_by': user_id,
+                'upload_date': datetime.utcnow().isoformat()
+            }
+        }
+        
+        if len(first) < self.part_size:
+            size = len(first)
+            if blob_service is not None:
+                s3_key, deduplicated = blob_service.acquire(digest.hexdigest(), size, mime_type, body=first)
+                return IngestResult(s3_key, original_filename, size, digest.hexdigest(), mime_type, deduplicated,
+                                    metadata={'sha256': digest.hexdigest()})
+            response = self.s3_client.put_object(Bucket=self.bucket_name, Key=s3_key, Body=first, **extra_args)
+            return IngestResult(s3_key, original_filename, size, digest.hexdigest(), mime_type,
+                                etag=response.get('ETag'), metadata=extra_args['Metadata'])
+                                
+        size, etag = self._multipart_upload(file.stream, s3_key, first, digest, max_size, extra_args)
+        if blob_service is not None:
+            s3_key, deduplicated = blob_service.acquire(digest.hexdigest(), size, mime_type, staging_key=s3_key)
+            return IngestResult(s3_key, original_filename, size, digest.hexdigest(), mime_type, deduplicated,
+                                metadata={'sha256': digest.hexdigest()})
+        return IngestResult(s3_key, original_filename, size, digest.hexdigest(), mime_type,
+                            etag=etag, metadata=extra_args['Metadata'])
+                            
+    def _multipart_upload(self, stream, s3_key, first, digest, max_size, extra_args):
+        """Upload first and the rest of stream as parts; returns (size, ETag)"""
+        upload_id = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            **extra_args
+        )['UploadId']
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        futures = []
+        # Part upload errors; the reading loop stops at the first one
+        failures = []
+        
+        def upload_part(part_number, body):
+            try:
+                response = self.s3_client.upload_part(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body
+                )
+                return {'PartNumber': part_number, 'ETag': response['ETag']}
+            except Exception as e:
+                failures.append(e)
+                raise
+            finally:
+                slots.release()
+                
+        try:
+            size = 0
+            part = first
+            part_number = 1
+            while part:
+                size += len(part)
+                if size > max_size:
+                    raise UploadRejected('File size exceeds limit', 'size')
+                if part is not first:
+                    digest.update(part)
+                # Blocks while max_in_flight parts are pending, which is what
+                # bounds memory when S3 is slower than the client
+                slots.acquire()
+                if failures:
+                    # Stop reading the client's stream once any part failed
+                    raise failures[0]
+                futures.append(_upload_executor.submit(upload_part, part_number, part))
+                part_number += 1
+                part = _read_part(stream, self.part_size)
+                
+            parts = [future.result() for future in futures]
+            response = self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            return size, response.get('ETag')
+            
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            for future in futures:
+                if not future.cancelled():
+                    future.exception()
+            try:
+                self.s3_client.abort_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id
+                )
+            except ClientError as e:
+                logger.warning(f"Error aborting multipart upload {upload_id}: {str(e)}")
+            raise
@@ -0,0 +1,233 @@
+"""
+Online migration of document objects to another S3 key layout.
+
+Walks the documents collection in _id order, copies each object to its key
+under the target layout (server-side, in parallel), then repoints the
+documents in one bulk write per batch. The app keeps serving throughout:
+each document is only repointed if its s3_key is still the one that was
+copied, copies whose document was deleted or changed meanwhile are removed
+again, and old objects are kept for a grace period so presigned URLs
+already handed out keep working. Progress is checkpointed in the
+migrations collection, so an interrupted run resumes where it stopped.
+
+Run from the backend directory:
+    python -m app.services.key_migration --layout hashed
+"""
+import os
+import time
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from pymongo import MongoClient, UpdateOne
+from app.config import Config
+from app.services.storage_service import (
+    StorageService, KEY_LAYOUTS, CONTENT_KEY_LAYOUT, key_layout_of, relayout_key
+)
+from app.models.document import Document
+from app.models.record_cache import invalidate_record_ids
+from app.utils.logger import logger
+
+key_migration_config = {
+    'workers': int(os.getenv('KEY_MIGRATION_WORKERS', 16)),
+    'batch_size': int(os.getenv('KEY_MIGRATION_BATCH_SIZE', 500)),
+    # Longer than any presigned URL for the old key can still be in use
+    'grace_period': int(os.getenv('KEY_MIGRATION_GRACE_PERIOD', 24 * 3600))
+}
+
+class KeyMigration:
+    """
+    Moves documents to layout
+    
+    The migrations collection holds one checkpoint per target layout,
+    {_id: 'key_layout:<layout>', last_id, migrated, updated_at}, and the
+    key_migration_garbage collection the old keys awaiting deletion,
+    {_id: s3_key, delete_after}.
+    """
+    
+    def __init__(self, db, layout, config=key_migration_config):
+        if layout not in KEY_LAYOUTS:
+            raise ValueError(f"Unknown key layout: {layout}")
+        self.db = db
+        self.layout = layout
+        self.config = config
+        self.checkpoint_id = f"key_layout:{layout}"
+        self.storage_service = StorageService()
+        
+    def _copy(self, doc):
+        """Copy doc's object to its new key; returns the copy result or None"""
+        new_key = relayout_key(doc['s3_key'], self.layout)
+        try:
+            response = self.storage_service.copy_file(doc['s3_key'], new_key)
+        except ClientError as e:
+            logger.warning(f"Copying {doc['s3_key']} of document {doc['_id']} failed: {str(e)}")
+            return None
+        return new_key, response.get('CopyObjectResult', {})
+        
+    @staticmethod
+    def _moved_metadata(stored, copy_result):
+        # Multipart objects get a new ETag when copied, so the stored copy
+        # has to follow; documents without one are left to the reconciler
+        if not stored:
+            return None
+        last_modified = copy_result.get('LastModified')
+        return {
+            **stored,
+            'etag': copy_result.get('ETag', stored.get('etag')),
+            'last_modified': last_modified.replace(tzinfo=None) if last_modified else stored.get('last_modified'),
+            'checked_at': datetime.utcnow()
+        }
+        
+    def migrate_batch(self, docs):
+        """
+        Move docs (raw records with _id, s3_key and storage_metadata) to the
+        target layout; returns how many documents were repointed
+        """
+        # Records from before key_layout existed have no layout stored;
+        # ones whose key needs no move (content-addressed blobs, or already
+        # in the target layout) just get it recorded
+        operations = []
+        recorded_ids = []
+        to_move = []
+        for doc in docs:
+            layout = key_layout_of(doc['s3_key'])
+            if layout in (self.layout, CONTENT_KEY_LAYOUT):
+                recorded_ids.append(doc['_id'])
+                operations.append(UpdateOne(
+                    {'_id': doc['_id'], 's3_key': doc['s3_key']},
+                    {'$set': {'key_layout': layout}, '$inc': {Document.VERSION_FIELD: 1}}
+                ))
+            else:
+                to_move.append(doc)
+        docs = to_move
+        
+        with ThreadPoolExecutor(max_workers=self.config['workers']) as executor:
+            copies = list(executor.map(self._copy, docs))
+            
+        copied = {}
+        for doc, copy in zip(docs, copies):
+            if copy is None:
+                continue
+            new_key, copy_result = copy
+            copied[doc['_id']] = (doc['s3_key'], new_key)
+            operations.append(UpdateOne(
+                {'_id': doc['_id'], 's3_key': doc['s3_key']},
+                {
+                    '$set': {
+                        's3_key': new_key,
+                        'key_layout': self.layout,
+                        'storage_metadata': self._moved_metadata(doc.get('storage_metadata'), copy_result)
+                    },
+                    # Like Record.persist, so a request holding the record
+                    # gets a conflict instead of writing the old key back
+                    '$inc': {Document.VERSION_FIELD: 1}
+                }
+            ))
+        if operations:
+            self.db.documents.bulk_write(operations, ordered=False)
+        # Recording the layout bumps the version too, so cached copies of
+        # those records would fail every later save with a conflict
+        invalidate_record_ids('documents', recorded_ids)
+        if not copied:
+            return 0
+            
+        # Bulk results don't say which filters matched, so read back which
+        # documents now point at their copy
+        moved_ids = {
+            doc['_id'] for doc in self.db.documents.find(
+                {'_id': {'$in': list(copied)}, 'key_layout': self.layout},
+                {'s3_key': 1}
+            )
+            if doc['s3_key'] == copied[doc['_id']][1]
+        }
+        invalidate_record_ids('documents', list(moved_ids))
+        
+        # A document deleted or re-uploaded meanwhile leaves its copy orphaned
+        orphans = [new_key for doc_id, (_, new_key) in copied.items() if doc_id not in moved_ids]
+        if orphans:
+            self.storage_service.delete_files(orphans)
+            
+        delete_after = datetime.utcnow() + timedelta(seconds=self.config['grace_period'])
+        garbage = [
+            UpdateOne({'_id': old_key}, {'$setOnInsert': {'delete_after': delete_after}}, upsert=True)
+            for doc_id, (old_key, _) in copied.items() if doc_id in moved_ids
+        ]
+        if garbage:
+            self.db.key_migration_garbage.bulk_write(garbage, ordered=False)
+        return len(moved_ids)
+        
+    def purge_garbage(self):
+        """Delete old objects whose grace period is over"""
+        purged = 0
+        while True:
+            entries = list(
+                self.db.key_migration_garbage
+                .find({'delete_after': {'$lte': datetime.utcnow()}}, {'_id': 1})
+                .limit(1000)
+            )
+            if not entries:
+                return purged
+            s3_keys = [entry['_id'] for entry in entries]
+            # Never delete a key a document points at again (e.g. a
+            # migration back to the previous layout)
+            in_use = set(self.db.documents.distinct('s3_key', {'s3_key': {'$in': s3_keys}}))
+            self.storage_service.delete_files([s3_key for s3_key in s3_keys if s3_key not in in_use])
+            self.db.key_migration_garbage.delete_many({'_id': {'$in': s3_keys}})
+            purged += len(s3_keys) - len(in_use)
+            
+    def run(self, restart=False):
+        start = time.time()
+        if restart:
+            self.db.migrations.delete_one({'_id': self.checkpoint_id})
+        checkpoint = self.db.migrations.find_one({'_id': self.checkpoint_id}) or {}
+        last_id = checkpoint.get('last_id')
+        migrated = checkpoint.get('migrated', 0)
+        if last_id is not None:
+            logger.info(f"Resuming key migration to '{self.layout}' after document {last_id}")
+            
+        while True:
+            query = {'key_layout': {'$nin': [self.layout, CONTENT_KEY_LAYOUT]}}
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+            docs = [
+                doc for doc in self.db.documents.find(query, {'s3_key': 1, 'storage_metadata': 1})
+                .sort('_id', 1)
+                .limit(self.config['batch_size'])
+            ]
+            if not docs:
+                break
+            migrated += self.migrate_batch(docs)
+            last_id = docs[-1]['_id']
+            self.db.migrations.update_one(
+                {'_id': self.checkpoint_id},
+                {'$set': {'last_id': last_id, 'migrated': migrated, 'updated_at': datetime.utcnow()}},
+                upsert=True
+            )
+            logger.info(f"Key migration to '{self.layout}': {migrated} documents moved, at {last_id}")
+            
+        # Done: the next run rescans from the start, which only finds
+        # documents written in another layout since
+        self.db.migrations.delete_one({'_id': self.checkpoint_id})
+        purged = self.purge_garbage()
+        logger.info(
+            f"Key migration to '{self.layout}' finished: {migrated} documents moved, "
+            f"{purged} old objects deleted in {time.time() - start:.1f}s"
+        )
+        return {'migrated': migrated, 'purged': purged}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--layout', choices=KEY_LAYOUTS, required=True)
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and rescan every document')
+    parser.add_argument('--purge-only', action='store_true', help='Only delete old objects past their grace period')
+    args = parser.parse_args()
+    
+    db = MongoClient(Config.MONGODB_URI).get_database()
+    migration = KeyMigration(db, args.layout)
+    if args.purge_only:
+        logger.info(f"Deleted {migration.purge_garbage()} old objects")
+    else:
+        migration.run(restart=args.restart)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Background reconciler for the S3 metadata stored on Document records.
+
+Documents keep a copy of their object's content type, size, ETag and
+last-modified time (captured at upload) so reads never need a HEAD request.
+This process keeps that copy honest: it walks the bucket with ListObjectsV2
+(1000 objects per call), compares each listed object against the stored
+copy and only sends a HEAD for objects that changed. Documents with no
+stored metadata (uploaded before it was captured) are backfilled.
+
+Run from the backend directory:
+    python -m app.services.metadata_reconciler --interval 3600
+"""
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, UpdateOne
+from app.config import Config
+from app.services.storage_service import StorageService
+from app.models.document import Document
+from app.models.record_cache import invalidate_record_ids
+from app.utils.logger import logger
+
+reconciler_config = {
+    'interval': int(os.getenv('METADATA_RECONCILE_INTERVAL', 3600)),
+    'workers': int(os.getenv('METADATA_RECONCILE_WORKERS', 8)),
+    'batch_size': int(os.getenv('METADATA_RECONCILE_BATCH_SIZE', 1000)),
+    # Empty prefix: the whole bucket, which covers every key layout
+    'prefixes': os.getenv('METADATA_RECONCILE_PREFIXES', '').split(',')
+}
+
+class MetadataReconciler:
+    def __init__(self, db, config=reconciler_config):
+        self.db = db
+        self.config = config
+        self.storage_service = StorageService()
+        
+    @staticmethod
+    def is_stale(stored, listed):
+        """Whether stored metadata no longer matches a listed object"""
+        if not stored or stored.get('etag') != listed.get('ETag'):
+            return True
+        if stored.get('content_length') != listed.get('Size'):
+            return True
+        stored_time = stored.get('last_modified')
+        listed_time = listed.get('LastModified')
+        if stored_time is None or listed_time is None:
+            return stored_time is not listed_time
+        # Listings have millisecond precision, HEAD responses whole seconds
+        listed_time = listed_time.replace(tzinfo=None)
+        return abs((stored_time - listed_time).total_seconds()) > 1
+        
+    def refresh(self, docs):
+        """
+        HEAD the objects of docs (raw records with _id and s3_key) in
+        parallel and store what S3 reports; returns how many were updated
+        """
+        if not docs:
+            return 0
+        s3_keys = list({doc['s3_key'] for doc in docs})
+        with ThreadPoolExecutor(max_workers=self.config['workers']) as executor:
+            metadata = dict(zip(s3_keys, executor.map(self.storage_service.get_file_metadata, s3_keys)))
+            
+        operations = []
+        updated_ids = []
+        for doc in docs:
+            if metadata.get(doc['s3_key']) is None:
+                logger.warning(f"Object {doc['s3_key']} of document {doc['_id']} is missing from S3")
+                continue
+            # Bump the version like Record.persist does, so a request
+            # holding the record sees the change instead of overwriting it;
+            # a document whose key moved meanwhile is left alone
+            operations.append(UpdateOne(
+                {'_id': doc['_id'], 's3_key': doc['s3_key']},
+                {
+                    '$set': {'storage_metadata': metadata[doc['s3_key']]},
+                    '$inc': {Document.VERSION_FIELD: 1}
+                }
+            ))
+            updated_ids.append(doc['_id'])
+        if not operations:
+            return 0
+        self.db.documents.bulk_write(operations, ordered=False)
+        invalidate_record_ids('documents', updated_ids)
+        return len(operations)
+        
+    def reconcile_prefix(self, prefix):
+        """Compare every object under prefix with the documents using it"""
+        checked = updated = 0
+        for page in self.storage_service.list_files(prefix):
+            listed = {obj['Key']: obj for obj in page}
+            if not listed:
+                continue
+            docs = self.db.documents.find(
+                {'s3_key': {'$in': list(listed)}},
+                {'s3_key': 1, 'storage_metadata': 1}
+            )
+            stale = [doc for doc in docs if self.is_stale(doc.get('storage_metadata'), listed[doc['s3_key']])]
+            checked += len(listed)
+            updated += self.refresh(stale)
+        return checked, updated
+        
+    def backfill(self):
+        """Store metadata for documents that have none"""
+        updated = 0
+        last_id = None
+        while True:
+            query = {'storage_metadata': None}
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+            docs = list(
+                self.db.documents.find(query, {'s3_key': 1})
+                .sort('_id', 1)
+                .limit(self.config['batch_size'])
+            )
+            if not docs:
+                return updated
+            updated += self.refresh(docs)
+            last_id = docs[-1]['_id']
+            
+    def run_once(self):
+        start = time.time()
+        backfilled = self.backfill()
+        checked = updated = 0
+        for prefix in self.config['prefixes']:
+            prefix_checked, prefix_updated = self.reconcile_prefix(prefix)
+            checked += prefix_checked
+            updated += prefix_updated
+        logger.info(
+            f"Metadata reconciliation: {backfilled} backfilled, {checked} objects checked, "
+            f"{updated} updated in {time.time() - start:.1f}s"
+        )
+        return {'backfilled': backfilled, 'checked': checked, 'updated': updated}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--interval', type=int, default=reconciler_config['interval'])
+    parser.add_argument('--once', action='store_true', help='Run one pass and exit')
+    args = parser.parse_args()
+    
+    db = MongoClient(Config.MONGODB_URI).get_database()
+    reconciler = MetadataReconciler(db)
+    while True:
+        try:
+            reconciler.run_once()
+        except Exception as e:
+            logger.error(f"Metadata reconciliation failed: {str(e)}", exc_info=True)
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
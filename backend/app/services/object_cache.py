@@ -0,0 +1,246 @@
+import os
+import mmap
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import Counter, Gauge
+from app.services.storage_service import StorageService
+
+object_cache_config = {
+    'directory': os.getenv('OBJECT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'veritrustai-objects')),
+    'max_bytes': int(os.getenv('OBJECT_CACHE_MAX_BYTES', 1024 * 1024 * 1024)),
+    # Objects at least this large are fetched as parallel ranged GETs
+    'range_threshold': int(os.getenv('OBJECT_CACHE_RANGE_THRESHOLD', 8 * 1024 * 1024)),
+    'range_size': int(os.getenv('OBJECT_CACHE_RANGE_SIZE', 4 * 1024 * 1024)),
+    'range_workers': int(os.getenv('OBJECT_CACHE_RANGE_WORKERS', 8)),
+    # Files used this recently are never evicted, so a reader that just got
+    # a path can still open it
+    'min_age': int(os.getenv('OBJECT_CACHE_MIN_AGE', 60))
+}
+
+object_cache_requests_total = Counter(
+    'object_cache_requests_total',
+    'Local object cache lookups',
+    ['result']
+)
+
+object_cache_bytes_saved_total = Counter(
+    'object_cache_bytes_saved_total',
+    'Bytes served from the local object cache instead of S3'
+)
+
+object_cache_bytes_downloaded_total = Counter(
+    'object_cache_bytes_downloaded_total',
+    'Bytes downloaded from S3 into the local object cache'
+)
+
+object_cache_hit_ratio = Gauge(
+    'object_cache_hit_ratio',
+    'Fraction of local object cache lookups served from disk in this process'
+)
+
+object_cache_size_bytes = Gauge(
+    'object_cache_size_bytes',
+    'Bytes held in the local object cache directory'
+)
+
+_range_executor = ThreadPoolExecutor(
+    max_workers=object_cache_config['range_workers'],
+    thread_name_prefix='object-cache-range'
+)
+
+class CachedObject:
+    """An object in the local cache, open and memory-mapped for reading"""
+    
+    def __init__(self, path, file, data):
+        self.path = path
+        self.file = file
+        # Read-only mmap: file-like (read/seek/tell) for Pillow and
+        # sliceable without copying
+        self.data = data
+        
+    @property
+    def size(self):
+        return len(self.data)
+
+class ObjectCache:
+    """
+    Bounded, on-disk, read-through LRU cache of S3 objects
+    
+    Files are named by a hash of (s3_key, ETag), so a changed object is a
+    new entry and stale copies simply age out. Files are written to a
+    temporary name and renamed into place, so every worker process can
+    share one directory. Recency is the file's mtime, bumped on each hit;
+    when the directory grows past max_bytes the least recently used files
+    are deleted.
+    """
+    
+    def __init__(self, config=object_cache_config):
+        self.config = config
+        self.directory = config['directory']
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._size_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        
+    def _path(self, s3_key, etag):
+        name = hashlib.sha256(f"{s3_key}\0{etag or ''}".encode()).hexdigest()
+        return os.path.join(self.directory, name[:2], name)
+        
+    def _key_lock(self, path):
+        with self._locks_lock:
+            lock = self._locks.get(path)
+            if lock is None:
+                lock = self._locks[path] = threading.Lock()
+            return lock
+            
+    def _record(self, hit, size):
+        if hit:
+            self.hits += 1
+            object_cache_requests_total.labels(result='hit').inc()
+            object_cache_bytes_saved_total.inc(size)
+        else:
+            self.misses += 1
+            object_cache_requests_total.labels(result='miss').inc()
+            object_cache_bytes_downloaded_total.inc(size)
+        object_cache_hit_ratio.set(self.hits / (self.hits + self.misses))
+        
+    def fetch(self, s3_key, etag=None, size=None):
+        """
+        Return the local path of s3_key, downloading it on a miss
+        
+        Args:
+            s3_key (str): Object key
+            etag (str): Known ETag (e.g. Document.storage_metadata); looked
+                up with a HEAD if missing
+            size (int): Known size in bytes, used to plan ranged GETs
+        """
+        storage_service = StorageService()
+        if etag is None or size is None:
+            metadata = storage_service.get_file_metadata(s3_key)
+            if metadata is None:
+                raise FileNotFoundError(s3_key)
+            etag, size = metadata['etag'], metadata['content_length']
+            
+        path = self._path(s3_key, etag)
+        try:
+            with self._key_lock(path):
+                try:
+                    os.utime(path)
+                    self._record(True, size)
+                    return path
+                except FileNotFoundError:
+                    pass
+                    
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.partial-')
+                try:
+                    with os.fdopen(fd, 'wb') as file:
+                        self._download(storage_service, s3_key, size, file)
+                    os.replace(temp_path, path)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+        finally:
+            with self._locks_lock:
+                self._locks.pop(path, None)
+                
+        self._record(False, size)
+        self._add_size(size)
+        return path
+        
+    def _download(self, storage_service, s3_key, size, file):
+        if size < self.config['range_threshold']:
+            storage_service.s3_client.download_fileobj(storage_service.bucket_name, s3_key, file)
+            return
+            
+        # Preallocate, then let each range write straight to its offset
+        file.truncate(size)
+        file.flush()
+        fd = file.fileno()
+        range_size = self.config['range_size']
+        
+        def fetch_range(start):
+            end = min(start + range_size, size) - 1
+            response = storage_service.s3_client.get_object(
+                Bucket=storage_service.bucket_name,
+                Key=s3_key,
+                Range=f"bytes={start}-{end}"
+            )
+            offset = start
+            for chunk in response['Body'].iter_chunks(1024 * 1024):
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+            if offset != end + 1:
+                raise IOError(f"Short read for {s3_key} bytes {start}-{end}")
+                
+        for future in [_range_executor.submit(fetch_range, start) for start in range(0, size, range_size)]:
+            future.result()
+            
+    @contextmanager
+    def open(self, s3_key, etag=None, size=None):
+        """
+        Fetch s3_key and yield it as a CachedObject whose data is a
+        read-only memory map, so OCR and image code read the page cache
+        directly instead of a copy
+        """
+        path = self.fetch(s3_key, etag, size)
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                yield CachedObject(path, file, b'')
+                return
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield CachedObject(path, file, data)
+            finally:
+                data.close()
+                
+    def _scan(self):
+        """Return [(mtime, size, path)] for every cached file"""
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith('.partial-'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+        
+    def _add_size(self, size):
+        with self._size_lock:
+            if self.size is None:
+                self.size = sum(entry[1] for entry in self._scan())
+            else:
+                self.size += size
+            if self.size > self.config['max_bytes']:
+                self._evict()
+            object_cache_size_bytes.set(self.size)
+            
+    def _evict(self):
+        # Other processes write to the same directory, so work from a fresh
+        # scan rather than this process's running total
+        entries = sorted(self._scan())
+        self.size = sum(entry[1] for entry in entries)
+        cutoff = time.time() - self.config['min_age']
+        target = self.config['max_bytes'] * 0.9
+        for mtime, size, path in entries:
+            if self.size <= target or mtime > cutoff:
+                break
+            try:
+                os.unlink(path)
+                self.size -= size
+            except FileNotFoundError:
+                pass
+
+object_cache = ObjectCache()
@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+from prometheus_client import Counter, Gauge
+from app.config.cache import redis_client, LocalCache
+from app.utils import cache_codec
+from app.utils.logger import logger
+
+ocr_cache_config = {
+    'enabled': os.getenv('OCR_CACHE_ENABLED', 'true').lower() == 'true',
+    'local_max_entries': int(os.getenv('OCR_CACHE_LOCAL_MAX_ENTRIES', 256)),
+    'local_ttl': int(os.getenv('OCR_CACHE_LOCAL_TTL', 3600)),
+    # Results never go stale for a given key (content, engine, version and
+    # config are all part of it); the TTL only bounds Redis memory
+    'ttl': int(os.getenv('OCR_CACHE_TTL', 30 * 86400))
+}
+
+ocr_cache_requests_total = Counter(
+    'ocr_cache_requests_total',
+    'OCR result cache lookups',
+    ['engine', 'tier', 'result']
+)
+
+ocr_cache_seconds_saved_total = Counter(
+    'ocr_cache_seconds_saved_total',
+    'OCR engine time avoided by serving cached results',
+    ['engine']
+)
+
+ocr_cache_hit_ratio = Gauge(
+    'ocr_cache_hit_ratio',
+    'Fraction of OCR requests served from the cache in this process'
+)
+
+OCR_KEY_PREFIX = 'ocr'
+
+def content_digest(image):
+    """
+    SHA-256 hex digest of an image given as a path, an open binary file or
+    a memory map / bytes
+    """
+    if isinstance(image, (bytes, bytearray, memoryview)) or hasattr(image, 'madvise'):
+        return hashlib.sha256(image).hexdigest()
+    digest = hashlib.sha256()
+    if hasattr(image, 'read'):
+        image.seek(0)
+        for chunk in iter(lambda: image.read(1024 * 1024), b''):
+            digest.update(chunk)
+        image.seek(0)
+        return digest.hexdigest()
+    with open(image, 'rb') as image_file:
+        for chunk in iter(lambda: image_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class OCRCache:
+    """
+    Two-tier cache of OCR results keyed by
+    (content digest, engine, engine version, engine config)
+    
+    The in-process tier is a LocalCache; the persistent tier is Redis, shared
+    by every worker and surviving restarts. Entries are {'text', 'seconds'}
+    where seconds is how long the engine took, which is what a hit saves.
+    Redis errors never fail OCR; they count as misses.
+    """
+    
+    def __init__(self, config=ocr_cache_config):
+        self.config = config
+        self.local = LocalCache(max_entries=config['local_max_entries'])
+        self.hits = 0
+        self.misses = 0
+        
+    @staticmethod
+    def key(digest, engine, version, engine_config):
+        config_digest = hashlib.sha256(json.dumps(engine_config, sort_keys=True).encode()).hexdigest()[:16]
+        return f"{OCR_KEY_PREFIX}:{engine}:{version}:{config_digest}:{digest}"
+        
+    def _record(self, engine, entry):
+        if entry is not None:
+            self.hits += 1
+            ocr_cache_seconds_saved_total.labels(engine=engine).inc(entry['seconds'])
+        else:
+            self.misses += 1
+        ocr_cache_hit_ratio.set(self.hits / (self.hits + self.misses))
+        return entry
+        
+    def get(self, key, engine):
+        """Return the cached entry for key, or None"""
+        found, entry = self.local.get(key)
+        ocr_cache_requests_total.labels(engine=engine, tier='local', result='hit' if found else 'miss').inc()
+        if found:
+            return self._record(engine, entry)
+            
+        try:
+            raw = redis_client.get(key)
+        except Exception as e:
+            logger.warning(f"OCR cache read failed for {key}: {str(e)}")
+            raw = None
+        entry = cache_codec.loads(raw) if raw is not None else None
+        ocr_cache_requests_total.labels(engine=engine, tier='redis', result='hit' if entry else 'miss').inc()
+        if entry is not None:
+            self.local.set(key, entry, self.config['local_ttl'])
+        return self._record(engine, entry)
+        
+    def set(self, key, text, seconds, **extra):
+        entry = dict(extra, text=text, seconds=seconds)
+        self.local.set(key, entry, self.config['local_ttl'])
+        try:
+            redis_client.setex(key, self.config['ttl'], cache_codec.dumps(entry))
+        except Exception as e:
+            logger.warning(f"OCR cache write failed for {key}: {str(e)}")
+
+ocr_cache = OCRCache()
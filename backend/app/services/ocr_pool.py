@@ -0,0 +1,295 @@
+import io
+import os
+import time
+import queue
+import shlex
+import threading
+import multiprocessing
+from prometheus_client import Counter, Gauge, Histogram
+from app.utils.logger import logger
+
+ocr_pool_config = {
+    'enabled': os.getenv('OCR_POOL_ENABLED', 'true').lower() == 'true',
+    'workers': int(os.getenv('OCR_POOL_WORKERS', max(1, (os.cpu_count() or 2) // 2))),
+    # Jobs allowed to wait for a free worker; beyond that submit() fails
+    # fast with OCRPoolBusy instead of piling up blocked request threads
+    'max_pending': int(os.getenv('OCR_POOL_MAX_PENDING', 8)),
+    'queue_timeout': float(os.getenv('OCR_POOL_QUEUE_TIMEOUT', 10)),
+    'job_timeout': float(os.getenv('OCR_POOL_JOB_TIMEOUT', 60))
+}
+
+ocr_pool_jobs_total = Counter(
+    'ocr_pool_jobs_total',
+    'OCR jobs submitted to the worker pool',
+    ['result']
+)
+
+ocr_pool_job_seconds = Histogram(
+    'ocr_pool_job_seconds',
+    'Time from submitting an OCR job to its result, including queueing',
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+ocr_pool_busy_workers = Gauge(
+    'ocr_pool_busy_workers',
+    'OCR pool workers currently running a job in this process'
+)
+
+class OCRPoolBusy(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+    pass
+
+class OCRTimeout(Exception):
+    """Raised when a job exceeds the per-job timeout; its worker is replaced"""
+    pass
+
+class OCRJobError(Exception):
+    pass
+
+def _parse_tesseract_config(config):
+    """
+    Split a tesseract command-line config string ("--psm 6 -c name=value")
+    into (psm, oem, variables) for the tesserocr API
+    """
+    psm = oem = None
+    variables = {}
+    args = shlex.split(config or '')
+    for i, arg in enumerate(args):
+        if arg == '--psm' and i + 1 < len(args):
+            psm = int(args[i + 1])
+        elif arg == '--oem' and i + 1 < len(args):
+            oem = int(args[i + 1])
+        elif arg == '-c' and i + 1 < len(args) and '=' in args[i + 1]:
+            name, value = args[i + 1].split('=', 1)
+            variables[name] = value
+    return psm, oem, variables
+
+def tesseract_version():
+    """
+    Version of the Tesseract that pool workers run: libtesseract as linked
+    by tesserocr, which can differ from the CLI, or the CLI itself when
+    tesserocr is missing and workers fall back to pytesseract
+    """
+    try:
+        import tesserocr
+    except ImportError:
+        import pytesseract
+        return str(pytesseract.get_tesseract_version())
+    # e.g. "tesseract 5.3.0\n leptonica-1.82.0\n ..."
+    return f"tesserocr {tesserocr.tesseract_version().splitlines()[0].split()[-1]}"
+
+class _Engine:
+    """
+    Tesseract as used inside a worker process: one initialized tesserocr
+    API, kept across jobs and rebuilt only when lang or config change. Falls
+    back to pytesseract (a subprocess per image) if tesserocr is missing.
+    """
+    
+    def __init__(self):
+        try:
+            import tesserocr
+        except ImportError:
+            tesserocr = None
+        self.tesserocr = tesserocr
+        self.api = None
+        self.settings = None
+        
+    def _api(self, lang, config):
+        if self.api is not None and self.settings == (lang, config):
+            return self.api
+        if self.api is not None:
+            self.api.End()
+        psm, oem, variables = _parse_tesseract_config(config)
+        kwargs = {'lang': lang}
+        if psm is not None:
+            kwargs['psm'] = psm
+        if oem is not None:
+            kwargs['oem'] = oem
+        self.api = self.tesserocr.PyTessBaseAPI(**kwargs)
+        for name, value in variables.items():
+            self.api.SetVariable(name, value)
+        self.settings = (lang, config)
+        return self.api
+        
+    def recognize(self, data, lang, config):
+        from PIL import Image
+        image = Image.open(io.BytesIO(data))
+        if self.tesserocr is None:
+            import pytesseract
+            return pytesseract.image_to_string(image, lang=lang, config=config)
+        api = self._api(lang, config)
+        api.SetImage(image)
+        try:
+            return api.GetUTF8Text()
+        finally:
+            api.Clear()
+
+def _worker_main(conn):
+    engine = _Engine()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        data, lang, config = job
+        try:
+            conn.send(('ok', engine.recognize(data, lang, config)))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {str(e)}"))
+
+class _Worker:
+    """A long-lived OCR process and the pipe used to talk to it"""
+    
+    def __init__(self, context):
+        self.context = context
+        self.start()
+        
+    def start(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main,
+            args=(child_conn,),
+            name='ocr-worker',
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        
+    def restart(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.start()
+        
+    def run(self, data, lang, config, timeout):
+        if not self.process.is_alive():
+            self.restart()
+        try:
+            self.conn.send((data, lang, config))
+            ready = self.conn.poll(timeout)
+        except (OSError, EOFError):
+            self.restart()
+            raise OCRJobError("OCR worker died")
+        if not ready:
+            # The only way to stop a stuck Tesseract run is to kill it
+            self.restart()
+            raise OCRTimeout(f"OCR job exceeded {timeout}s")
+        try:
+            status, result = self.conn.recv()
+        except EOFError:
+            self.restart()
+            raise OCRJobError("OCR worker died")
+        if status != 'ok':
+            raise OCRJobError(result)
+        return result
+        
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+
+class OCRPool:
+    """
+    Pool of long-lived Tesseract worker processes
+    
+    Each worker initializes Tesseract (and loads its language data) once and
+    then serves jobs over a pipe, instead of a tesseract process being
+    forked per image. Request threads hand image bytes to an idle worker
+    and wait for the text; at most workers + max_pending jobs are admitted
+    at a time. Workers are started lazily per process, so gunicorn workers
+    forked from a preloaded master each get their own pool.
+    """
+    
+    def __init__(self, config=ocr_pool_config):
+        self.config = config
+        self._pid = None
+        self._lock = threading.Lock()
+        self._idle = None
+        self._slots = None
+        self._workers = []
+        
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # spawn, not fork: the request process has threads of its own
+            context = multiprocessing.get_context('spawn')
+            self._workers = [_Worker(context) for _ in range(self.config['workers'])]
+            self._idle = queue.Queue()
+            for worker in self._workers:
+                self._idle.put(worker)
+            self._slots = threading.BoundedSemaphore(self.config['workers'] + self.config['max_pending'])
+            self._pid = os.getpid()
+            logger.info(f"Started {len(self._workers)} OCR pool workers")
+            
+    def submit(self, image, lang='eng', config='', timeout=None):
+        """
+        Run Tesseract on image (a path, an open binary file, a memory map
+        or bytes) in a pool worker and return the recognized text
+        
+        Raises:
+            OCRPoolBusy: No worker became free within queue_timeout, or the
+                wait queue is full
+            OCRTimeout: The job ran longer than timeout (default job_timeout)
+            OCRJobError: Tesseract failed on the image
+        """
+        self._ensure_started()
+        start = time.time()
+        if not self._slots.acquire(blocking=False):
+            ocr_pool_jobs_total.labels(result='busy').inc()
+            raise OCRPoolBusy("OCR queue is full")
+        try:
+            data = self._read(image)
+            try:
+                worker = self._idle.get(timeout=self.config['queue_timeout'])
+            except queue.Empty:
+                ocr_pool_jobs_total.labels(result='busy').inc()
+                raise OCRPoolBusy("OCR workers are busy")
+            ocr_pool_busy_workers.inc()
+            try:
+                text = worker.run(data, lang, config, timeout or self.config['job_timeout'])
+            except OCRTimeout:
+                ocr_pool_jobs_total.labels(result='timeout').inc()
+                raise
+            except OCRJobError:
+                ocr_pool_jobs_total.labels(result='error').inc()
+                raise
+            finally:
+                ocr_pool_busy_workers.dec()
+                self._idle.put(worker)
+            ocr_pool_jobs_total.labels(result='ok').inc()
+            return text
+        finally:
+            self._slots.release()
+            ocr_pool_job_seconds.observe(time.time() - start)
+            
+    @staticmethod
+    def _read(image):
+        if isinstance(image, bytes):
+            return image
+        if isinstance(image, (bytearray, memoryview)) or hasattr(image, 'madvise'):
+            return bytes(image)
+        if hasattr(image, 'read'):
+            image.seek(0)
+            return image.read()
+        with open(image, 'rb') as image_file:
+            return image_file.read()
+            
+    def shutdown(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._pid = None
+
+ocr_pool = OCRPool()
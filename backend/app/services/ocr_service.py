@@ -1,46 +1,225 @@
 import pytesseract
 from PIL import Image
+import io
 import os
+import time
 from google.cloud import vision
 from dotenv import load_dotenv
 from datetime import datetime
+from app.services.ocr_cache import ocr_cache, ocr_cache_config
+from app.services.image_preprocessing import PreparedImage
+from app.services.ocr_pool import ocr_pool, ocr_pool_config, OCRPoolBusy, tesseract_version
+from app.services.pdf_ocr import PDFTextExtractor, pdf_ocr_config, find_fields
+from app.services.vision_batcher import vision_batcher, vision_config, create_vision_client
+from app.utils.logger import logger
 
 load_dotenv()
 
+ocr_config = {
+    'tesseract_lang': os.getenv('TESSERACT_LANG', 'eng'),
+    'tesseract_config': os.getenv('TESSERACT_CONFIG', '')
+}
+
+# Fields looked for in each document type (name -> regex, first group is
+# the value). Reading a multi-page PDF stops once all of them are found.
+DOCUMENT_FIELDS = {
+    'passport': {
+        'document_number': r'passport\s*(?:no|number)\.?\s*[:#]?\s*([A-Z0-9]{6,9})\b',
+        'date_of_birth': r'(?:date of birth|birth date|dob)\s*[:#]?\s*(\d{1,2}[./ -]\w{2,9}[./ -]\d{2,4})'
+    },
+    'id_card': {
+        'document_number': r'(?:document|card|id)\s*(?:no|number)\.?\s*[:#]?\s*([A-Z0-9]{6,12})\b',
+        'date_of_birth': r'(?:date of birth|birth date|dob)\s*[:#]?\s*(\d{1,2}[./ -]\w{2,9}[./ -]\d{2,4})'
+    },
+    'invoice': {
+        'invoice_number': r'invoice\s*(?:no|number|#)\.?\s*[:#]?\s*([A-Z0-9-]{3,20})\b',
+        'total': r'total\s*(?:due|amount)?\s*[:#]?\s*([$€£]?\s*\d[\d,.]*)'
+    }
+}
+
+# Google Vision has no engine version to query; bump this when the request
+# sent to it changes in a way that changes results
+GOOGLE_VISION_VERSION = 'v1-text_detection'
+
 class OCRService:
     def __init__(self):
         self.use_google_vision = os.getenv('USE_GOOGLE_VISION', 'false').lower() == 'true'
         if self.use_google_vision:
-            self.client = vision.ImageAnnotatorClient()
-            
-    def extract_text(self, image_path):
+            self.client = create_vision_client()
+        self._engine_version = None
+        
+    @property
+    def engine(self):
+        return 'google_vision' if self.use_google_vision else 'tesseract'
+        
+    @property
+    def engine_version(self):
+        if self._engine_version is None:
+            if self.use_google_vision:
+                self._engine_version = GOOGLE_VISION_VERSION
+            elif ocr_pool_config['enabled']:
+                # Key results by the engine that produces them
+                self._engine_version = tesseract_version()
+            else:
+                self._engine_version = str(pytesseract.get_tesseract_version())
+        return self._engine_version
+        
+    @property
+    def engine_config(self):
+        if self.use_google_vision:
+            return {}
+        return {'lang': ocr_config['tesseract_lang'], 'config': ocr_config['tesseract_config']}
+        
+    def prepare(self, image_path, digest=None, profile=None):
+        """
+        Wrap an image for OCR and AI verification, which then share one
+        preprocessed copy (see PreparedImage)
+        """
+        if isinstance(image_path, PreparedImage):
+            return image_path
+        return PreparedImage(image_path, digest=digest, profile=profile)
+        
+    def extract_text(self, image_path, digest=None):
         """
         Extract text from an image using either Tesseract OCR or Google Cloud Vision API
+        
+        image_path may be a path, an open binary file or memory map (see
+        ObjectCache.open), or a PreparedImage from prepare(); anything else
+        is preprocessed with the configured profile first. PDFs are read
+        page by page (see extract). digest is the image's SHA-256 if the
+        caller already knows it (e.g. Document.content_sha256).
+        """
+        return self.extract(image_path, digest=digest)['text']
+        
+    def extract(self, image_path, digest=None, required_fields=None):
+        """
+        Extract text, and the required_fields (name -> regex) found in it
+        
+        Returns {'text', 'pages', 'fields'}; pages is None for images and a
+        list of {'page', 'method'} for PDFs, whose reading stops early once
+        every required field is found. Results are cached by content,
+        engine, engine version and config (including the preprocessing
+        profile and the required fields).
         """
+        image = self.prepare(image_path, digest=digest)
+        is_pdf = image.is_pdf
+        if not ocr_cache_config['enabled']:
+            return self._extract(image, is_pdf, required_fields)[0]
+            
+        try:
+            engine_config = dict(self.engine_config, preprocess=image.settings)
+            if is_pdf:
+                engine_config['pdf'] = dict(pdf_ocr_config, required_fields=required_fields)
+            key = ocr_cache.key(image.digest, self.engine, self.engine_version, engine_config)
+        except Exception as e:
+            logger.warning(f"Error preparing OCR cache key: {str(e)}")
+            return self._extract(image, is_pdf, required_fields)[0]
+            
+        cached = ocr_cache.get(key, self.engine)
+        if cached is not None:
+            fields = cached.get('fields')
+            if fields is None:
+                fields = find_fields(cached['text'], required_fields or {})
+            return {'text': cached['text'], 'pages': cached.get('pages'), 'fields': fields}
+            
+        start = time.time()
+        result, failed = self._extract(image, is_pdf, required_fields)
+        if not failed:
+            # Engine errors are not cached, so the next call retries
+            extra = {'pages': result['pages'], 'fields': result['fields']} if is_pdf else {}
+            ocr_cache.set(key, result['text'], time.time() - start, **extra)
+        return result
+        
+    def _extract(self, image, is_pdf, required_fields):
+        """Returns (result, whether the engine failed anywhere)"""
+        if not is_pdf:
+            text = self._run_engine(image.data)
+            result = {
+                'text': text or "",
+                'pages': None,
+                'fields': find_fields(text or "", required_fields or {})
+            }
+            return result, text is None
+            
+        try:
+            pages, fields = PDFTextExtractor(self._run_engine, image.profile).extract(
+                image.source,
+                required_fields=required_fields
+            )
+        except OCRPoolBusy:
+            raise
+        except Exception as e:
+            logger.error(f"Error reading PDF: {str(e)}", exc_info=True)
+            return {'text': "", 'pages': [], 'fields': {}}, True
+        result = {
+            'text': '\n\n'.join(page.text for page in pages),
+            'pages': [{'page': page.page_number, 'method': page.method} for page in pages],
+            'fields': fields
+        }
+        return result, any(page.method == 'failed' for page in pages)
+        
+    def stream_pages(self, image_path, max_pages=None, required_fields=None):
+        """
+        Yield the pages of a PDF as {'page', 'text', 'method', 'seconds'}
+        as soon as each is read, in completion order; stops early once
+        every required field has been seen. Not cached.
+        """
+        image = self.prepare(image_path)
+        stop_when = None
+        if required_fields:
+            stop_when = lambda results: len(find_fields(
+                '\n'.join(result.text for result in results), required_fields
+            )) == len(required_fields)
+        extractor = PDFTextExtractor(self._run_engine, image.profile)
+        for page in extractor.stream(image.source, max_pages=max_pages, stop_when=stop_when):
+            yield page.to_dict()
+            
+    def _run_engine(self, content):
+        """Run the configured engine on encoded image bytes; returns None if it failed"""
         if self.use_google_vision:
-            return self._extract_text_google_vision(image_path)
+            return self._extract_text_google_vision(content)
         else:
-            return self._extract_text_tesseract(image_path)
+            return self._extract_text_tesseract(content)
             
-    def _extract_text_tesseract(self, image_path):
+    def _extract_text_tesseract(self, content):
         """
-        Extract text using Tesseract OCR
+        Extract text using Tesseract OCR, in the persistent worker pool
+        unless it is disabled
+        
+        OCRPoolBusy is raised rather than swallowed, so callers can answer
+        with a retryable error instead of an empty result.
         """
         try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image)
+            if ocr_pool_config['enabled']:
+                text = ocr_pool.submit(
+                    content,
+                    lang=ocr_config['tesseract_lang'],
+                    config=ocr_config['tesseract_config']
+                )
+            else:
+                image = Image.open(io.BytesIO(content))
+                text = pytesseract.image_to_string(
+                    image,
+                    lang=ocr_config['tesseract_lang'],
+                    config=ocr_config['tesseract_config']
+                )
             return text.strip()
+        except OCRPoolBusy:
+            raise
         except Exception as e:
             print(f"Error in Tesseract OCR: {str(e)}")
-            return ""
+            return None
             
-    def _extract_text_google_vision(self, image_path):
+    def _extract_text_google_vision(self, content):
         """
         Extract text using Google Cloud Vision API
+        
+        Unless batching is disabled, the image joins a batch_annotate_images
+        call shared with concurrent requests (see VisionBatcher).
         """
         try:
-            with open(image_path, 'rb') as image_file:
-                content = image_file.read()
+            if vision_config['batch_enabled']:
+                return vision_batcher.detect_text(content)
                 
             image = vision.Image(content=content)
             
@@ -53,19 +232,24 @@ class OCRService:
             
         except Exception as e:
             print(f"Error in Google Vision API: {str(e)}")
-            return ""
+            return None
             
-    def analyze_document(self, image_path):
+    def analyze_document(self, image_path, digest=None, required_fields=None):
         """
         Perform comprehensive document analysis
         """
-        text = self.extract_text(image_path)
+        extracted = self.extract(image_path, digest=digest, required_fields=required_fields)
         
         # Add additional analysis features here
         # For example, layout analysis, form field detection, etc.
         
-        return {
-            'extracted_text': text,
+        analysis = {
+            'extracted_text': extracted['text'],
             'confidence_score': 0.8,  # Placeholder
             'analysis_timestamp': datetime.utcnow().isoformat()
-        } 
\ No newline at end of file
+        }
+        if extracted['pages'] is not None:
+            analysis['pages'] = extracted['pages']
+        if required_fields:
+            analysis['fields'] = extracted['fields']
+        return analysis 
\ No newline at end of file
@@ -0,0 +1,174 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.services.image_preprocessing import (
+    PREPROCESS_PROFILES, preprocess_config, clean_image, encode_image, read_source
+)
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+pdf_ocr_config = {
+    'max_pages': int(os.getenv('PDF_OCR_MAX_PAGES', 20)),
+    # Pages OCRed at once; each is rendered only when a slot frees up
+    'parallel_pages': int(os.getenv('PDF_OCR_PARALLEL_PAGES', 4)),
+    # Pages with at least this much embedded text are not OCRed
+    'min_text_chars': int(os.getenv('PDF_OCR_MIN_TEXT_CHARS', 16)),
+    # Render resolution when the preprocessing profile is 'none'
+    'render_dpi': int(os.getenv('PDF_OCR_RENDER_DPI', 300))
+}
+
+# PDFium is not thread-safe; every call into it goes through this lock.
+# Rendering is cheap next to OCR, which runs outside it.
+_pdfium_lock = threading.Lock()
+
+class PageResult:
+    """Text of one PDF page; method is 'embedded', 'ocr' or 'failed'"""
+    
+    def __init__(self, page_number, text, method, seconds):
+        self.page_number = page_number
+        self.text = text
+        self.method = method
+        self.seconds = seconds
+        
+    def to_dict(self):
+        return {
+            'page': self.page_number,
+            'text': self.text,
+            'method': self.method,
+            'seconds': round(self.seconds, 3)
+        }
+
+def find_fields(text, patterns):
+    """
+    Return {name: value} for every pattern (name -> regex) found in text;
+    the value is the first group if the pattern has one
+    """
+    found = {}
+    for name, pattern in patterns.items():
+        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        if match:
+            found[name] = (match.group(1) if match.groups() else match.group(0)).strip()
+    return found
+
+def _open_document(source):
+    if isinstance(source, str):
+        return pdfium.PdfDocument(source)
+    if hasattr(source, 'readinto') and hasattr(source, 'seek'):
+        source.seek(0)
+        return pdfium.PdfDocument(source)
+    # Memory maps and other buffers are not accepted as such
+    return pdfium.PdfDocument(read_source(source))
+
+class PDFTextExtractor:
+    """
+    Text of a PDF, page by page
+    
+    Pages are visited in order. A page's embedded text is used when it has
+    any; otherwise the page is rendered (one page at a time, only when an
+    OCR slot is free) and handed to ocr_page, with up to parallel_pages
+    pages in flight. Results are yielded as they finish, so out of order.
+    """
+    
+    def __init__(self, ocr_page, profile=None, config=pdf_ocr_config):
+        if pdfium is None:
+            raise RuntimeError("PDF support requires pypdfium2")
+        self.ocr_page = ocr_page
+        self.settings = PREPROCESS_PROFILES[profile or preprocess_config['profile']]
+        self.config = config
+        
+    def _embedded_text(self, document, index):
+        with _pdfium_lock:
+            page = document[index]
+            try:
+                text_page = page.get_textpage()
+                try:
+                    text = text_page.get_text_range().strip()
+                finally:
+                    text_page.close()
+            finally:
+                page.close()
+        return text if len(text) >= self.config['min_text_chars'] else None
+        
+    def _render(self, document, index):
+        dpi = self.settings['dpi'] if self.settings else self.config['render_dpi']
+        with _pdfium_lock:
+            page = document[index]
+            try:
+                return page.render(scale=dpi / 72, grayscale=True).to_pil()
+            finally:
+                page.close()
+                
+    def _ocr(self, page_number, image, start):
+        # Cleanup and encoding run here, in parallel across pages
+        if self.settings:
+            image = clean_image(image, self.settings)
+        text = self.ocr_page(encode_image(image))
+        # ocr_page returns None when the engine failed
+        return PageResult(page_number, text or '', 'ocr' if text is not None else 'failed', time.time() - start)
+        
+    def stream(self, source, max_pages=None, stop_when=None):
+        """
+        Yield a PageResult for each of the first max_pages pages as it
+        finishes. stop_when is called with the results so far after each
+        page; once it returns True no further pages are rendered or started
+        and the stream ends (pages already being OCRed are abandoned).
+        """
+        max_pages = max_pages or self.config['max_pages']
+        with _pdfium_lock:
+            document = _open_document(source)
+            page_count = min(len(document), max_pages)
+        executor = ThreadPoolExecutor(
+            max_workers=self.config['parallel_pages'],
+            thread_name_prefix='pdf-ocr'
+        )
+        results = []
+        pending = set()
+        try:
+            next_index = 0
+            while next_index < page_count or pending:
+                while next_index < page_count and len(pending) < self.config['parallel_pages']:
+                    index = next_index
+                    next_index += 1
+                    start = time.time()
+                    text = self._embedded_text(document, index)
+                    if text is not None:
+                        result = PageResult(index + 1, text, 'embedded', time.time() - start)
+                        results.append(result)
+                        yield result
+                        if stop_when and stop_when(results):
+                            return
+                        continue
+                    pending.add(executor.submit(self._ocr, index + 1, self._render(document, index), start))
+                    
+                if not pending:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    results.append(result)
+                    yield result
+                    if stop_when and stop_when(results):
+                        return
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            with _pdfium_lock:
+                document.close()
+                
+    def extract(self, source, max_pages=None, required_fields=None):
+        """
+        Run stream() to the end, or until every required field (name ->
+        regex) is found, and return (pages in page order, fields found)
+        """
+        fields = {}
+        stop_when = None
+        if required_fields:
+            def stop_when(results):
+                fields.update(find_fields('\n'.join(result.text for result in results), required_fields))
+                return len(fields) == len(required_fields)
+        pages = list(self.stream(source, max_pages=max_pages, stop_when=stop_when))
+        return sorted(pages, key=lambda page: page.page_number), fields
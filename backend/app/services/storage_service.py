@@ -1,35 +1,159 @@
 import boto3
 import os
+import math
+import time
+import hmac
+import hashlib
+import threading
+from urllib.parse import quote, urlsplit
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 from werkzeug.utils import secure_filename
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from app.config.cache import LocalCache, cache_hits_total, cache_misses_total
 
 load_dotenv()
 
+# S3 multipart limits: every part but the last must be at least 5 MiB, and an
+# upload has at most 10,000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+# One boto3 session and S3 client per process. Clients are thread-safe and
+# expensive to build (endpoint resolution, credential chain, connection pool),
+# so every StorageService shares this one. It is created lazily on first use
+# and dropped in forked children, which must not reuse the parent's sockets.
+_s3_lock = threading.Lock()
+_s3_state = {'pid': None, 'session': None, 'client': None, 'presign_bases': {}}
+
+def _reset_s3_client():
+    global _s3_lock
+    _s3_lock = threading.Lock()
+    _s3_state.update(pid=None, session=None, client=None, presign_bases={})
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_s3_client)
+
+def get_s3_client():
+    """
+    Return the shared S3 client for this process, creating it if needed
+    """
+    pid = os.getpid()
+    if _s3_state['pid'] != pid:
+        with _s3_lock:
+            if _s3_state['pid'] != pid:
+                session = boto3.session.Session(
+                    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                    region_name=os.getenv('AWS_REGION', 'us-east-1')
+                )
+                client = session.client(
+                    's3',
+                    # Set to use MinIO or a moto server instead of AWS
+                    endpoint_url=os.getenv('AWS_S3_ENDPOINT_URL') or None,
+                    config=BotoConfig(
+                        # SigV4 presigned URLs can sign headers such as
+                        # Content-Length (see presign_upload_parts)
+                        signature_version='s3v4',
+                        max_pool_connections=int(os.getenv('S3_MAX_POOL_CONNECTIONS', 50))
+                    )
+                )
+                _s3_state.update(session=session, client=client, pid=pid)
+    return _s3_state['client']
+
+# Presigned GET URLs. A URL is signed to expire on a boundary of
+# expiry_bucket seconds, so every URL signed in the same window shares one
+# expiry, and is cached per (s3_key, expires_in) until min_remaining seconds
+# before it expires.
+presign_config = {
+    'expiry_bucket': int(os.getenv('PRESIGN_EXPIRY_BUCKET', 300)),
+    'min_remaining': int(os.getenv('PRESIGN_MIN_REMAINING', 600)),
+    'max_entries': int(os.getenv('PRESIGN_CACHE_MAX_ENTRIES', 10000))
+}
+
+_url_cache = LocalCache(max_entries=presign_config['max_entries'])
+
+# Deriving a SigV4 signing key takes four HMACs and only changes daily
+_signing_keys = {}
+
+def _signing_key(secret_key, date, region):
+    cache_key = (secret_key, date, region)
+    key = _signing_keys.get(cache_key)
+    if key is None:
+        key = ('AWS4' + secret_key).encode()
+        for part in (date, region, 's3', 'aws4_request'):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        _signing_keys.clear()
+        _signing_keys[cache_key] = key
+    return key
+
+# S3 key layouts for document objects. 'user' keeps every object of a user
+# under one prefix, "users/<user_id>/documents/<name>". 'hashed' puts a short
+# hash of that key in front ("3fa9/users/..."), so a single tenant's objects
+# spread over many prefixes and S3's per-prefix request-rate limits. The
+# layout is recorded on each Document, so both can coexist; see
+# app/services/key_migration.py to move existing objects.
+KEY_LAYOUTS = ('user', 'hashed')
+CONTENT_KEY_LAYOUT = 'content'  # blob_service keys, already digest-spread
+
+key_layout_config = {
+    'layout': os.getenv('STORAGE_KEY_LAYOUT', 'user'),
+    'hash_chars': int(os.getenv('STORAGE_KEY_HASH_CHARS', 4))
+}
+
+def _key_hash(s3_key, hash_chars):
+    return hashlib.sha256(s3_key.encode()).hexdigest()[:hash_chars]
+
+def _strip_hash_prefix(s3_key):
+    prefix, _, rest = s3_key.partition('/')
+    if rest.startswith('users/') and prefix and all(c in '0123456789abcdef' for c in prefix):
+        return rest
+    return s3_key
+
+def key_layout_of(s3_key):
+    """Infer which layout an existing key was written with"""
+    if not s3_key:
+        return 'user'
+    if s3_key.startswith('blobs/'):
+        return CONTENT_KEY_LAYOUT
+    return 'user' if _strip_hash_prefix(s3_key) == s3_key else 'hashed'
+
+def relayout_key(s3_key, layout, hash_chars=None):
+    """
+    Return where s3_key lives under layout. Deterministic, so a migration
+    that is interrupted and rerun computes the same destination.
+    """
+    if layout not in KEY_LAYOUTS:
+        raise ValueError(f"Unknown key layout: {layout}")
+    base = _strip_hash_prefix(s3_key)
+    if layout == 'user':
+        return base
+    return f"{_key_hash(base, hash_chars or key_layout_config['hash_chars'])}/{base}"
+
 class StorageService:
     def __init__(self):
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_REGION', 'us-east-1')
-        )
+        self.s3_client = get_s3_client()
         self.bucket_name = os.getenv('AWS_S3_BUCKET')
         
+    @staticmethod
+    def new_document_key(user_id, filename, layout=None):
+        """
+        Return a fresh, user-specific S3 key keeping filename's extension,
+        in the configured key layout
+        """
+        file_extension = os.path.splitext(filename)[1]
+        s3_key = f"users/{user_id}/documents/{uuid.uuid4()}{file_extension}"
+        return relayout_key(s3_key, layout or key_layout_config['layout'])
+        
     def upload_file(self, file, user_id):
         """
         Upload a file to S3 and return the file URL and metadata
         """
         try:
-            # Generate a unique filename
             original_filename = secure_filename(file.filename)
-            file_extension = os.path.splitext(original_filename)[1]
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            
-            # Create the S3 key with user-specific path
-            s3_key = f"users/{user_id}/documents/{unique_filename}"
+            s3_key = self.new_document_key(user_id, original_filename)
             
             # Upload file to S3
             self.s3_client.upload_fileobj(
@@ -70,6 +194,125 @@ class StorageService:
             print(f"Error uploading file to S3: {str(e)}")
             raise
             
+    def create_multipart_upload(self, s3_key, content_type, metadata=None):
+        """
+        Start a multipart upload that the client will fill with presigned
+        part URLs; returns the UploadId
+        """
+        try:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                ContentType=content_type,
+                ACL='private',
+                Metadata=metadata or {}
+            )
+            return response['UploadId']
+        except ClientError as e:
+            print(f"Error creating multipart upload: {str(e)}")
+            raise
+            
+    def presign_upload_parts(self, s3_key, upload_id, part_sizes, expires_in=3600):
+        """
+        Presign UploadPart URLs
+        
+        Args:
+            part_sizes (dict): part number -> exact size in bytes. The size
+                is part of the signature, so S3 rejects a part of any other
+                length and the object can never outgrow what was declared.
+                
+        Returns a dict of part number -> URL. Signing is local; no request
+        is made to S3.
+        """
+        return {
+            part_number: self.s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': self.bucket_name,
+                    'Key': s3_key,
+                    'UploadId': upload_id,
+                    'PartNumber': part_number,
+                    'ContentLength': size
+                },
+                ExpiresIn=expires_in
+            )
+            for part_number, size in part_sizes.items()
+        }
+        
+    def list_uploaded_parts(self, s3_key, upload_id):
+        """
+        Return the parts S3 already has for a multipart upload as a list
+        of {'PartNumber', 'ETag', 'Size'}
+        """
+        parts = []
+        marker = 0
+        while True:
+            response = self.s3_client.list_parts(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                PartNumberMarker=marker
+            )
+            parts.extend(
+                {'PartNumber': part['PartNumber'], 'ETag': part['ETag'], 'Size': part['Size']}
+                for part in response.get('Parts', [])
+            )
+            if not response.get('IsTruncated'):
+                return parts
+            marker = response['NextPartNumberMarker']
+            
+    def complete_multipart_upload(self, s3_key, upload_id, parts):
+        """
+        Assemble uploaded parts ({'PartNumber', 'ETag'}) into the object
+        """
+        return self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': part['PartNumber'], 'ETag': part['ETag']}
+                for part in sorted(parts, key=lambda part: part['PartNumber'])
+            ]}
+        )
+        
+    def abort_multipart_upload(self, s3_key, upload_id):
+        """
+        Abort a multipart upload and free its parts
+        """
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id
+            )
+            return True
+        except ClientError as e:
+            print(f"Error aborting multipart upload: {str(e)}")
+            return False
+            
+    def read_file_head(self, s3_key, length):
+        """
+        Read the first length bytes of a file with a ranged GET
+        """
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            Range=f"bytes=0-{length - 1}"
+        )
+        return response['Body'].read()
+        
+    def copy_file(self, source_key, s3_key):
+        """
+        Copy an object server-side, keeping its content type and metadata
+        """
+        return self.s3_client.copy_object(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            CopySource={'Bucket': self.bucket_name, 'Key': source_key},
+            MetadataDirective='COPY',
+            ACL='private'
+        )
+        
     def delete_file(self, s3_key):
         """
         Delete a file from S3
@@ -84,39 +327,177 @@ class StorageService:
             print(f"Error deleting file from S3: {str(e)}")
             return False
             
+    def delete_files(self, s3_keys, batch_size=1000):
+        """
+        Delete many files from S3 with batched DeleteObjects calls
+        
+        Returns a dict of s3_key -> error message for keys that could not
+        be deleted; keys not in it were deleted (or did not exist).
+        """
+        s3_keys = list(s3_keys)
+        batch_size = min(batch_size, 1000)  # DeleteObjects limit
+        errors = {}
+        for start in range(0, len(s3_keys), batch_size):
+            batch = s3_keys[start:start + batch_size]
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={
+                        'Objects': [{'Key': s3_key} for s3_key in batch],
+                        'Quiet': True
+                    }
+                )
+                for error in response.get('Errors', []):
+                    errors[error['Key']] = error.get('Message') or error.get('Code')
+            except ClientError as e:
+                print(f"Error deleting files from S3: {str(e)}")
+                for s3_key in batch:
+                    errors[s3_key] = str(e)
+        return errors
+        
     def get_file_url(self, s3_key, expires_in=3600):
         """
         Generate a presigned URL for temporary file access
         """
+        return self.get_file_urls([s3_key], expires_in).get(s3_key)
+        
+    def get_file_urls(self, s3_keys, expires_in=3600):
+        """Get presigned GET URLs for many files, keyed by s3_key"""
+        return {s3_key: url for s3_key, (url, _) in self.presign_file_urls(s3_keys, expires_in).items()}
+        
+    def presign_file_urls(self, s3_keys, expires_in=3600):
+        """
+        Get presigned GET URLs for many files with the time each expires
+        
+        URLs come from the per-process cache when one with at least
+        min_remaining seconds left exists; the rest are signed together
+        by sign_file_urls. A cached URL may have as little as min_remaining
+        seconds left, and a new one up to expiry_bucket seconds more than
+        expires_in.
+        
+        Returns:
+            dict: s3_key -> (url, expires_at as a Unix timestamp)
+        """
+        urls = {}
+        missing = []
+        for s3_key in s3_keys:
+            found, entry = _url_cache.get((s3_key, expires_in))
+            if found:
+                urls[s3_key] = entry
+            else:
+                missing.append(s3_key)
+        if urls:
+            cache_hits_total.labels(cache_type='presigned_url', tier='local').inc(len(urls))
+        if not missing:
+            return urls
+        cache_misses_total.labels(cache_type='presigned_url', tier='local').inc(len(missing))
+        
+        now = time.time()
+        bucket = presign_config['expiry_bucket']
+        expires_at = math.ceil((now + expires_in) / bucket) * bucket
         try:
-            url = self.s3_client.generate_presigned_url(
-                'get_object',
-                Params={
-                    'Bucket': self.bucket_name,
-                    'Key': s3_key
-                },
-                ExpiresIn=expires_in
-            )
-            return url
-        except ClientError as e:
-            print(f"Error generating presigned URL: {str(e)}")
-            return None
+            signed = self.sign_file_urls(missing, int(expires_at - now))
+        except Exception as e:
+            print(f"Error generating presigned URLs: {str(e)}")
+            return urls
             
+        ttl = expires_at - now - presign_config['min_remaining']
+        for s3_key, url in signed.items():
+            urls[s3_key] = (url, expires_at)
+            if ttl > 0:
+                _url_cache.set((s3_key, expires_in), urls[s3_key], ttl)
+        return urls
+        
+    def _presign_base(self):
+        """
+        Return (scheme, host, path prefix) of this bucket's object URLs
+        
+        Taken once per process from a URL boto3 presigns, so addressing
+        style and custom endpoints are whatever the client resolved.
+        """
+        bases = _s3_state['presign_bases']
+        base = bases.get(self.bucket_name)
+        if base is None:
+            probe = urlsplit(self.s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket_name, 'Key': '_'},
+                ExpiresIn=60
+            ))
+            base = bases[self.bucket_name] = (probe.scheme, probe.netloc, probe.path[:-1])
+        return base
+        
+    def sign_file_urls(self, s3_keys, expires_in):
+        """
+        Presign GET URLs for many files with one set of SigV4 parameters
+        
+        Equivalent to generate_presigned_url('get_object') per key, but
+        credentials, scope, signing key and the canonical query string are
+        prepared once per batch and each URL then costs a hash and an HMAC
+        instead of a full botocore request pipeline.
+        """
+        credentials = _s3_state['session'].get_credentials().get_frozen_credentials()
+        region = self.s3_client.meta.region_name
+        scheme, host, prefix = self._presign_base()
+        
+        amz_date = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        date = amz_date[:8]
+        scope = f"{date}/{region}/s3/aws4_request"
+        key = _signing_key(credentials.secret_key, date, region)
+        
+        params = {
+            'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+            'X-Amz-Credential': f"{credentials.access_key}/{scope}",
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': str(expires_in),
+            'X-Amz-SignedHeaders': 'host'
+        }
+        if credentials.token:
+            params['X-Amz-Security-Token'] = credentials.token
+        query = '&'.join(
+            f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+            for name, value in sorted(params.items())
+        )
+        string_prefix = f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+        
+        urls = {}
+        for s3_key in s3_keys:
+            path = prefix + quote(s3_key, safe='/~')
+            canonical_request = f"GET\n{path}\n{query}\nhost:{host}\n\nhost\nUNSIGNED-PAYLOAD"
+            string_to_sign = string_prefix + hashlib.sha256(canonical_request.encode()).hexdigest()
+            signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+            urls[s3_key] = f"{scheme}://{host}{path}?{query}&X-Amz-Signature={signature}"
+        return urls
+        
     def get_file_metadata(self, s3_key):
         """
-        Get file metadata from S3
+        Get file metadata from S3 with a HEAD request
+        
+        last_modified is a naive UTC datetime, like every datetime stored
+        in Mongo.
         """
         try:
             response = self.s3_client.head_object(
                 Bucket=self.bucket_name,
                 Key=s3_key
             )
+            last_modified = response.get('LastModified')
             return {
                 'content_type': response.get('ContentType'),
                 'content_length': response.get('ContentLength'),
-                'last_modified': response.get('LastModified').isoformat(),
-                'metadata': response.get('Metadata', {})
+                'last_modified': last_modified.astimezone(timezone.utc).replace(tzinfo=None) if last_modified else None,
+                'etag': response.get('ETag'),
+                'metadata': response.get('Metadata', {}),
+                'checked_at': datetime.utcnow()
             }
         except ClientError as e:
             print(f"Error getting file metadata: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+            
+    def list_files(self, prefix=''):
+        """
+        Yield pages (lists) of {'Key', 'ETag', 'Size', 'LastModified'} for
+        every object under prefix, 1000 per ListObjectsV2 call
+        """
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            yield page.get('Contents', []) 
\ No newline at end of file
@@ -0,0 +1,187 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from prometheus_client import Counter, Histogram
+from google.cloud import vision
+from app.utils.logger import logger
+
+vision_config = {
+    # host:port of a Vision-compatible REST endpoint (e.g. a local fake for
+    # tests); requests go to it over plain HTTP without credentials
+    'endpoint': os.getenv('VISION_API_ENDPOINT'),
+    'batch_enabled': os.getenv('VISION_BATCH_ENABLED', 'true').lower() == 'true',
+    # batch_annotate_images accepts at most 16 images per call
+    'max_images': min(int(os.getenv('VISION_BATCH_MAX_IMAGES', 16)), 16),
+    # Total image bytes per call, kept under the API's request size limit
+    'max_bytes': int(os.getenv('VISION_BATCH_MAX_BYTES', 8 * 1024 * 1024)),
+    # How long the first image of a batch waits for others to join it
+    'max_wait': float(os.getenv('VISION_BATCH_MAX_WAIT', 0.05)),
+    'concurrency': int(os.getenv('VISION_BATCH_CONCURRENCY', 4)),
+    'timeout': float(os.getenv('VISION_REQUEST_TIMEOUT', 60))
+}
+
+vision_rpcs_total = Counter(
+    'vision_rpcs_total',
+    'Google Vision RPCs sent',
+    ['method', 'result']
+)
+
+vision_batch_images = Histogram(
+    'vision_batch_images',
+    'Images per batch_annotate_images call',
+    buckets=(1, 2, 4, 8, 12, 16)
+)
+
+vision_batch_wait_seconds = Histogram(
+    'vision_batch_wait_seconds',
+    'Time an image waited for its batch to be sent',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+
+class VisionError(Exception):
+    pass
+
+def create_vision_client(config=vision_config):
+    if config['endpoint']:
+        from google.auth.credentials import AnonymousCredentials
+        from google.cloud.vision_v1.services.image_annotator.transports.rest import ImageAnnotatorRestTransport
+        return vision.ImageAnnotatorClient(transport=ImageAnnotatorRestTransport(
+            host=config['endpoint'],
+            credentials=AnonymousCredentials(),
+            url_scheme='http'
+        ))
+    return vision.ImageAnnotatorClient()
+
+def response_text(response):
+    """Full text of one AnnotateImageResponse; raises VisionError for a failed image"""
+    if response.error.code:
+        raise VisionError(response.error.message or f"Vision error {response.error.code}")
+    if response.text_annotations:
+        return response.text_annotations[0].description.strip()
+    return ""
+
+class _Pending:
+    __slots__ = ('content', 'future', 'queued_at')
+    
+    def __init__(self, content):
+        self.content = content
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+class VisionBatcher:
+    """
+    Collects text detection requests from every thread of the process into
+    batch_annotate_images calls
+    
+    A batch is sent when it reaches max_images or max_bytes, or max_wait
+    after its first image arrived, whichever comes first; up to concurrency
+    batches are in flight at once. Each caller blocks only on its own
+    image's result. The collector thread starts lazily per process, so
+    gunicorn workers forked from a preloaded master each get their own.
+    """
+    
+    def __init__(self, client=None, config=vision_config):
+        self.config = config
+        self._client = client
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        # An image that did not fit the previous batch starts the next one
+        self._carry = None
+        
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = create_vision_client(self.config)
+        return self._client
+        
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._carry = None
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.config['concurrency'],
+                thread_name_prefix='vision-batch'
+            )
+            threading.Thread(target=self._collect, name='vision-batcher', daemon=True).start()
+            self._pid = os.getpid()
+            
+    def submit(self, content):
+        """Queue image bytes for text detection; returns a Future of the text"""
+        self._ensure_started()
+        pending = _Pending(content)
+        self._queue.put(pending)
+        return pending.future
+        
+    def detect_text(self, content):
+        """Text detected in image bytes, batched with other callers' images"""
+        return self.submit(content).result(timeout=self.config['timeout'] + self.config['max_wait'] + 5)
+        
+    def _next_batch(self):
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch = [first]
+        size = len(first.content)
+        deadline = first.queued_at + self.config['max_wait']
+        while len(batch) < self.config['max_images']:
+            remaining = deadline - time.monotonic()
+            try:
+                pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(pending.content) > self.config['max_bytes']:
+                self._carry = pending
+                break
+            batch.append(pending)
+            size += len(pending.content)
+        return batch
+        
+    def _collect(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._executor.submit(self._send, batch)
+            except Exception as e:
+                for pending in batch:
+                    pending.future.set_exception(e)
+                    
+    def _send(self, batch):
+        now = time.monotonic()
+        for pending in batch:
+            vision_batch_wait_seconds.observe(now - pending.queued_at)
+        vision_batch_images.observe(len(batch))
+        feature = vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)
+        try:
+            response = self.client.batch_annotate_images(
+                requests=[
+                    vision.AnnotateImageRequest(image=vision.Image(content=pending.content), features=[feature])
+                    for pending in batch
+                ],
+                timeout=self.config['timeout']
+            )
+        except Exception as e:
+            vision_rpcs_total.labels(method='batch_annotate_images', result='error').inc()
+            logger.warning(f"Vision batch of {len(batch)} images failed: {str(e)}")
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+        vision_rpcs_total.labels(method='batch_annotate_images', result='ok').inc()
+        
+        responses = list(response.responses)
+        for i, pending in enumerate(batch):
+            if i >= len(responses):
+                pending.future.set_exception(VisionError("Missing response in Vision batch"))
+                continue
+            try:
+                pending.future.set_result(response_text(responses[i]))
+            except VisionError as e:
+                pending.future.set_exception(e)
+
+vision_batcher = VisionBatcher()
@@ -0,0 +1,125 @@
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId, json_util
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Every encoded value starts with one header byte: the low bits name the
+# codec, the high bit marks a zlib-compressed payload. Values written before
+# the header existed are plain JSON, whose first byte is always printable
+# ASCII, so they can never be mistaken for a header and still decode.
+CODEC_JSON = 0x01
+CODEC_MSGPACK = 0x02
+FLAG_COMPRESSED = 0x80
+
+# msgpack extension types
+EXT_OBJECT_ID = 1
+EXT_DATETIME = 2
+EXT_DATETIME_UTC = 3
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+codec_config = {
+    'codec': os.getenv('CACHE_CODEC', 'msgpack'),
+    'compress_threshold': int(os.getenv('CACHE_COMPRESS_THRESHOLD', 1024)),
+    'compress_level': int(os.getenv('CACHE_COMPRESS_LEVEL', 1))
+}
+
+def _msgpack_default(obj):
+    if isinstance(obj, ObjectId):
+        return msgpack.ExtType(EXT_OBJECT_ID, obj.binary)
+    if isinstance(obj, datetime):
+        if obj.tzinfo is None:
+            micros = (obj - _EPOCH) // _ONE_MICROSECOND
+            return msgpack.ExtType(EXT_DATETIME, micros.to_bytes(8, 'big', signed=True))
+        micros = (obj.astimezone(timezone.utc).replace(tzinfo=None) - _EPOCH) // _ONE_MICROSECOND
+        return msgpack.ExtType(EXT_DATETIME_UTC, micros.to_bytes(8, 'big', signed=True))
+    raise TypeError(f"Cannot serialize {type(obj).__name__} for the cache")
+
+def _msgpack_ext_hook(code, data):
+    if code == EXT_OBJECT_ID:
+        return ObjectId(data)
+    if code in (EXT_DATETIME, EXT_DATETIME_UTC):
+        value = _EPOCH + int.from_bytes(data, 'big', signed=True) * _ONE_MICROSECOND
+        if code == EXT_DATETIME_UTC:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+    return msgpack.ExtType(code, data)
+
+def _encode_json(value):
+    return json_util.dumps(value).encode()
+
+def _decode_json(payload):
+    return json_util.loads(payload)
+
+def _encode_msgpack(value):
+    return msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+
+def _decode_msgpack(payload):
+    # Maps may have int, ObjectId or other non-str keys; msgpack only
+    # accepts str/bytes keys by default
+    return msgpack.unpackb(payload, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+
+CODECS = {
+    CODEC_JSON: (_encode_json, _decode_json)
+}
+if msgpack is not None:
+    CODECS[CODEC_MSGPACK] = (_encode_msgpack, _decode_msgpack)
+
+CODEC_NAMES = {
+    'json': CODEC_JSON,
+    'msgpack': CODEC_MSGPACK
+}
+
+def default_codec():
+    """Return the configured codec id, falling back to JSON without msgpack."""
+    codec = CODEC_NAMES.get(codec_config['codec'], CODEC_JSON)
+    return codec if codec in CODECS else CODEC_JSON
+
+def dumps(value, codec=None, compress_threshold=None):
+    """
+    Serialize a value for storage in the cache.
+    
+    Args:
+        value: Any JSON-like structure; ObjectId and datetime values are
+            preserved (to millisecond precision with the JSON codec)
+        codec (int): CODEC_JSON or CODEC_MSGPACK (default: CACHE_CODEC)
+        compress_threshold (int): Compress payloads at least this many bytes
+            long (default: CACHE_COMPRESS_THRESHOLD, negative disables)
+            
+    Returns:
+        bytes: Header byte followed by the payload
+    """
+    codec = codec or default_codec()
+    if compress_threshold is None:
+        compress_threshold = codec_config['compress_threshold']
+    payload = CODECS[codec][0](value)
+    header = codec
+    if 0 <= compress_threshold <= len(payload):
+        compressed = zlib.compress(payload, codec_config['compress_level'])
+        if len(compressed) < len(payload):
+            payload = compressed
+            header |= FLAG_COMPRESSED
+    return bytes((header,)) + payload
+
+def loads(raw):
+    """
+    Deserialize a value written by dumps(), or a legacy plain-JSON value.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode()
+    header = raw[0]
+    codec = header & ~FLAG_COMPRESSED
+    if codec not in CODEC_NAMES.values():
+        return json_util.loads(raw)
+    if codec not in CODECS:
+        raise ValueError('Cached value was written with msgpack, which is not installed')
+    payload = raw[1:]
+    if header & FLAG_COMPRESSED:
+        payload = zlib.decompress(payload)
+    return CODECS[codec][1](payload)
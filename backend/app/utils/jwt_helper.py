@@ -4,6 +4,20 @@ from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
 from app.models.user import User
 from app import db
 from app.utils.logger import logger
+from app.utils.revocation import revocation_filter
+
+def has_admin_claims(user_id, claims):
+    """
+    Decide admin access from verified token claims. The database is only
+    consulted when the revocation filter says the user's role or active
+    flag may have changed since the token was issued.
+    """
+    if claims.get('role') != 'admin':
+        return False
+    if not revocation_filter.might_be_revoked(user_id):
+        return True
+    user = User.find_by_id(db, user_id, fields=User.AUTH_FIELDS)
+    return bool(user and user.role == 'admin' and user.is_active)
 
 def admin_required():
     """
@@ -14,9 +28,8 @@ def admin_required():
         def decorator(*args, **kwargs):
             verify_jwt_in_request()
             current_user_id = get_jwt_identity()
-            user = User.find_by_id(db, current_user_id)
             
-            if not user or user.role != 'admin':
+            if not has_admin_claims(current_user_id, get_jwt()):
                 logger.warning(f"Unauthorized admin access attempt by user {current_user_id}")
                 return jsonify({'error': 'Admin privileges required'}), 403
                 
@@ -0,0 +1,128 @@
+import os
+import math
+import time
+import hashlib
+import threading
+from app.config import Config
+from app.config.cache import redis_client
+from app.utils.logger import logger
+
+# Users whose role or active flag changed are recorded in a Redis sorted set
+# (member = user id, score = when). Tokens issued before the change may carry
+# stale claims, so every worker keeps a Bloom filter of those users and only
+# goes to the database for a token whose subject might be in it. Entries are
+# dropped once every token issued before them has expired.
+revocation_config = {
+    'key': os.getenv('REVOCATION_KEY', 'auth:revoked'),
+    'version_key': os.getenv('REVOCATION_VERSION_KEY', 'auth:revoked:version'),
+    # How often (seconds) a worker checks Redis for new revocations
+    'sync_interval': float(os.getenv('REVOCATION_SYNC_INTERVAL', 1)),
+    # If Redis cannot be reached for this long, treat every token as a
+    # possible hit (i.e. check the database) rather than trust a stale filter
+    'max_staleness': float(os.getenv('REVOCATION_MAX_STALENESS', 10)),
+    'capacity': int(os.getenv('REVOCATION_FILTER_CAPACITY', 10000)),
+    'error_rate': float(os.getenv('REVOCATION_FILTER_ERROR_RATE', 0.001)),
+    'retention': Config.JWT_ACCESS_TOKEN_EXPIRES
+}
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+    
+    Membership tests never give false negatives; false positives happen at
+    roughly error_rate while no more than capacity items are added.
+    """
+    
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+        
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+            
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class RevocationFilter:
+    """
+    Per-process view of the revoked-user set, synced from Redis.
+    
+    might_be_revoked() costs a few hashes, plus one Redis GET of the version
+    counter at most every sync_interval seconds; the full set is only
+    reloaded when that counter has moved.
+    """
+    
+    def __init__(self, config=revocation_config):
+        self.config = config
+        self.filter = BloomFilter(config['capacity'], config['error_rate'])
+        self.version = None
+        self.last_sync = 0.0
+        self.last_success = 0.0
+        self.lock = threading.Lock()
+        
+    def _reload(self, version, now):
+        cutoff = now - self.config['retention']
+        pipe = redis_client.pipeline()
+        pipe.zremrangebyscore(self.config['key'], '-inf', cutoff)
+        pipe.zrangebyscore(self.config['key'], cutoff, '+inf')
+        _, members = pipe.execute()
+        bloom = BloomFilter(max(self.config['capacity'], len(members)), self.config['error_rate'])
+        for member in members:
+            bloom.add(member.decode() if isinstance(member, bytes) else member)
+        self.filter = bloom
+        self.version = version
+        
+    def sync(self, force=False):
+        """Reload the filter if the revocation set changed in Redis"""
+        now = time.time()
+        if not force and now - self.last_sync < self.config['sync_interval']:
+            return
+        with self.lock:
+            if not force and now - self.last_sync < self.config['sync_interval']:
+                return
+            self.last_sync = now
+            try:
+                version = redis_client.get(self.config['version_key'])
+                # Reload at least once per retention window so expired
+                # entries eventually leave the filter
+                if force or version != self.version or now - self.last_success > self.config['retention']:
+                    self._reload(version, now)
+                self.last_success = now
+            except Exception as e:
+                logger.warning(f"Failed to sync revocation filter: {str(e)}")
+                
+    def add(self, user_id):
+        self.filter.add(str(user_id))
+        
+    def might_be_revoked(self, user_id):
+        """Whether claims in user_id's tokens may be out of date"""
+        self.sync()
+        if time.time() - self.last_success > self.config['max_staleness']:
+            return True
+        return str(user_id) in self.filter
+
+revocation_filter = RevocationFilter()
+
+def revoke_user_claims(user_id):
+    """
+    Record that user_id's role or active flag changed, so tokens issued
+    before now are re-checked against the database by every worker.
+    """
+    revocation_filter.add(user_id)
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zadd(revocation_config['key'], {str(user_id): time.time()})
+        pipe.incr(revocation_config['version_key'])
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to publish claim revocation for user {user_id}: {str(e)}")
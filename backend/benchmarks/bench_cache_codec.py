@@ -0,0 +1,100 @@
+"""
+Micro-benchmark for the cache codecs in app.utils.cache_codec.
+
+Compares encode/decode time and stored size of plain JSON (the previous
+format) against the JSON and msgpack codecs, with and without compression,
+for document-list and verification-result payloads shaped like the ones the
+API caches.
+
+Run from the backend directory:
+    python -m benchmarks.bench_cache_codec
+"""
+import json
+import random
+import string
+import timeit
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.utils import cache_codec
+
+def make_document(user_id, index):
+    created_at = datetime(2024, 1, 1) + timedelta(minutes=index)
+    return {
+        '_id': ObjectId(),
+        'user_id': user_id,
+        'filename': f"scan_{index:04d}.jpg",
+        's3_key': f"users/{user_id}/documents/{ObjectId()}.jpg",
+        'document_type': random.choice(['passport', 'driver_license', 'national_id']),
+        'description': 'Uploaded from mobile app',
+        'created_at': created_at,
+        'verification_status': random.choice(['pending', 'verified', 'rejected']),
+        'file_size': random.randint(200_000, 4_000_000),
+        'mime_type': 'image/jpeg'
+    }
+
+def make_ocr_text(words=1500):
+    vocabulary = [
+        ''.join(random.choices(string.ascii_uppercase + string.digits, k=random.randint(2, 10)))
+        for _ in range(400)
+    ]
+    lines = []
+    for _ in range(words // 10):
+        lines.append(' '.join(random.choices(vocabulary, k=10)))
+    return '\n'.join(lines)
+
+def make_verification_result(document):
+    return {
+        'document_id': document['_id'],
+        'verification_status': 'verified',
+        'verification_results': {
+            'ocr': {
+                'extracted_text': make_ocr_text(),
+                'confidence_score': 0.8,
+                'analysis_timestamp': datetime.utcnow()
+            },
+            'ai_verification': {'status': 'verified', 'score': 0.93},
+            'content_analysis': {'fields': {'name': 'JOHN DOE', 'dob': '1990-01-01'}},
+            'blockchain_record': {'status': 'simulated', 'timestamp': datetime.utcnow()}
+        }
+    }
+
+def legacy_dumps(value):
+    return json.dumps(value, default=str).encode()
+
+def legacy_loads(raw):
+    return json.loads(raw)
+
+def bench(name, payload, dumps, loads, number):
+    encoded = dumps(payload)
+    encode_us = timeit.timeit(lambda: dumps(payload), number=number) / number * 1e6
+    decode_us = timeit.timeit(lambda: loads(encoded), number=number) / number * 1e6
+    print(f"  {name:<22} {encode_us:>10.1f} {decode_us:>10.1f} {len(encoded):>10}")
+
+def main(number=500):
+    random.seed(42)
+    user_id = str(ObjectId())
+    document_list = [make_document(user_id, i) for i in range(50)]
+    verification = make_verification_result(document_list[0])
+    
+    variants = [
+        ('json (legacy)', legacy_dumps, legacy_loads),
+        ('json', lambda v: cache_codec.dumps(v, cache_codec.CODEC_JSON, -1), cache_codec.loads),
+        ('json + zlib', lambda v: cache_codec.dumps(v, cache_codec.CODEC_JSON, 0), cache_codec.loads)
+    ]
+    if cache_codec.msgpack is not None:
+        variants += [
+            ('msgpack', lambda v: cache_codec.dumps(v, cache_codec.CODEC_MSGPACK, -1), cache_codec.loads),
+            ('msgpack + zlib', lambda v: cache_codec.dumps(v, cache_codec.CODEC_MSGPACK, 0), cache_codec.loads)
+        ]
+    else:
+        print('msgpack is not installed; skipping msgpack variants')
+        
+    for label, payload in [('document list (50 rows)', document_list),
+                           ('verification result', verification)]:
+        print(f"\n{label}")
+        print(f"  {'codec':<22} {'encode us':>10} {'decode us':>10} {'bytes':>10}")
+        for name, dumps, loads in variants:
+            bench(name, payload, dumps, loads, number)
+
+if __name__ == '__main__':
+    main()
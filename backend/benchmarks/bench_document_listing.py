@@ -0,0 +1,121 @@
+"""
+Benchmark for listing a heavy user's documents.
+
+Hydrates Document objects the way Document.find_by_user_id does, from an
+in-memory stand-in for the documents collection, and reports latency and
+resident memory. "per-document client" reproduces the old behaviour of
+building a boto3 S3 client in every Document.__init__; "shared client" is
+the current code path. Each mode runs in its own process so RSS numbers are
+not polluted by the other.
+
+No AWS access is needed: clients are only constructed, never used.
+
+Run from the backend directory:
+    python -m benchmarks.bench_document_listing --docs 100 300 1000
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+class FakeCollection:
+    def __init__(self, rows):
+        self.rows = rows
+        
+    def find(self, query):
+        return iter(self.rows)
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.documents = FakeCollection(rows)
+
+def make_rows(user_id, count):
+    start = datetime(2024, 1, 1)
+    return [{
+        '_id': ObjectId(),
+        'user_id': user_id,
+        'filename': f"scan_{i:04d}.jpg",
+        's3_key': f"users/{user_id}/documents/{ObjectId()}.jpg",
+        'document_type': 'passport',
+        'description': '',
+        'created_at': start + timedelta(minutes=i),
+        'verification_status': 'pending',
+        'verification_results': {}
+    } for i in range(count)]
+
+def rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def run_mode(mode, count, repeat):
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    os.environ.setdefault('AWS_S3_BUCKET', 'benchmark')
+    
+    import boto3
+    from app.models.document import Document
+    from app.services.storage_service import get_s3_client
+    
+    user_id = str(ObjectId())
+    db = FakeDatabase(make_rows(user_id, count))
+    get_s3_client()
+    gc.collect()
+    rss_before = rss_bytes()
+    
+    timings = []
+    kept = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        documents = Document.find_by_user_id(db, user_id)
+        for doc in documents:
+            if mode == 'legacy':
+                doc.legacy_client = boto3.client('s3', region_name='us-east-1')
+            else:
+                doc.storage_service.s3_client
+        timings.append(time.perf_counter() - start)
+        kept = documents
+        
+    return {
+        'mode': mode,
+        'docs': count,
+        'latency_ms': min(timings) * 1000,
+        'rss_delta_mb': (rss_bytes() - rss_before) / (1024 * 1024),
+        'kept': len(kept)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, nargs='+', default=[100, 300])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'DOCS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        mode, count = args.child
+        print(json.dumps(run_mode(mode, int(count), args.repeat)))
+        return
+        
+    labels = {'legacy': 'per-document client', 'shared': 'shared client'}
+    print(f"{'mode':<22} {'docs':>6} {'latency ms':>12} {'RSS delta MB':>14}")
+    for count in args.docs:
+        for mode in ('legacy', 'shared'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_document_listing',
+                 '--repeat', str(args.repeat), '--child', mode, str(count)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{labels[mode]:<22} {count:>6} {result['latency_ms']:>12.1f} {result['rss_delta_mb']:>14.1f}")
+
+if __name__ == '__main__':
+    main()
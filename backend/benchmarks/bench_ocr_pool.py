@@ -0,0 +1,82 @@
+"""
+Benchmark for Tesseract OCR through the persistent worker pool.
+
+Compares the old path, pytesseract.image_to_string (one tesseract process
+per image, language data reloaded every time), with OCRPool, whose
+long-lived workers keep an initialized Tesseract API. Both run the same
+synthetic text images from several request threads at once. Reports
+images/second and p50/p95 latency. Needs the tesseract binary, and tesserocr
+for the pool to use the in-process API.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ocr_pool --images 64 --concurrency 1 4 8
+"""
+import io
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+def make_images(count):
+    from PIL import Image, ImageDraw
+    images = []
+    for i in range(count):
+        image = Image.new('L', (1200, 400), 255)
+        draw = ImageDraw.Draw(image)
+        for line in range(6):
+            draw.text((40, 30 + line * 60), f"Document {i} line {line}: invoice total 1234.56 EUR", fill=0)
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        images.append(buffer.getvalue())
+    return images
+
+def run(recognize, images, concurrency):
+    latencies = []
+    
+    def job(data):
+        start = time.perf_counter()
+        recognize(data)
+        latencies.append(time.perf_counter() - start)
+        
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(job, images))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (
+        len(images) / elapsed,
+        statistics.median(latencies),
+        latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    
+    import pytesseract
+    from PIL import Image
+    from app.services.ocr_pool import OCRPool, ocr_pool_config
+    
+    images = make_images(args.images)
+    pool = OCRPool(dict(ocr_pool_config, workers=args.workers, max_pending=max(args.concurrency)))
+    # Start the workers and load language data outside the timed runs
+    pool.submit(images[0])
+    
+    modes = [
+        ('subprocess per call', lambda data: pytesseract.image_to_string(Image.open(io.BytesIO(data)))),
+        (f'pool ({args.workers} workers)', pool.submit)
+    ]
+    print(f"{'path':<22} {'threads':>8} {'images/s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+    try:
+        for concurrency in args.concurrency:
+            for name, recognize in modes:
+                throughput, p50, p95 = run(recognize, images, concurrency)
+                print(f"{name:<22} {concurrency:>8} {throughput:>10.1f} {p50 * 1000:>9.0f} {p95 * 1000:>9.0f}")
+    finally:
+        pool.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark for presigning the URLs of a document listing page.
+
+Compares one boto3 generate_presigned_url call per row (the old listing
+path) with StorageService.sign_file_urls, which signs the whole page with
+one set of SigV4 parameters, and with get_file_urls once its per-process
+cache is warm. Signing is local, so no AWS access is needed.
+
+Run from the backend directory:
+    python -m benchmarks.bench_presign --rows 10 100 1000
+"""
+import argparse
+import os
+import timeit
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+    
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    os.environ.setdefault('AWS_S3_BUCKET', 'benchmark')
+    
+    from app.services.storage_service import StorageService
+    storage_service = StorageService()
+    client = storage_service.s3_client
+    
+    def per_row(keys):
+        return [
+            client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': storage_service.bucket_name, 'Key': key},
+                ExpiresIn=3600
+            )
+            for key in keys
+        ]
+        
+    modes = [
+        ('generate_presigned_url', per_row),
+        ('sign_file_urls (batch)', lambda keys: storage_service.sign_file_urls(keys, 3600)),
+        ('get_file_urls (cached)', storage_service.get_file_urls)
+    ]
+    print(f"{'signing':<26} {'rows':>6} {'ms per page':>12} {'us per row':>12}")
+    for rows in args.rows:
+        keys = [f"users/benchmark/documents/{i:06d}.pdf" for i in range(rows)]
+        storage_service.get_file_urls(keys)
+        for name, sign in modes:
+            seconds = timeit.timeit(lambda: sign(keys), number=args.number) / args.number
+            print(f"{name:<26} {rows:>6} {seconds * 1000:>12.2f} {seconds / rows * 1e6:>12.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark for batched Google Vision text detection.
+
+Sends the same images from several request threads at once through one
+text_detection RPC per image (the old path) and through VisionBatcher,
+against the local fake Vision server, and reports RPCs sent, images/second
+and p95 latency per image. Results are checked against the fake server's
+expected text.
+
+Run from the backend directory:
+    python -m benchmarks.bench_vision_batch --images 200 --threads 16
+"""
+import os
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+def run(detect, images, threads):
+    latencies = []
+    
+    def job(content):
+        start = time.perf_counter()
+        text = detect(content)
+        latencies.append(time.perf_counter() - start)
+        assert text == f"text {hashlib.sha256(content).hexdigest()[:12]}", text
+        
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(job, images))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(images) / elapsed, latencies[max(0, int(len(latencies) * 0.95) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=128)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 16])
+    parser.add_argument('--size', type=int, default=64 * 1024, help='Bytes per image')
+    parser.add_argument('--latency', type=float, default=0.08)
+    args = parser.parse_args()
+    
+    from benchmarks.fake_vision_server import FakeVisionServer
+    server = FakeVisionServer(('127.0.0.1', 0), latency=args.latency, per_image_latency=0.002).start()
+    os.environ['VISION_API_ENDPOINT'] = server.endpoint
+    
+    from google.cloud import vision
+    from app.services.vision_batcher import VisionBatcher, create_vision_client, vision_config
+    config = dict(vision_config, endpoint=server.endpoint)
+    client = create_vision_client(config)
+    
+    def one_rpc_per_image(content):
+        response = client.text_detection(image=vision.Image(content=content))
+        return response.text_annotations[0].description.strip()
+        
+    images = [os.urandom(args.size) for _ in range(args.images)]
+    print(f"{'path':<22} {'threads':>8} {'rpcs':>6} {'images/s':>10} {'p95 ms':>8}")
+    for threads in args.threads:
+        batcher = VisionBatcher(client, dict(config))
+        for name, detect in (('text_detection', one_rpc_per_image), ('batched', batcher.detect_text)):
+            rpcs = server.rpcs
+            throughput, p95 = run(detect, images, threads)
+            print(f"{name:<22} {threads:>8} {server.rpcs - rpcs:>6} {throughput:>10.1f} {p95 * 1000:>8.0f}")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Local fake of the Google Vision REST API, for tests and benchmarks.
+
+Serves POST /v1/images:annotate (which both text_detection and
+batch_annotate_images use) and answers every TEXT_DETECTION request with
+"text <first 12 hex digits of the image's SHA-256>", after a simulated
+round-trip latency. Point the app at it with VISION_API_ENDPOINT=host:port.
+Images whose content starts with b'FAIL' get a per-image error, and
+setting drop_responses leaves that many responses off the end of each
+batch, as a truncated reply would.
+
+Run from the backend directory:
+    python -m benchmarks.fake_vision_server --port 9090 --latency 0.08
+"""
+import json
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeVisionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def __init__(self, address, latency=0.0, per_image_latency=0.0):
+        super().__init__(address, FakeVisionHandler)
+        self.latency = latency
+        self.per_image_latency = per_image_latency
+        self.lock = threading.Lock()
+        self.rpcs = 0
+        self.images = 0
+        self.drop_responses = 0
+        
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+        
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-vision', daemon=True).start()
+        return self
+
+def annotate(request):
+    content = base64.b64decode(request.get('image', {}).get('content', ''))
+    if content.startswith(b'FAIL'):
+        return {'error': {'code': 3, 'message': 'Bad image data.'}}
+    text = f"text {hashlib.sha256(content).hexdigest()[:12]}"
+    return {
+        'textAnnotations': [{'description': text, 'locale': 'en'}],
+        'fullTextAnnotation': {'text': text}
+    }
+
+class FakeVisionHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.path.split('?')[0].endswith('/images:annotate'):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        requests = body.get('requests', [])
+        with self.server.lock:
+            self.server.rpcs += 1
+            self.server.images += len(requests)
+        time.sleep(self.server.latency + self.server.per_image_latency * len(requests))
+        
+        responses = [annotate(request) for request in requests]
+        if self.server.drop_responses:
+            responses = responses[:-self.server.drop_responses]
+        payload = json.dumps({'responses': responses}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9090)
+    parser.add_argument('--latency', type=float, default=0.08, help='Seconds per RPC')
+    parser.add_argument('--per-image-latency', type=float, default=0.005, help='Extra seconds per image')
+    args = parser.parse_args()
+    
+    server = FakeVisionServer((args.host, args.port), args.latency, args.per_image_latency)
+    print(f"Fake Vision API on {server.endpoint}")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
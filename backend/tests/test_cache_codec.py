@@ -0,0 +1,43 @@
+"""
+Round trips through cache_codec for every codec, with and without
+compression.
+"""
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.utils import cache_codec
+
+OBJECT_ID = ObjectId()
+NAIVE = datetime(2024, 3, 1, 12, 30, 15, 123000)
+AWARE = datetime(2024, 3, 1, 12, 30, 15, 123000, tzinfo=timezone.utc)
+
+VALUE = {
+    '_id': OBJECT_ID,
+    'created_at': NAIVE,
+    'count': 3,
+    'ids': [OBJECT_ID, ObjectId()],
+    'nested': {'dates': [NAIVE], 'empty': {}},
+    'text': 'x' * 2000
+}
+
+@pytest.mark.parametrize('codec', sorted(cache_codec.CODECS))
+@pytest.mark.parametrize('compress_threshold', [-1, 0])
+def test_round_trip(codec, compress_threshold):
+    raw = cache_codec.dumps(VALUE, codec=codec, compress_threshold=compress_threshold)
+    assert cache_codec.loads(raw) == VALUE
+
+def test_msgpack_keeps_non_str_keys_and_timezones():
+    if cache_codec.CODEC_MSGPACK not in cache_codec.CODECS:
+        pytest.skip('msgpack is not installed')
+    value = {1: 'a', OBJECT_ID: NAIVE, 'nested': {2: [OBJECT_ID], 3: AWARE}}
+    raw = cache_codec.dumps(value, codec=cache_codec.CODEC_MSGPACK)
+    assert cache_codec.loads(raw) == value
+
+def test_json_stringifies_int_keys():
+    raw = cache_codec.dumps({1: 'a'}, codec=cache_codec.CODEC_JSON)
+    assert cache_codec.loads(raw) == {'1': 'a'}
+
+def test_legacy_plain_json():
+    assert cache_codec.loads(b'{"a": 1}') == {'a': 1}
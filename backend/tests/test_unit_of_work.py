@@ -0,0 +1,85 @@
+"""
+Deferred saves through a real request: blueprints wrapped with
+flush_after_requests write them when the response succeeds, drop them when
+it fails, and turn a version conflict into a 409.
+"""
+import fakeredis
+import mongomock
+import pytest
+from flask import Blueprint, Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+
+from app import db
+from app.models import record_cache
+from app.models.identity_map import defer_save, flush_after_requests
+from app.models.user import User
+from app.routes.auth import auth_bp
+from app.utils import revocation
+
+probe_bp = flush_after_requests(Blueprint('probe', __name__))
+
+@probe_bp.route('/<user_id>/<int:status>', methods=['POST'])
+def rename(user_id, status):
+    user = User.find_by_id(db, user_id)
+    user.name = 'renamed'
+    defer_save(user, db)
+    if status == 409:
+        # Another request saves the same user before this one finishes
+        db.users.update_one({'_id': user.id}, {'$inc': {User.VERSION_FIELD: 1}})
+        status = 200
+    return jsonify({'ok': status < 400}), status
+
+@pytest.fixture
+def app(monkeypatch):
+    redis = fakeredis.FakeRedis()
+    monkeypatch.setattr(record_cache, 'redis_client', redis)
+    monkeypatch.setattr(revocation, 'redis_client', redis)
+    
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret-at-least-32-bytes-long'
+    JWTManager(app)
+    app.db = mongomock.MongoClient().db
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(probe_bp, url_prefix='/probe')
+    return app
+
+@pytest.fixture
+def users(app):
+    admin = User('admin@example.com', 'hash', 'Admin', role='admin').save(app.db)
+    user = User('user@example.com', 'hash', 'User').save(app.db)
+    return admin, user
+
+def stored_name(app, user):
+    return app.db.users.find_one({'_id': user.id})['name']
+
+def test_update_user_flushes_deferred_save(app, users):
+    admin, user = users
+    with app.app_context():
+        token = create_access_token(identity=str(admin.id), additional_claims={'role': 'admin'})
+        
+    response = app.test_client().put(
+        f'/api/auth/users/{user.id}',
+        json={'name': 'Renamed'},
+        headers={'Authorization': f'Bearer {token}'}
+    )
+    assert response.status_code == 200
+    assert stored_name(app, user) == 'Renamed'
+
+def test_successful_response_writes_deferred_save(app, users):
+    _, user = users
+    response = app.test_client().post(f'/probe/{user.id}/200')
+    assert response.status_code == 200
+    assert stored_name(app, user) == 'renamed'
+
+def test_failed_response_drops_deferred_save(app, users):
+    _, user = users
+    response = app.test_client().post(f'/probe/{user.id}/500')
+    assert response.status_code == 500
+    assert stored_name(app, user) == 'User'
+
+def test_conflicting_deferred_save_returns_409(app, users):
+    _, user = users
+    response = app.test_client().post(f'/probe/{user.id}/409')
+    assert response.status_code == 409
+    assert response.get_json()['error'] == 'Conflict'
+    assert stored_name(app, user) == 'User'
@@ -0,0 +1,68 @@
+"""
+VisionBatcher against the local fake Vision server: how images are split
+into batch_annotate_images calls, and how per-image errors and missing
+responses reach each caller.
+"""
+import hashlib
+
+import pytest
+
+from app.services.vision_batcher import VisionBatcher, VisionError, create_vision_client, vision_config
+from benchmarks.fake_vision_server import FakeVisionServer
+
+@pytest.fixture
+def server():
+    server = FakeVisionServer(('127.0.0.1', 0)).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_batcher(server, **config):
+    # A long max_wait so batches close on size limits, not on time
+    config = dict(vision_config, endpoint=server.endpoint, max_wait=1.0, concurrency=2, timeout=10, **config)
+    return VisionBatcher(create_vision_client(config), config)
+
+def expected_text(content):
+    return f"text {hashlib.sha256(content).hexdigest()[:12]}"
+
+def test_batches_split_at_max_images(server):
+    batcher = make_batcher(server, max_images=4)
+    images = [bytes([i]) * 100 for i in range(10)]
+    
+    futures = [batcher.submit(content) for content in images]
+    # The last, partial batch goes out when max_wait runs out
+    assert [future.result(timeout=10) for future in futures] == [expected_text(content) for content in images]
+    assert server.rpcs == 3
+    assert server.images == 10
+
+def test_batches_split_at_max_bytes(server):
+    batcher = make_batcher(server, max_bytes=250)
+    images = [bytes([i]) * 100 for i in range(5)]
+    
+    futures = [batcher.submit(content) for content in images]
+    assert [future.result(timeout=10) for future in futures] == [expected_text(content) for content in images]
+    # Two 100-byte images fit in 250 bytes; the third starts the next batch
+    assert server.rpcs == 3
+
+def test_image_error_fails_only_that_image(server):
+    batcher = make_batcher(server, max_images=3)
+    images = [b'first image', b'FAIL: corrupt image', b'third image']
+    
+    futures = [batcher.submit(content) for content in images]
+    assert futures[0].result(timeout=10) == expected_text(images[0])
+    with pytest.raises(VisionError, match='Bad image data'):
+        futures[1].result(timeout=10)
+    assert futures[2].result(timeout=10) == expected_text(images[2])
+    assert server.rpcs == 1
+
+def test_missing_response_fails_unanswered_images(server):
+    server.drop_responses = 1
+    batcher = make_batcher(server, max_images=3)
+    images = [b'first image', b'second image', b'third image']
+    
+    futures = [batcher.submit(content) for content in images]
+    assert futures[0].result(timeout=10) == expected_text(images[0])
+    assert futures[1].result(timeout=10) == expected_text(images[1])
+    with pytest.raises(VisionError, match='Missing response'):
+        futures[2].result(timeout=10)
+    assert server.rpcs == 1